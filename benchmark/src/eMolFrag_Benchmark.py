@@ -0,0 +1,391 @@
+#!/usr/bin/python
+
+# The goal of this script is to measure the throughput of eMolFrag on
+# test-set100 and on larger libraries built from it, so changes to
+# chop / remove redundancy can be judged on speed as well as correctness
+# (black-box-verification checks correctness).
+
+# For each library size and each worker count eMolFrag is run once with
+# "-m 0 -c 0"; wall time and the stage timings of output-log/RunReport.json
+# are collected into a result file, and compared with a stored baseline.
+
+# Libraries larger than test-set100 are built from its 100 molecules:
+#   replicate - copies of the molecules under new file names
+#   perturb   - copies with atom coordinates moved by a small random offset
+#               (same atoms, bonds and atom types, seeded)
+# Both keep the chemistry of test-set100, so the number of unique fragments
+# stays close to the one of test-set100 while the redundancy groups grow
+# with the library size.
+
+# With -recall each library is also run with "-m 2 -c 0 -t <tc>" twice,
+# exact and with --lsh, and the brick groups are compared: recall is the
+# fraction of the fragment pairs grouped together by the exact run that the
+# LSH run also groups together.
+
+# Usage:
+#   python benchmark/src/eMolFrag_Benchmark.py [-sizes 100,1000] [-workers 1,4,16]
+#          [-mode replicate|perturb] [-seed 1] [-label name] [-save-baseline]
+#          [-baseline benchmark/baseline.json] [-tolerance 0.10]
+#          [-recall] [-tc 0.95]
+
+import sys
+import os         # listdir
+import os.path    # isfile
+import subprocess # subprocess
+import shutil
+import random
+import json
+import time
+
+def emit(level, s):
+    print("  " * level + s)
+
+def emitError(level, s):
+    print("  " * level + "Error:", s)
+
+def emitWarning(level, s):
+    print("  " * level + "Warning:", s)
+
+def getFiles(path):
+    return sorted([f for f in os.listdir(path) if os.path.isfile(path + "/" + f)])
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMOLFRAG_DIRECTORY = os.path.dirname(BENCHMARK_DIRECTORY)
+TEST_SET_DIRECTORY = EMOLFRAG_DIRECTORY + "/test-set100"
+LIBRARY_DIRECTORY = BENCHMARK_DIRECTORY + "/libraries"
+RUN_DIRECTORY = BENCHMARK_DIRECTORY + "/runs"
+RESULT_DIRECTORY = BENCHMARK_DIRECTORY + "/results"
+DEFAULT_BASELINE = BENCHMARK_DIRECTORY + "/baseline.json"
+
+E_MOL_FRAG = EMOLFRAG_DIRECTORY + "/src/eMolFrag.py"
+E_MOL_FRAG_OPTIONS = ["-m", "0", "-c", "0"] # Full process, separate fragment files
+
+DEFAULT_OPTIONS = {"sizes": "100,1000",
+                   "workers": "1,4",
+                   "mode": "replicate",
+                   "seed": "1",
+                   "label": "",
+                   "baseline": DEFAULT_BASELINE,
+                   "tolerance": "0.10",
+                   "tc": "0.95"}
+
+#
+# Build a library of the given size from test-set100
+#
+def perturbMol2(lines, rand, offset):
+    #
+    # Move each atom by a random offset, keep everything else
+    #
+    newLines = []
+    inAtoms = False
+    for line in lines:
+        if line.startswith("@<TRIPOS>"):
+            inAtoms = line.strip() == "@<TRIPOS>ATOM"
+            newLines.append(line)
+            continue
+
+        items = line.split()
+        if inAtoms and len(items) >= 6:
+            coords = [float(x) + rand.uniform(-offset, offset) for x in items[2:5]]
+            newLines.append("%7s %-8s %9.4f %9.4f %9.4f %-5s %s\n" % \
+                            (items[0], items[1], coords[0], coords[1], coords[2], items[5], " ".join(items[6:])))
+        else:
+            newLines.append(line)
+
+    return newLines
+
+def buildLibrary(size, mode, seed):
+
+    sources = [f for f in getFiles(TEST_SET_DIRECTORY) if f.endswith(".mol2")]
+    if size == len(sources):
+        return TEST_SET_DIRECTORY
+
+    path = LIBRARY_DIRECTORY + "/" + mode + "-" + str(size) + "-s" + str(seed)
+    if os.path.isdir(path) and len(getFiles(path)) == size:
+        emit(1, "Reusing library " + path)
+        return path
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    emit(1, "Building library " + path)
+    rand = random.Random(seed)
+    for i in range(size):
+        source = sources[i % len(sources)]
+        copyNum = i // len(sources)
+        name = source[:-5] + "-" + str(copyNum).zfill(5) + ".mol2"
+
+        with open(TEST_SET_DIRECTORY + "/" + source, "r") as inf:
+            lines = inf.readlines()
+
+        if mode == "perturb" and copyNum > 0:
+            lines = perturbMol2(lines, rand, 0.05)
+
+        with open(path + "/" + name, "w") as outf:
+            outf.writelines(lines)
+
+    return path
+
+#
+# Run eMolFrag once, return the measurements
+#
+def countFiles(path):
+    if not os.path.isdir(path):
+        return 0
+    # --layout sharded: the fragments are listed in manifest.txt
+    if os.path.isfile(path + "/manifest.txt"):
+        with open(path + "/manifest.txt", "r") as inf:
+            return len([line for line in inf if len(line.strip()) > 0])
+    return len(getFiles(path))
+
+def executeEmolFrag(libraryPath, outdir, workers, options):
+    #
+    # Return the wall time, None if the run did not finish
+    #
+    if os.path.isdir(outdir):
+        shutil.rmtree(outdir)
+    if not os.path.isdir(RUN_DIRECTORY):
+        os.makedirs(RUN_DIRECTORY)
+
+    instrs = [sys.executable, E_MOL_FRAG, "-i", libraryPath + "/", "-o", outdir, "-p", str(workers)] + options
+    emit(1, "Executing " + " ".join(instrs))
+
+    startTime = time.time()
+    with open(os.devnull, "w") as devnull:
+        returnCode = subprocess.call(instrs, stdout=devnull)
+    wallTime = time.time() - startTime
+
+    if returnCode != 0 or not os.path.isfile(outdir + "output-log/RunReport.json"):
+        emitError(1, "eMolFrag did not finish, no run report in " + outdir)
+        return None
+
+    return wallTime
+
+def runEmolFrag(libraryPath, size, workers, mode):
+
+    outdir = RUN_DIRECTORY + "/" + mode + "-" + str(size) + "-p" + str(workers) + "/"
+    wallTime = executeEmolFrag(libraryPath, outdir, workers, E_MOL_FRAG_OPTIONS)
+    if wallTime is None:
+        return None
+
+    reportPath = outdir + "output-log/RunReport.json"
+
+    with open(reportPath, "r") as inf:
+        report = json.load(inf)
+
+    result = {"library": mode + "-" + str(size),
+              "size": size,
+              "workers": workers,
+              "wallSeconds": wallTime,
+              "moleculesPerSecond": size / wallTime if wallTime > 0 else 0.0,
+              "stages": dict([(stage, report["stages"][stage]["seconds"]) for stage in report["stages"]]),
+              "pkcombuCalls": report["timers"].get("pkcombu", {}).get("count", 0),
+              "pkcombuMeanSeconds": report["timers"].get("pkcombu", {}).get("mean", 0.0),
+              "peakRSSKB": max([report["workers"][pid]["peakRSSKB"] for pid in report["workers"]] + [0]),
+              "bricks": countFiles(outdir + "output-brick"),
+              "linkers": countFiles(outdir + "output-linker")}
+
+    emit(2, "%.1f s, %.2f molecules/s, %d bricks, %d linkers" % \
+         (result["wallSeconds"], result["moleculesPerSecond"], result["bricks"], result["linkers"]))
+
+    return result
+
+#
+# Recall of the LSH mode against the exact mode
+#
+def readBrickPairs(outdir):
+    #
+    # Pairs of fragment names grouped together in output-log/bricks-red-out.txt
+    # (one line per group: "representative:representative member member ...")
+    #
+    pairs = set()
+    with open(outdir + "output-log/bricks-red-out.txt", "r") as inf:
+        for line in inf:
+            if ":" not in line:
+                continue
+            names = sorted(set([os.path.basename(x) for x in line.split(":", 1)[1].split()]))
+            for i in range(len(names)):
+                for j in range(i + 1, len(names)):
+                    pairs.add((names[i], names[j]))
+    return pairs
+
+def measureRecall(libraryPath, size, workers, mode, tc):
+
+    runs = {}
+    for name, options in [("exact", []), ("lsh", ["--lsh"])]:
+        outdir = RUN_DIRECTORY + "/" + mode + "-" + str(size) + "-p" + str(workers) + "-" + name + "/"
+        wallTime = executeEmolFrag(libraryPath, outdir, workers, ["-m", "2", "-c", "0", "-t", str(tc)] + options)
+        if wallTime is None:
+            return None
+        with open(outdir + "output-log/RunReport.json", "r") as inf:
+            report = json.load(inf)
+        runs[name] = {"wallSeconds": wallTime,
+                      "pkcombuCalls": report["timers"].get("pkcombu", {}).get("count", 0),
+                      "bricks": countFiles(outdir + "output-brick"),
+                      "pairs": readBrickPairs(outdir)}
+
+    exactPairs = runs["exact"]["pairs"]
+    found = len(exactPairs & runs["lsh"]["pairs"])
+    result = {"library": mode + "-" + str(size),
+              "workers": workers,
+              "tc": tc,
+              "recall": float(found) / len(exactPairs) if len(exactPairs) > 0 else 1.0,
+              "exactPairs": len(exactPairs),
+              "lshPairs": len(runs["lsh"]["pairs"])}
+    for name in runs:
+        for key in ["wallSeconds", "pkcombuCalls", "bricks"]:
+            result[name + key[0].upper() + key[1:]] = runs[name][key]
+
+    emit(2, "recall %.4f (%d of %d pairs), %d / %d bricks, %d / %d pkcombu calls, %.1f / %.1f s (exact / lsh)" % \
+         (result["recall"], found, len(exactPairs), result["exactBricks"], result["lshBricks"],
+          result["exactPkcombuCalls"], result["lshPkcombuCalls"], result["exactWallSeconds"], result["lshWallSeconds"]))
+
+    return result
+
+#
+# Compare with the baseline
+#
+def resultKey(result):
+    return result["library"] + "-p" + str(result["workers"])
+
+def compareBaseline(results, baselinePath, tolerance):
+
+    with open(baselinePath, "r") as inf:
+        baseline = json.load(inf)
+
+    baselineMap = dict([(resultKey(result), result) for result in baseline["results"]])
+
+    emit(0, "")
+    emit(0, "Comparison with baseline " + baselinePath + " (" + baseline.get("label", "") + ")")
+
+    regressions = []
+    for result in results:
+        key = resultKey(result)
+        if key not in baselineMap:
+            emitWarning(1, key + " not in baseline.")
+            continue
+
+        base = baselineMap[key]
+        ratio = result["wallSeconds"] / base["wallSeconds"] if base["wallSeconds"] > 0 else 0.0
+        emit(1, "%-28s %8.1f s  baseline %8.1f s  ratio %.2f" % (key, result["wallSeconds"], base["wallSeconds"], ratio))
+        for stage in sorted(result["stages"]):
+            if stage in base["stages"] and base["stages"][stage] > 0:
+                emit(2, "%-10s %8.1f s  baseline %8.1f s  ratio %.2f" % \
+                     (stage, result["stages"][stage], base["stages"][stage], result["stages"][stage] / base["stages"][stage]))
+
+        if ratio > 1.0 + tolerance:
+            regressions.append(key)
+
+        # Throughput only counts if the output is unchanged
+        if result["bricks"] != base["bricks"] or result["linkers"] != base["linkers"]:
+            emitWarning(2, "Output changed: %d bricks, %d linkers; baseline %d bricks, %d linkers" % \
+                        (result["bricks"], result["linkers"], base["bricks"], base["linkers"]))
+            regressions.append(key + " (output)")
+
+    return regressions
+
+#
+# Command line
+#
+def usage():
+    return "Usage: " + sys.argv[0] + " [-sizes 100,1000] [-workers 1,4] [-mode replicate|perturb] [-seed 1]" + \
+           " [-label name] [-save-baseline] [-baseline path] [-tolerance 0.10] [-recall] [-tc 0.95]"
+
+def parseArgs(args):
+    options = dict(DEFAULT_OPTIONS)
+    options["save-baseline"] = False
+    options["recall"] = False
+
+    i = 0
+    while i < len(args):
+        name = args[i][1:]
+        if name in ["save-baseline", "recall"]:
+            options[name] = True
+            i = i + 1
+        elif name in DEFAULT_OPTIONS and i + 1 < len(args):
+            options[name] = args[i + 1]
+            i = i + 2
+        else:
+            return None
+
+    try:
+        options["sizes"] = [int(x) for x in options["sizes"].split(",")]
+        options["workers"] = [int(x) for x in options["workers"].split(",")]
+        options["seed"] = int(options["seed"])
+        options["tolerance"] = float(options["tolerance"])
+        options["tc"] = float(options["tc"])
+    except ValueError:
+        return None
+
+    if options["mode"] not in ["replicate", "perturb"]:
+        return None
+    if min(options["sizes"]) < 100 or min(options["workers"]) < 1 or max(options["workers"]) > 16:
+        return None
+    if options["tc"] < 0.90 or options["tc"] >= 1.0:
+        return None
+
+    return options
+
+def main():
+
+    options = parseArgs(sys.argv[1:])
+    if options is None:
+        emitError(0, usage())
+        return 1
+
+    label = options["label"]
+    if label == "":
+        label = time.strftime("%Y%m%d-%H%M%S")
+
+    results = []
+    recalls = []
+    for size in options["sizes"]:
+        emit(0, "Library of " + str(size) + " molecules (" + options["mode"] + ")")
+        libraryPath = buildLibrary(size, options["mode"], options["seed"])
+        for workers in options["workers"]:
+            result = runEmolFrag(libraryPath, size, workers, options["mode"])
+            if result is not None:
+                results.append(result)
+        if options["recall"]:
+            recall = measureRecall(libraryPath, size, max(options["workers"]), options["mode"], options["tc"])
+            if recall is not None:
+                recalls.append(recall)
+
+    record = {"label": label,
+              "date": time.asctime(time.localtime(time.time())),
+              "python": sys.version.split()[0],
+              "mode": options["mode"],
+              "seed": options["seed"],
+              "results": results}
+    if options["recall"]:
+        record["recall"] = recalls
+
+    if not os.path.isdir(RESULT_DIRECTORY):
+        os.makedirs(RESULT_DIRECTORY)
+    resultPath = RESULT_DIRECTORY + "/" + label + ".json"
+    with open(resultPath, "w") as outf:
+        json.dump(record, outf, indent=1, sort_keys=True)
+    emit(0, "")
+    emit(0, "Results written to " + resultPath)
+
+    if options["save-baseline"]:
+        shutil.copyfile(resultPath, options["baseline"])
+        emit(0, "Baseline saved to " + options["baseline"])
+        return 0
+
+    if not os.path.isfile(options["baseline"]):
+        emitWarning(0, "No baseline at " + options["baseline"] + ", run with -save-baseline to store one.")
+        return 0
+
+    regressions = compareBaseline(results, options["baseline"], options["tolerance"])
+    if len(regressions) > 0:
+        print("\nRegressions beyond tolerance:")
+        print("\n\t".join([""] + regressions))
+        return 1
+
+    print("\nNo regressions beyond tolerance.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/python
+
+# The goal of this script is to check that the in-process comparison of
+# src/libkcombu.so (kcombuBinding.py, built by src/BuildKcombu.py) gives the
+# fragment pairs the same tanimoto and alignment as the pkcombu program.
+
+# Pairs of fragment SDF files are taken from a folder, e.g. output-chop-comb
+# of an eMolFrag run "-c 0": a seeded sample of all pairs and the pairs of
+# each fragment with itself. Each pair is compared with
+# kcombuBinding.MatchMolblocks and with 'pkcombu -A molA -B molB -oAm', read
+# as RunPkcombu of src/pkcombuRunner.py reads it, and the two
+# [tanimoto, alignment] are compared.
+
+# kcombu prints its progress. The library sends it to /dev/null
+# (src/kcombuQuiet.h) and must leave the stdout of the process as it is, so
+# a child process also prints numbered lines from a thread while it compares
+# pairs, and every line has to arrive.
+
+# Usage:
+#   python benchmark/src/kcombuEquivalence.py -input output-chop-comb
+#          [-pkcombu path] [-pairs 500] [-seed 1]
+
+import sys
+import os         # listdir
+import os.path    # isfile
+import subprocess # subprocess
+import random
+import time
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMOLFRAG_DIRECTORY = os.path.dirname(BENCHMARK_DIRECTORY)
+SCRIPTS_DIRECTORY = EMOLFRAG_DIRECTORY + "/src"
+
+sys.path.append(SCRIPTS_DIRECTORY)
+
+DEFAULT_OPTIONS = {"input": "",
+                   "pkcombu": "",
+                   "pairs": "500",
+                   "seed": "1"}
+
+STDOUT_CHECK_PAIRS = 50
+
+# child process of the stdout check: argv[1:] are SDF files, prints "line <n>" from a
+# thread while it compares them, then "printed <n>"
+STDOUT_CHECK_SCRIPT = """
+import sys, threading
+sys.path.insert(0, %r)
+import kcombuBinding
+molblocks = [open(x).read() for x in sys.argv[1:]]
+done = []
+printed = [0]
+def printLines():
+    while len(done) == 0:
+        printed[0] = printed[0] + 1
+        print("line %%d" %% printed[0], flush=True)
+thread = threading.Thread(target=printLines)
+thread.start()
+for i in range(len(molblocks) - 1):
+    try:
+        kcombuBinding.MatchMolblocks(molblocks[i], molblocks[i + 1])
+    except RuntimeError:
+        pass
+done.append(1)
+thread.join()
+print("printed %%d" %% printed[0], flush=True)
+""" % SCRIPTS_DIRECTORY
+
+def emit(level, s):
+    print("  " * level + s)
+
+def emitError(level, s):
+    print("  " * level + "Error:", s)
+
+def getFiles(path):
+    return sorted([f for f in os.listdir(path) if os.path.isfile(path + "/" + f)])
+
+#
+# [tanimoto, alignment] of pkcombu, ['0.0', ''] if it fails (as RunPkcombu)
+#
+def runPkcombu(pkcombuPath, molA, molB):
+    try:
+        output = subprocess.Popen([pkcombuPath, "-A", molA, "-B", molB, "-oAm"], stdout=subprocess.PIPE).communicate()[0].decode("UTF-8")
+        infoLine = output[output.index("#   Nmcs|tani|seldis:"):].split("\n")[1]
+        return [infoLine.split()[3], infoLine[infoLine.index("|") + 1:]]
+    except:
+        return [str(0.00), ""]
+
+#
+# [tanimoto, alignment] of libkcombu.so, ['0.0', ''] if it fails (as RunKcombu)
+#
+def runKcombu(molA, molB):
+    import kcombuBinding
+    try:
+        with open(molA, "r") as inf:
+            molblockA = inf.read()
+        with open(molB, "r") as inf:
+            molblockB = inf.read()
+        return kcombuBinding.MatchMolblocks(molblockA, molblockB)
+    except:
+        return [str(0.00), ""]
+
+#
+# Pairs of the SDF files of inputPath: pairNum sampled pairs, then each file with itself
+#
+def choosePairs(inputPath, pairNum, seed):
+    files = [inputPath + "/" + f for f in getFiles(inputPath) if f.endswith(".sdf")]
+    rng = random.Random(seed)
+    pairs = set()
+    if len(files) > 1:
+        while len(pairs) < min(pairNum, len(files) * (len(files) - 1) // 2):
+            [i, j] = sorted(rng.sample(range(len(files)), 2))
+            pairs.add((files[i], files[j]))
+    selfPairs = [(f, f) for f in files[:pairNum]]
+    return sorted(pairs) + selfPairs
+
+def compareAll(pkcombuPath, pairs):
+    different = []
+    matched = 0
+    seconds = [0.0, 0.0]  # [pkcombu, libkcombu.so]
+    for [molA, molB] in pairs:
+        startTime = time.time()
+        expected = runPkcombu(pkcombuPath, molA, molB)
+        seconds[0] = seconds[0] + time.time() - startTime
+        startTime = time.time()
+        given = runKcombu(molA, molB)
+        seconds[1] = seconds[1] + time.time() - startTime
+        if expected[1] != "":
+            matched = matched + 1
+        if given != expected:
+            different.append([molA, molB, expected, given])
+    return [different, matched, seconds]
+
+#
+# Run the child of STDOUT_CHECK_SCRIPT, return [lines printed, lines read]
+#
+def checkStdout(pairs):
+    files = [pair[0] for pair in pairs[:STDOUT_CHECK_PAIRS]]
+    output = subprocess.Popen([sys.executable, "-c", STDOUT_CHECK_SCRIPT] + files, stdout=subprocess.PIPE).communicate()[0].decode("UTF-8")
+    lines = output.split("\n")
+    read = len([x for x in lines if x.startswith("line ")])
+    printed = [int(x.split()[1]) for x in lines if x.startswith("printed ")]
+    return [printed[0] if len(printed) > 0 else -1, read]
+
+#
+# Command line
+#
+def usage():
+    return "Usage: " + sys.argv[0] + " -input output-chop-comb [-pkcombu path] [-pairs 500] [-seed 1]"
+
+def parseArgs(args):
+    options = dict(DEFAULT_OPTIONS)
+    i = 0
+    while i < len(args):
+        name = args[i][1:]
+        if name in DEFAULT_OPTIONS and i + 1 < len(args):
+            options[name] = args[i + 1]
+            i = i + 2
+        else:
+            return None
+    if not os.path.isdir(options["input"]):
+        return None
+    try:
+        options["pairs"] = int(options["pairs"])
+        options["seed"] = int(options["seed"])
+    except ValueError:
+        return None
+    if options["pkcombu"] == "":
+        from loader import ReadPathConfigure
+        try:
+            options["pkcombu"] = ReadPathConfigure(SCRIPTS_DIRECTORY)[1]
+        except:
+            return None
+    return options
+
+def main():
+
+    options = parseArgs(sys.argv[1:])
+    if options is None:
+        emitError(0, usage())
+        return 1
+    if not os.path.isfile(options["pkcombu"]):
+        emitError(0, "pkcombu not found: " + options["pkcombu"])
+        return 1
+
+    import kcombuBinding
+    if kcombuBinding.LoadKcombu() is None:
+        emitError(0, "libkcombu.so not loaded, build it with python src/BuildKcombu.py")
+        return 1
+
+    pairs = choosePairs(options["input"], options["pairs"], options["seed"])
+    if len(pairs) == 0:
+        emitError(0, "No SDF file in " + options["input"])
+        return 1
+
+    [different, matched, seconds] = compareAll(options["pkcombu"], pairs)
+    emit(0, "Pairs: %d, matched by pkcombu %d" % (len(pairs), matched))
+    emit(0, "Same tanimoto and alignment %d, different %d" % (len(pairs) - len(different), len(different)))
+    emit(0, "Seconds: pkcombu %.2f, libkcombu.so %.2f" % (seconds[0], seconds[1]))
+    for [molA, molB, expected, given] in different[:10]:
+        emitError(1, os.path.basename(molA) + " " + os.path.basename(molB) + ": pkcombu " + str(expected) + ", libkcombu.so " + str(given))
+
+    [printed, read] = checkStdout(pairs)
+    emit(0, "Stdout while comparing: %d lines printed, %d read" % (printed, read))
+    if (printed <= 0) or (read != printed):
+        emitError(0, "Lines printed while libkcombu.so compares pairs were lost.")
+        return 1
+    return 1 if len(different) > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
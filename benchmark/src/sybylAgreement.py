@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+# The goal of this script is to measure how often the Sybyl atom types of
+# src/sybylTyper.py (used for SDF inputs) agree with the types openbabel
+# wrote into the mol2 files of test-set100.
+
+# Each mol2 file is read with RDKit and written to a mol block, so the
+# typer sees what it would see for an SDF input (read as ReadInputMol reads
+# it): elements, bonds (aromatic bonds as type 4), charges and coordinates,
+# but no mol2 atom types. The
+# type given by SybylTypes is compared with column 6 of @<TRIPOS>ATOM.
+
+# The report gives the agreement over all atoms and over the heavy atoms,
+# the molecules with every atom typed the same, and for each openbabel type
+# the number of atoms, the agreement and the types given instead.
+
+# Usage:
+#   python benchmark/src/sybylAgreement.py [-input test-set100] [-json path]
+
+import sys
+import os         # listdir
+import os.path    # isfile
+import json
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMOLFRAG_DIRECTORY = os.path.dirname(BENCHMARK_DIRECTORY)
+TEST_SET_DIRECTORY = EMOLFRAG_DIRECTORY + "/test-set100"
+
+sys.path.append(EMOLFRAG_DIRECTORY + "/src")
+
+DEFAULT_OPTIONS = {"input": TEST_SET_DIRECTORY,
+                   "json": ""}
+
+def emit(level, s):
+    print("  " * level + s)
+
+def emitError(level, s):
+    print("  " * level + "Error:", s)
+
+def emitWarning(level, s):
+    print("  " * level + "Warning:", s)
+
+def getFiles(path):
+    return sorted([f for f in os.listdir(path) if os.path.isfile(path + "/" + f)])
+
+#
+# Atom types of the first molecule of a mol2 file, in atom order
+#
+def readMol2Types(path):
+    types = []
+    inAtoms = False
+    with open(path, "r") as inf:
+        for line in inf:
+            if line.startswith("@<TRIPOS>"):
+                if inAtoms:
+                    break
+                inAtoms = line.strip() == "@<TRIPOS>ATOM"
+                continue
+            items = line.split()
+            if inAtoms and len(items) >= 6:
+                types.append(items[5])
+    return types
+
+#
+# Type a mol2 file as an SDF input, return [openbabel types, sybylTyper types]
+#
+def typeMolecule(path):
+    from rdkit import Chem
+    from sybylTyper import SybylTypes, MarkAromaticAtoms
+
+    mol = Chem.MolFromMol2File(path, sanitize=False, removeHs=False)
+    if mol is None:
+        return None
+    molBlock = Chem.MolToMolBlock(mol, kekulize=False)
+    sdfMol = Chem.MolFromMolBlock(molBlock, sanitize=False, removeHs=False)
+    if sdfMol is None:
+        return None
+    MarkAromaticAtoms(sdfMol)
+
+    expected = readMol2Types(path)
+    if len(expected) != sdfMol.GetNumAtoms():
+        return None
+    return [expected, SybylTypes(sdfMol)]
+
+def measureAgreement(inputPath):
+    byType = {}
+    atoms = [0, 0]      # [atoms, agreed]
+    heavyAtoms = [0, 0]
+    molecules = [0, 0]  # [molecules, all atoms agreed]
+    unread = []
+
+    for fileName in [f for f in getFiles(inputPath) if f.endswith(".mol2")]:
+        try:
+            typeLists = typeMolecule(inputPath + "/" + fileName)
+        except Exception as e:
+            emitWarning(1, fileName + ": " + str(e))
+            typeLists = None
+        if typeLists is None:
+            unread.append(fileName)
+            continue
+
+        [expected, given] = typeLists
+        molecules[0] = molecules[0] + 1
+        if expected == given:
+            molecules[1] = molecules[1] + 1
+        for i in range(len(expected)):
+            entry = byType.setdefault(expected[i], {"atoms": 0, "agreed": 0, "given": {}})
+            entry["atoms"] = entry["atoms"] + 1
+            agreed = int(expected[i] == given[i])
+            entry["agreed"] = entry["agreed"] + agreed
+            if agreed == 0:
+                entry["given"][given[i]] = entry["given"].get(given[i], 0) + 1
+            atoms[0] = atoms[0] + 1
+            atoms[1] = atoms[1] + agreed
+            if expected[i] != "H":
+                heavyAtoms[0] = heavyAtoms[0] + 1
+                heavyAtoms[1] = heavyAtoms[1] + agreed
+
+    return {"atoms": atoms[0],
+            "agreement": float(atoms[1]) / atoms[0] if atoms[0] > 0 else 0.0,
+            "heavyAtoms": heavyAtoms[0],
+            "heavyAgreement": float(heavyAtoms[1]) / heavyAtoms[0] if heavyAtoms[0] > 0 else 0.0,
+            "molecules": molecules[0],
+            "moleculesAgreed": molecules[1],
+            "unread": unread,
+            "types": byType}
+
+def printReport(report):
+    emit(0, "Atoms: %d, agreement %.4f" % (report["atoms"], report["agreement"]))
+    emit(0, "Heavy atoms: %d, agreement %.4f" % (report["heavyAtoms"], report["heavyAgreement"]))
+    emit(0, "Molecules: %d, every atom agreed %d" % (report["molecules"], report["moleculesAgreed"]))
+    if len(report["unread"]) > 0:
+        emitWarning(0, "Not typed: " + " ".join(report["unread"]))
+    emit(0, "")
+    emit(0, "%-8s %7s %9s  %s" % ("openbabel", "atoms", "agreement", "given instead"))
+    types = report["types"]
+    for atomType in sorted(types.keys(), key=lambda x: -types[x]["atoms"]):
+        entry = types[atomType]
+        given = ", ".join(["%s %d" % (x, entry["given"][x]) for x in sorted(entry["given"].keys(), key=lambda x: -entry["given"][x])])
+        emit(0, "%-8s %7d %9.4f  %s" % (atomType, entry["atoms"], float(entry["agreed"]) / entry["atoms"], given))
+
+#
+# Command line
+#
+def usage():
+    return "Usage: " + sys.argv[0] + " [-input test-set100] [-json path]"
+
+def parseArgs(args):
+    options = dict(DEFAULT_OPTIONS)
+    i = 0
+    while i < len(args):
+        name = args[i][1:]
+        if name in DEFAULT_OPTIONS and i + 1 < len(args):
+            options[name] = args[i + 1]
+            i = i + 2
+        else:
+            return None
+    if not os.path.isdir(options["input"]):
+        return None
+    return options
+
+def main():
+
+    options = parseArgs(sys.argv[1:])
+    if options is None:
+        emitError(0, usage())
+        return 1
+
+    report = measureAgreement(options["input"])
+    if report["atoms"] == 0:
+        emitError(0, "No molecule of " + options["input"] + " could be typed.")
+        return 1
+    printReport(report)
+
+    if options["json"] != "":
+        with open(options["json"], "w") as outf:
+            json.dump(report, outf, indent=1, sort_keys=True)
+        emit(0, "")
+        emit(0, "Report written to " + options["json"])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+
+# The goal of this script is to check the Sybyl atom types src/sybylTyper.py
+# gives SDF inputs for groups test-set100 has few or none of (amide, nitro,
+# carboxylate, sulfone, ...), see sybylAgreement.py for test-set100 itself.
+
+# Each molecule is built from a SMILES with its hydrogens, written to an SDF
+# file and read back with ReadInputMol, as eMolFrag reads an SDF input. The
+# types SybylTypes gives the listed atoms (index in the SMILES) are compared
+# with the types of a Tripos mol2 file.
+
+# Usage:
+#   python benchmark/src/sybylTypeCheck.py
+
+import sys
+import os         # remove
+import os.path    # dirname
+import tempfile
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMOLFRAG_DIRECTORY = os.path.dirname(BENCHMARK_DIRECTORY)
+
+sys.path.append(EMOLFRAG_DIRECTORY + "/src")
+
+# [name, SMILES, {atom index: expected Sybyl type}]
+TYPE_CASES = [["acetamide", "CC(=O)N", {1: "C.2", 2: "O.2", 3: "N.am"}],
+              ["N-methylacetamide", "CC(=O)NC", {3: "N.am", 4: "C.3"}],
+              ["nitrobenzene", "c1ccccc1[N+](=O)[O-]", {0: "C.ar", 6: "N.pl3", 7: "O.2", 8: "O.2"}],
+              ["acetate", "CC(=O)[O-]", {1: "C.2", 2: "O.co2", 3: "O.co2"}],
+              ["dimethyl sulfone", "CS(=O)(=O)C", {1: "S.O2", 2: "O.2", 3: "O.2"}],
+              ["dimethyl sulfoxide", "CS(=O)C", {1: "S.O"}],
+              ["pyridine", "c1ccncc1", {0: "C.ar", 3: "N.ar"}],
+              ["aniline", "Nc1ccccc1", {0: "N.pl3", 1: "C.ar"}],
+              ["guanidinium", "NC(=[NH2+])N", {1: "C.cat"}],
+              ["acetonitrile", "CC#N", {1: "C.1", 2: "N.1"}]]
+
+def emit(level, s):
+    print("  " * level + s)
+
+def emitError(level, s):
+    print("  " * level + "Error:", s)
+
+#
+# Types of a SMILES molecule read back from an SDF file, in atom order
+#
+def typeSmiles(smiles):
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+    from sybylTyper import ReadInputMol, SybylTypes
+
+    mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
+    AllChem.EmbedMolecule(mol, randomSeed=7)
+
+    [handle, sdfPath] = tempfile.mkstemp(suffix=".sdf")
+    os.close(handle)
+    try:
+        with open(sdfPath, "w") as outf:
+            outf.write(Chem.MolToMolBlock(mol, kekulize=False) + "$$$$\n")
+        return SybylTypes(ReadInputMol(sdfPath, removeHs=False))
+    finally:
+        os.remove(sdfPath)
+
+def main():
+
+    failures = 0
+    for [name, smiles, expected] in TYPE_CASES:
+        given = typeSmiles(smiles)
+        wrong = ["%d %s (expected %s)" % (i, given[i], expected[i]) for i in sorted(expected.keys()) if given[i] != expected[i]]
+        if len(wrong) > 0:
+            emitError(0, name + " " + smiles + ": " + ", ".join(wrong))
+            failures = failures + 1
+        else:
+            emit(0, name + " " + smiles + ": " + ", ".join(["%d %s" % (i, given[i]) for i in sorted(expected.keys())]))
+
+    emit(0, "")
+    emit(0, "%d of %d molecules typed as expected" % (len(TYPE_CASES) - failures, len(TYPE_CASES)))
+    return 1 if failures > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -32,6 +32,18 @@ def getDirectories(path):
 def getFiles(path):
     return [f for f in os.listdir(path) if os.path.isfile(path + "/" + f)]
 
+#
+# Fragment files of an output folder; a folder written with --layout sharded
+# lists its fragments (relative paths) in manifest.txt
+#
+MANIFEST_NAME = "manifest.txt"
+
+def getFragmentFiles(path):
+    if not os.path.isfile(path + "/" + MANIFEST_NAME):
+        return getFiles(path)
+    with open(path + "/" + MANIFEST_NAME, "r") as inf:
+        return [line.strip() for line in inf if len(line.strip()) > 0]
+
 DEFAULT_EMOLFRAG_DIRECTORY = "eMolFrag"
 DEFAULT_TEST_DIRECTORY = DEFAULT_EMOLFRAG_DIRECTORY + "/black-box-verification/tests"
 INPUT_DIR_NAME = "input"
@@ -49,7 +61,7 @@ E_MOL_FRAG_OPTIONS = ["-c", "0"] # Instructions to create separate fragment file
 #   A typical set of instructions:
 #      python eMolFrag/src/eMolFrag.py -i /content/eMolFrag/black-box-verification/9070-non-c2-c2-double-bond/input/ -o double-bond-output/ -c 0
 #
-def buildEmolFragEXEArgs(inpath, outdir):
+def buildEmolFragEXEArgs(inpath, outdir, extraOptions=[]):
 
     # Exceutable
     instrs = ["python"]
@@ -65,10 +77,11 @@ def buildEmolFragEXEArgs(inpath, outdir):
 
     # Options
     instrs += E_MOL_FRAG_OPTIONS
+    instrs += extraOptions
 
     return instrs 
  
-def executeEmolFrag(path):
+def executeEmolFrag(path, extraOptions=[]):
     #    
     # Run a test:
     #    (1) Run emolfrag
@@ -77,7 +90,7 @@ def executeEmolFrag(path):
     inpath = path + '/' + INPUT_DIR_NAME
     outpath = path + '/' + GENERATED_OUTPUT_DIR_NAME
     
-    exeInstructions = buildEmolFragEXEArgs(inpath, outpath)
+    exeInstructions = buildEmolFragEXEArgs(inpath, outpath, extraOptions)
 
     emit(1, "Executing " + " ".join(exeInstructions))
 
@@ -134,7 +147,7 @@ def checkBBdirectoryContents(path):
 import random
 def readFragmentDirectory(path):
 
-    frag_files = getFiles(path)
+    frag_files = getFragmentFiles(path)
 
     # Permute the list to add a greater likelihood of verification correctness
     random.shuffle(frag_files)
@@ -144,6 +157,7 @@ def readFragmentDirectory(path):
     for frag_file in frag_files:
 
         frag_path = path + '/' + frag_file
+        frag_file = os.path.basename(frag_file)
 
         if frag_file[0] == 'l':
             linkers.append(Linker(frag_path))
@@ -224,7 +238,7 @@ def compareOutput(path):
 #
 # Run a single black box test
 #
-def runBBtest(path):
+def runBBtest(path, extraOptions=[]):
 
     emit(1, "Executing test in " + path)
 
@@ -232,14 +246,14 @@ def runBBtest(path):
         emit(1, "Directory check failed, tests in " + path + " not executed.")
         return False
 
-    executeEmolFrag(path)
+    executeEmolFrag(path, extraOptions)
 
     return compareOutput(path)
 
 #
 # Run all black box tests within the specified directory
 #
-def runAllBB(path):
+def runAllBB(path, extraOptions=[]):
     
     emit(0, "Executing black box tests defined in " + path)
     
@@ -254,7 +268,7 @@ def runAllBB(path):
 
         abspath = path + "/" + subdir
 
-        if runBBtest(abspath):
+        if runBBtest(abspath, extraOptions):
            successes.append(abspath)
         else:
             failures.append(abspath)
@@ -268,23 +282,22 @@ def runAllBB(path):
 #    set of fragments (both linkers and bricks)
 #
 # If a directory is not specified, a default directory will be used.
+# Arguments after the directory are passed on to eMolFrag, e.g. --heavy
+# runs the same tests (and the same expected output) with --heavy.
 #
 
 def usage():
-    return "Usage: " + sys.argv[0] + "<emolfrag-directory>"
+    return "Usage: " + sys.argv[0] + " <emolfrag-directory> [eMolFrag options]"
   
 def main():
 
     rel_path = DEFAULT_TEST_DIRECTORY
+    extraOptions = sys.argv[2:]
 
     # Recall the first argument is the script being executed    
     if len(sys.argv) == 1: # No command-line args
         pass
 
-    elif len(sys.argv) > 2:
-        emitError(0, usage())
-        return
-
     # User asked for usage
     elif len(sys.argv) == 2 and sys.argv[1] == "-usage":
         emit(0, usage())
@@ -301,7 +314,7 @@ def main():
         return
 
     # Perform BB aanlysis on all aub-directories     
-    successes, failures = runAllBB(bb_test_abs_path)
+    successes, failures = runAllBB(bb_test_abs_path, extraOptions)
     
     #
     # Output the results of BB tests
@@ -0,0 +1,97 @@
+#Optional build of libkcombu.so, the kcombu sources of kcombu-src-20220610.tar.gz as a shared library.
+
+#The library holds the sources of pkcombu (Makefile.pkcombu) without pkcombu.c, plus kcombuShim.c. The sources
+#are compiled with kcombuQuiet.h, so kcombu prints to /dev/null and not to the stdout of eMolFrag. When
+#libkcombu.so is next to the scripts, pkcombuRunner.py compares fragments in-process through kcombuBinding.py
+#instead of starting one pkcombu process per pair. Without it eMolFrag uses pkcombu from PathConfigure.log.
+
+#Usage: python BuildKcombu.py [kcombu source tarball] [C compiler]
+#Needs a C compiler (gcc or cc) and the math library.
+
+import os
+import sys
+import shutil
+import tarfile
+import tempfile
+from subprocess import Popen,PIPE
+
+
+def ScriptsPath():
+    return os.path.dirname(os.path.abspath(__file__))+'/'
+
+
+def LibrarySources(srcPath):
+    # the .c files of OBJS in Makefile.pkcombu, without pkcombu.c
+    with open(srcPath+'Makefile.pkcombu','r') as inf:
+        lines=inf.readlines()
+    sourceList=[]
+    inObjs=0
+    for line in lines:
+        if line.startswith('OBJS'):
+            inObjs=1
+            line=line[line.index('=')+1:]
+        if inObjs==1:
+            for word in line.replace('\\','').split():
+                if word.endswith('.o') and (word != 'pkcombu.o'):
+                    sourceList.append(srcPath+word[:-2]+'.c')
+            if not line.rstrip().endswith('\\'):
+                break
+    return sourceList
+
+
+def Build(tarPath, compiler='gcc'):
+    scriptsPath=ScriptsPath()
+    libPath=scriptsPath+'libkcombu.so'
+    buildPath=tempfile.mkdtemp(prefix='kcombu-build-')
+    try:
+        try:
+            with tarfile.open(tarPath,'r:gz') as tar:
+                tar.extractall(buildPath)
+            srcPath=buildPath+'/src/'
+            sourceList=LibrarySources(srcPath)
+        except:
+            print('Error Code: 0020. Cannot read kcombu sources from '+tarPath)
+            return 1
+
+        try:
+            cmd=[compiler, '-O2', '-fPIC', '-shared', '-w', '-I'+srcPath, '-include', scriptsPath+'kcombuQuiet.h', '-o', libPath+'.tmp']+sourceList+[scriptsPath+'kcombuShim.c', '-lm']
+            cmd1=Popen(cmd,stdout=PIPE,stderr=PIPE)
+            [outStr, errStr]=cmd1.communicate()
+            if cmd1.returncode != 0:
+                print(errStr.decode('UTF-8'))
+                print('Error Code: 0021. Compile libkcombu.so failed.')
+                return 1
+            os.replace(libPath+'.tmp', libPath)
+        except:
+            print('Error Code: 0022. Cannot run '+compiler)
+            return 1
+    finally:
+        shutil.rmtree(buildPath, ignore_errors=True)
+
+    try:
+        import kcombuBinding
+        if kcombuBinding.LoadKcombu() == None:
+            print('Error Code: 0023. Cannot load '+libPath)
+            return 1
+    except:
+        print('Error Code: 0023. Cannot load '+libPath)
+        return 1
+
+    print('Built '+libPath+'\nExit.')
+    return 0
+
+
+if __name__=="__main__":
+    tarPath=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))+'/kcombu-src-20220610.tar.gz'
+    compiler='gcc'
+    if len(sys.argv) > 1:
+        tarPath=sys.argv[1]
+    if len(sys.argv) > 2:
+        compiler=sys.argv[2]
+    try:
+        sys.exit(Build(tarPath, compiler))
+    except SystemExit:
+        raise
+    except:
+        print('Error Code: 0024')
+        sys.exit(1)
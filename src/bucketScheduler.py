@@ -0,0 +1,33 @@
+#One schedule for the remove redundancy buckets of bricks and linkers.
+
+#A bucket is one group of fragments with the same atom counts (BrickListAll.txt / LinkerListAll.txt). Its cost
+#is estimated as members^2 x atoms: every member is compared with the others, and a comparison grows with the
+#atom number. Brick and linker buckets go to the same pool, most expensive first, one bucket per dispatch, so a
+#worker that finishes early takes the next bucket instead of waiting for the end of the brick phase.
+
+
+def GroupAtomNum(groupProperty):
+    # ['T', '12', 'C', '8', 'N', '1', 'O', '2'] -> 12
+    try:
+        return int(groupProperty[groupProperty.index('T')+1])
+    except:
+        return 1
+
+
+def BucketCost(memberNum, atomNum):
+    return memberNum*memberNum*max(atomNum, 1)
+
+
+def RunTask(task):
+    # pool task: [index, function, argument] -> [index, result]
+    [index, func, arg]=task
+    return [index, func(arg)]
+
+
+def RunBuckets(pool, taskList):
+    # taskList: [[function, argument, cost], ...], results are returned in the order of taskList
+    orderList=sorted(range(len(taskList)), key=lambda i: taskList[i][2], reverse=True)
+    resultList=[None for x in taskList]
+    for [index, result] in pool.imap_unordered(RunTask, [[i, taskList[i][0], taskList[i][1]] for i in orderList], chunksize=1):
+        resultList[index]=result
+    return resultList
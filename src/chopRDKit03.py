@@ -2,7 +2,7 @@
 
 #Main process:
 #1. Use RDKit to make fragments by breaking some bonds and save these fragments to sdf files. Besides dummy atoms and hydrogens, if there are more than 4 atoms in the fragments, the file name will be b-XYZ-00*.sdf; if there are less or equal than 4 atoms in the fragments, the file name will be l-XYZ-00*.sdf.
-#2. Then read atom coordinates and atom types from mol2 file. Mol2 file is generated by openbabel, but is also possible generated by other users in other ways.
+#2. Then read atom coordinates and atom types from mol2 file. Mol2 file is generated by openbabel, but is also possible generated by other users in other ways. For an SDF input the atom types are given by sybylTyper.py instead.
 #3. Match the atoms in each brick to the atoms in mol2 by the coordinates, then get the atom type info. However, some coordinates might not able to match exactly because of round error for float type. So, use the 2-norm of coordinates, the smallest one is the right atom.
 #4. Edit appendix atom type for each atom and the atoms able to connect to other fragments and the fragment connection type able to connect.
 #5. Remove dummy atoms and the bonds used to connect to dummy atoms.
@@ -42,6 +42,11 @@ from rdkit import RDLogger
 
 
 from combineLinkers01 import combineLinkers
+from runReport import AddItem, FlushMetrics
+from sdfStream import FlushStreams
+from fragmentLayout import FragmentPath
+from inputDiscovery import IsSDFInput
+from sybylTyper import ReadInputMol, Mol2AtomLines
 
 
 class Error(Exception):
@@ -446,18 +451,62 @@ def FragmentSanitize(tempSDFPath):
         #print('Not good for true')
         raise RDKitError(1)
 
-def FragmentUnsanitize(suppl1):
+def FragmentUnsanitize(suppl1, chopLogPath=None):
     try:
         newmol = Chem.FragmentOnBRICSBonds(suppl1)
         #print('here')
         mfl=Chem.GetMolFrags(newmol,asMols=True,sanitizeFrags=False)
-        print('Good False')
+        ChopMessage(chopLogPath, 'Good False')
         return mfl
     except:
-        print('Not good for false')
+        ChopMessage(chopLogPath, 'Not good for false')
         raise RDKitError(2)
 
-def ChopWithRDKit(outputDir,inputPath):
+def ChopMessage(chopLogPath, *args):
+    # progress message of chop, printed, or appended to chopLogPath (output-log/Chop.log, fragmentAPI.py)
+    if chopLogPath == None:
+        print(*args)
+    else:
+        with open(chopLogPath, 'at') as outf:
+            outf.write(' '.join([str(x) for x in args])+'\n')
+
+def RemoveMolHs(mol):
+    # heavy-atom mol (--heavy) and heavyMap, the index in mol of each atom of the heavy-atom mol,
+    # the hydrogens are kept as explicit H counts of their heavy atoms
+    heavyMap=[x.GetIdx() for x in mol.GetAtoms() if x.GetAtomicNum() != 1]
+    if len(heavyMap) == mol.GetNumAtoms():
+        return [mol, heavyMap]
+    heavyMol=Chem.RWMol(mol)
+    hydrList=[x.GetIdx() for x in mol.GetAtoms() if x.GetAtomicNum() == 1]
+    for hydrIdx in hydrList:
+        for atom in heavyMol.GetAtomWithIdx(hydrIdx).GetNeighbors():
+            if atom.GetAtomicNum() != 1:
+                atom.SetNumExplicitHs(atom.GetNumExplicitHs()+1)
+    for hydrIdx in reversed(hydrList):
+        heavyMol.RemoveAtom(hydrIdx)
+    # ring info of the input is dropped by RemoveAtom, the unsanitized BRICS path needs it
+    heavyMol=heavyMol.GetMol()
+    heavyMol.UpdatePropertyCache(strict=False)
+    Chem.SanitizeMol(heavyMol, Chem.SanitizeFlags.SANITIZE_SYMMRINGS)
+    return [heavyMol, heavyMap]
+
+
+def HeavyBondInfo(mol, heavyIndexList):
+    # bonds of mol between the atoms of heavyIndexList (indices in mol), as parseMol2File gives them:
+    # ['i', 'j'] with i, j the positions (from 1) of the atoms in heavyIndexList
+    positionMap={}
+    for i in range(len(heavyIndexList)):
+        positionMap[heavyIndexList[i]]=i+1
+    bondInfo=[]
+    for bond in mol.GetBonds():
+        [a1, a2]=[bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()]
+        if (a1 in positionMap) and (a2 in positionMap):
+            bondInfo.append([str(positionMap[a1]), str(positionMap[a2])])
+    return bondInfo
+
+
+def ChopWithRDKit(outputDir,inputPath,streamFull=0,heavy=0,chopLog=0):
+    startTime=time.time()
     lg = RDLogger.logger()
     lg.setLevel(RDLogger.CRITICAL)
     #print(inputPath)
@@ -473,19 +522,39 @@ def ChopWithRDKit(outputDir,inputPath):
     outputFolderPath_sdf=outputDir+'output-sdf/'
 
     outputFolderPath_chop_comb=outputDir+'output-chop-comb/'
-    suppl=Chem.MolFromMol2File(inputPath,sanitize=False)
+
+    # chopLog 1: the progress messages go to output-log/Chop.log instead of stdout
+    chopLogPath=None
+    if chopLog == 1:
+        chopLogPath=outputFolderPath_log+'Chop.log'
+
+    suppl=ReadInputMol(inputPath)
+    mol2AtomInfo=None
+    if IsSDFInput(inputPath):
+        # atom lines of the @<TRIPOS>ATOM part of a mol2 file, typed by sybylTyper
+        mol2AtomInfo=Mol2AtomLines(suppl)
+    inputMol=suppl
+    heavyMap=None
     tempSDFPath=outputDir+'output-sdf/'+lig+'.sdf'
     w=Chem.SDWriter(tempSDFPath)
     w.SetKekulize(False)
-    w.write(suppl)
+    # the input with its hydrogens, as without --heavy: RDKit drops them when it reads the file back sanitized
+    w.write(inputMol)
     w.close()
 
-    print("Processing molecule", inputPath)
+    ChopMessage(chopLogPath, "Processing molecule", inputPath)
 
+    sanitized=1
     try:
         mfl = FragmentSanitize(tempSDFPath)
     except RDKitError:
-        mfl = FragmentUnsanitize(suppl)
+        sanitized=0
+        mfl = FragmentUnsanitize(suppl, chopLogPath)
+
+    if (heavy == 1) and (sanitized == 1):
+        # hydrogens are removed once here, the fragments have none to strip; a molecule RDKit cannot
+        # sanitize is chopped with its hydrogens as without --heavy, its BRICS bonds depend on them
+        [suppl, heavyMap]=RemoveMolHs(suppl)
 
     #print(len(mfl), "fragments created by BRICS")
     
@@ -504,7 +573,7 @@ def ChopWithRDKit(outputDir,inputPath):
     mfl2 = ReconnectDoubleBond(suppl, mfl)
 
     if len(mfl) != len(mfl2):
-        print("Reconnected a double bond between", len(mfl) - len(mfl2) + 1, "fragments")
+        ChopMessage(chopLogPath, "Reconnected a double bond between", len(mfl) - len(mfl2) + 1, "fragments")
 
     #generate fragments with rdkit
     fileList=[]
@@ -541,11 +610,11 @@ def ChopWithRDKit(outputDir,inputPath):
         
         # 
         if totalAtomNum >= 4:
-            tempFileName = output + 'b-' + lig + '-' + str(r).zfill(3) + '.sdf'
+            tempFileName = FragmentPath(output, 'b-' + lig + '-' + str(r).zfill(3) + '.sdf')
             r = r + 1
             
         elif totalAtomNum < 4:
-            tempFileName = output + 'l-' + lig + '-' + str(l).zfill(3) + '.sdf'
+            tempFileName = FragmentPath(output, 'l-' + lig + '-' + str(l).zfill(3) + '.sdf')
             l = l + 1
 
         w=Chem.SDWriter(tempFileName)
@@ -566,13 +635,16 @@ def ChopWithRDKit(outputDir,inputPath):
     #    outf.write('Files are created.\n')
 
     #read atom coordinates and atom type from mol2 file
-    mol2AllList=[]
-    with open(inputPath,'r') as inf:
-        mol2AllList=inf.readlines()
-    mol2AtomInfo=[]
-    molHead=mol2AllList.index('@<TRIPOS>ATOM\n')
-    molEnd=mol2AllList.index('@<TRIPOS>BOND\n')
-    mol2AtomInfo=mol2AllList[molHead+1:molEnd]
+    if mol2AtomInfo == None:
+        mol2AllList=[]
+        with open(inputPath,'r') as inf:
+            mol2AllList=inf.readlines()
+        molHead=mol2AllList.index('@<TRIPOS>ATOM\n')
+        molEnd=mol2AllList.index('@<TRIPOS>BOND\n')
+        mol2AtomInfo=mol2AllList[molHead+1:molEnd]
+    if heavyMap != None:
+        # atoms of mol2 are in the atom order of RDKit, fragments are matched to the heavy atoms only
+        mol2AtomInfo=[mol2AtomInfo[i] for i in heavyMap]
     mol2X=[]
     mol2Y=[]
     mol2Z=[]
@@ -588,7 +660,7 @@ def ChopWithRDKit(outputDir,inputPath):
         fileName=os.path.basename(filePath)
         if len(fileName) > 0:
         
-            print("Processing", filePath.split('/')[-1])
+            ChopMessage(chopLogPath, "Processing", filePath.split('/')[-1])
         
             #processing brick fragments
             if fileName[0] == 'b':
@@ -967,4 +1039,20 @@ def ChopWithRDKit(outputDir,inputPath):
     tempCombineList.append(inputPath)
     tempCombineList=tempCombineList+fileList
 
-    combineLinkers(outputDir,tempCombineList)
+    # heavy atoms of the input as parseMol2File gives them, for an SDF input (findFragments cannot read it)
+    # or under --heavy; findFragments reads a mol2 input itself otherwise
+    mol2Info=None
+    if IsSDFInput(inputPath) or (heavyMap != None):
+        heavyList=[i for i in range(len(mol2A)) if mol2A[i] != 'H']
+        # index in inputMol of each row of the atom table, the rows of the heavy-atom table are heavyMap
+        atomIndexList=list(range(len(mol2A)))
+        if heavyMap != None:
+            atomIndexList=heavyMap
+        mol2Info=[[list(range(1,len(heavyList)+1)),[mol2X[i] for i in heavyList],[mol2Y[i] for i in heavyList],
+                   [mol2Z[i] for i in heavyList],[mol2A[i] for i in heavyList]],
+                  HeavyBondInfo(inputMol, [atomIndexList[i] for i in heavyList])]
+    combineLinkers(outputDir,tempCombineList,streamFull,mol2Info)
+    FlushStreams()
+
+    AddItem('chop', lig, time.time()-startTime, {'atoms':suppl.GetNumAtoms(), 'fragments':len(fileList)})
+    FlushMetrics(outputDir, 'chop')
@@ -11,10 +11,15 @@ from subprocess import Popen,PIPE
 import rdkit
 from rdkit import Chem
 
+from sdfStream import PutFragment, PutFragmentFile
+from fragmentLayout import FragmentPath
+
 #after chop fragments, find out any linkers and their neighbor are chopped. If two linkers used to connect to each other, then connect them again to get larger linkers.
 #input files should be a list of file paths of original molecule and bricks and linkers from that mol.
 #input 1 is the output folder path: '/.../output/', the real output folder for the combined linkers is '/.../output/output-chop-comb'.
 #input 2 is a list of files, with format: ['/.../CHEMBLxxxxx.mol2', '/.../b-CHEMBLxxxxx.mol2-000.sdf', '/.../l-CHEMBLxxxxx.mol2-000.sdf', ...].  
+#input 3 streamFull: 0 write fragments to output-chop-comb; 1 also stream them to BrickFull.sdf/LinkerFull.sdf; 2 only stream them (output format 1/2 without remove redundancy).
+#input 4 mol2Info: heavy atoms of the input as returned by parseMol2File, given by chop (also for SDF inputs); None to read the mol2 file.
 
 def parseMol2File(path):
     mol2AllList=[]
@@ -132,22 +137,19 @@ def removeMol2Hs(atomList,bondList):
         if prop == 'H':
             atomRemoveInfoList.append(atomLine)
             atomRemoveIndList.append(ind)
+    atomRemoveIndSet=set(atomRemoveIndList)
     bondRemoveList=[]
     for bondLine in bondList:
         templist=bondLine.split()
         #templist=[bondLine[0:3],bondLine[3:6]]+bondLine[6:].split()
-        if (str(int(templist[1])) in atomRemoveIndList) or (str(int(templist[2])) in atomRemoveIndList):
+        if (str(int(templist[1])) in atomRemoveIndSet) or (str(int(templist[2])) in atomRemoveIndSet):
             bondRemoveList.append(bondLine)
     #remove 
-    finalAtomList=[]
-    for atom in atomRemoveInfoList:
-        atomList.remove(atom)
-    finalAtomList=atomList
+    atomRemoveSet=set(atomRemoveInfoList)
+    finalAtomList=[x for x in atomList if x not in atomRemoveSet]
 
-    finalBondList=[]
-    for bond in bondRemoveList:
-        bondList.remove(bond)
-    finalBondList=bondList
+    bondRemoveSet=set(bondRemoveList)
+    finalBondList=[x for x in bondList if x not in bondRemoveSet]
 
     return finalAtomList,finalBondList
 
@@ -188,7 +190,7 @@ def GetAtomIndexList(mol2AtomInfo,sdfAtomInfo):
         
     return atomIndexList
 
-def findFragments(outputDir,mol2File,brickList,linkerList):
+def findFragments(outputDir,mol2File,brickList,linkerList,streamFull=0,mol2Info=None):
     tempSDFName=os.path.basename(mol2File)+'.sdf'
     tempSDFPath=outputDir+'output-sdf/'+tempSDFName
     #print('SDF')
@@ -197,12 +199,17 @@ def findFragments(outputDir,mol2File,brickList,linkerList):
     outputPath_chop_comb=outputDir+'output-chop-comb/'
     outputPath_log=outputDir+'output-log/'
 
-    mol2Info=parseMol2File(mol2File)
+    if mol2Info == None:
+        mol2Info=parseMol2File(mol2File)
     brickAtomList=[]
     for brickFile in brickList:
         brickBaseName=os.path.basename(brickFile)
         destPath=outputPath_chop_comb+brickBaseName
-        shutil.copyfile(brickFile,destPath)
+        if streamFull != 2:
+            destPath=FragmentPath(outputPath_chop_comb,brickBaseName)
+            shutil.copyfile(brickFile,destPath)
+        if streamFull != 0:
+            PutFragmentFile(outputDir,'BrickFull.sdf',destPath,brickFile)
 
         tempInfo=parseSDFFile(brickFile)
         #print(brickFile)
@@ -368,15 +375,25 @@ def writeSDFFile(path,content):
         #tempstr='\n'.join(content)
         outf.writelines(content)
 
+#[list file name, RL List line] of the fragments written by this process since the last TakeRLEntries (streaming dedupe)
+_rlEntries=[]
+
 def writeRLList(path,list):
     #RL List is a list of file path and atom count of total atom number and C, N, O numbers. It is used for the next step to do the group process and remove redundancy.
     with open(path,'at') as outf:
         tempStr=list[0]+' T '+str(list[1])+' C '+str(list[2])+' N '+str(list[3])+' O '+str(list[4])+'\n'
         outf.write(tempStr)
+    _rlEntries.append([os.path.basename(path),tempStr])
     pass 
 
 
-def combineLinkers(outputDir,inputFileList):
+def TakeRLEntries():
+    entryList=list(_rlEntries)
+    del _rlEntries[:]
+    return entryList
+
+
+def combineLinkers(outputDir,inputFileList,streamFull=0,mol2Info=None):
     outputFolderPath_log=outputDir+'output-log/'
     outputFolderPath_chop=outputDir+'output-chop/'
     outputFolderPath_chop_comb=outputDir+'output-chop-comb/'
@@ -407,18 +424,23 @@ def combineLinkers(outputDir,inputFileList):
                     pass
     
             #find fragments
-            (fragmentsList,fragmentsCountList)=findFragments(outputDir,originalFile,brickList,linkerList)
+            (fragmentsList,fragmentsCountList)=findFragments(outputDir,originalFile,brickList,linkerList,streamFull,mol2Info)
     
             #write linkers to file
             baseFileName=os.path.basename(originalFile) # base name, eg: xxx.mol2
             for i in range(len(fragmentsList)):
                 fragment=fragmentsList[i]
                 tempFileName='l-'+baseFileName+'-'+str(i).zfill(3)+'.sdf'
-                writeSDFFile(outputFolderPath_chop_comb+tempFileName,fragment)
+                tempFilePath=outputFolderPath_chop_comb+tempFileName
+                if streamFull != 2:
+                    tempFilePath=FragmentPath(outputFolderPath_chop_comb,tempFileName)
+                    writeSDFFile(tempFilePath,fragment)
+                if streamFull != 0:
+                    PutFragment(outputDir,'LinkerFull.sdf',tempFilePath,fragment)
                 fragmentCount=fragmentsCountList[i]
 
                 #tempStr=tempFileName+' T '+str(fragmentCount[0])+' C '+str(fragmentCount[1])+' N '+str(fragmentCount[2])+' O '+str(fragmentCount[3])+'\n'
-                tempList=[outputFolderPath_chop_comb+tempFileName]+fragmentCount
+                tempList=[tempFilePath]+fragmentCount
                 writeRLList(outputFolderPath_log+'LinkerListAll.txt',tempList)
 
 
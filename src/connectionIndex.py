@@ -0,0 +1,171 @@
+#Connection compatibility index of the bricks and linkers of a run, built at the end of the run with --conn-index.
+
+#The index is <outputDir>ConnectionIndex.db (SQLite):
+#   fragments - id, name, kind ('brick'/'linker')
+#   accepts   - atom type, fragment id, atom number: the brick atom has a branch eligible to connect to an atom of this type
+#               (from '> <BRANCH @atom-number eligible-atmtype-to-connect>')
+#   provides  - atom type, fragment id, atom number, max contacts: the fragment atom has this type and can connect outside,
+#               brick branch atoms (type from '> <ATOMTYPES>', max contacts -1: not recorded) and
+#               linker atoms with contacts (from '> <MAX-NUMBER-Of-CONTACTS ATOMTYPES>')
+#accepts and provides are keyed by atom type first, so looking up one atom type reads a single range of the table.
+
+#Usage:
+#   conn = OpenConnectionIndex('/.../output/ConnectionIndex.db')
+#   FragmentsAccepting(conn, 'C.ar')            # fragments which can attach to a C.ar atom
+#   FragmentsProviding(conn, 'C.ar')            # fragments with a connectable C.ar atom
+#   PartnersOf(conn, 'b-xxx.mol2-000.sdf', 5)   # fragments which can connect to atom 5 of the brick
+
+import os
+import os.path
+import sqlite3
+
+from fragRecord import IterFragmentRecords, ReadFragmentFile
+from fragmentLayout import ListFragments
+
+
+INDEX_NAME='ConnectionIndex.db'
+BATCH_SIZE=10000
+
+SCHEMA=['CREATE TABLE fragments (id INTEGER PRIMARY KEY, name TEXT, kind TEXT)',
+        'CREATE TABLE accepts (atom_type TEXT, fragment INTEGER, atom INTEGER, PRIMARY KEY (atom_type, fragment, atom)) WITHOUT ROWID',
+        'CREATE TABLE provides (atom_type TEXT, fragment INTEGER, atom INTEGER, max_contacts INTEGER, PRIMARY KEY (atom_type, fragment, atom)) WITHOUT ROWID']
+
+INDEXES=['CREATE INDEX fragments_name ON fragments (name)',
+         'CREATE INDEX accepts_fragment ON accepts (fragment, atom)']
+
+
+def IterOutputRecords(outputDir):
+    # records of the final fragments of a run, whichever output format was used
+    # representatives if remove redundancy was done, all the fragments otherwise
+    dbPath=outputDir+'Fragments.db'
+    if os.path.exists(dbPath):
+        from fragmentDB import OpenFragmentDB
+        conn=OpenFragmentDB(dbPath)
+        try:
+            representative=conn.execute('SELECT MAX(representative) FROM fragments').fetchone()[0]
+            for row in conn.execute('SELECT name, kind, atom_types, branches, contacts FROM fragments WHERE representative=?', (representative,)):
+                branches=[]
+                for tempStr in row['branches'].split('\n'):
+                    if len(tempStr.split()) > 1:
+                        branches.append([int(tempStr.split()[0]), tempStr.split()[1:]])
+                contacts=[]
+                for tempStr in row['contacts'].split('\n'):
+                    if len(tempStr.split()) == 2:
+                        contacts.append([int(tempStr.split()[0]), tempStr.split()[1]])
+                yield {'name':row['name'], 'kind':row['kind'], 'atomTypes':row['atom_types'].split('\n'), 'branches':branches, 'contacts':contacts}
+        finally:
+            conn.close()
+        return
+
+    for fileList in [['BrickUnique.sdf', 'LinkerUnique.sdf'], ['BrickFull.sdf', 'LinkerFull.sdf']]:
+        if True in [os.path.exists(outputDir+x) for x in fileList]:
+            for fileName in fileList:
+                if os.path.exists(outputDir+fileName):
+                    for record in IterFragmentRecords(outputDir+fileName):
+                        yield record
+            return
+
+    for folderList in [['output-brick/', 'output-linker/'], ['output-chop-comb/']]:
+        folderFileList=[]
+        for folderName in folderList:
+            if os.path.exists(outputDir+folderName):
+                folderFileList=folderFileList+[outputDir+folderName+x for x in sorted(ListFragments(outputDir+folderName), key=os.path.basename)]
+        if len(folderFileList) > 0:
+            for filePath in folderFileList:
+                yield ReadFragmentFile(filePath)
+            return
+
+
+def RecordRows(record, fragmentId):
+    # [accepts rows, provides rows] of one fragment
+    acceptRows={}
+    provideRows={}
+    if record['kind'] == 'brick':
+        for [atomNum, typeList] in record['branches']:
+            for atomType in typeList:
+                acceptRows[(atomType, fragmentId, atomNum)]=1
+            if (atomNum >= 1) and (atomNum <= len(record['atomTypes'])):
+                provideRows[(record['atomTypes'][atomNum-1], fragmentId, atomNum)]=-1
+    else:
+        for i in range(len(record['contacts'])):
+            [contactNum, atomType]=record['contacts'][i]
+            if contactNum > 0:
+                provideRows[(atomType, fragmentId, i+1)]=contactNum
+    return [list(acceptRows.keys()), [x+(provideRows[x],) for x in provideRows]]
+
+
+def BuildConnectionIndex(outputDir):
+    indexPath=outputDir+INDEX_NAME
+    if os.path.exists(indexPath):
+        os.remove(indexPath)
+
+    conn=sqlite3.connect(indexPath)
+    try:
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+        fragmentRows=[]
+        acceptRows=[]
+        provideRows=[]
+        fragmentId=0
+        for record in IterOutputRecords(outputDir):
+            fragmentId=fragmentId+1
+            fragmentRows.append((fragmentId, record['name'], record['kind']))
+            [tempAccepts, tempProvides]=RecordRows(record, fragmentId)
+            acceptRows.extend(tempAccepts)
+            provideRows.extend(tempProvides)
+            if len(fragmentRows) >= BATCH_SIZE:
+                conn.executemany('INSERT INTO fragments VALUES (?,?,?)', fragmentRows)
+                conn.executemany('INSERT INTO accepts VALUES (?,?,?)', acceptRows)
+                conn.executemany('INSERT INTO provides VALUES (?,?,?,?)', provideRows)
+                fragmentRows=[]
+                acceptRows=[]
+                provideRows=[]
+        conn.executemany('INSERT INTO fragments VALUES (?,?,?)', fragmentRows)
+        conn.executemany('INSERT INTO accepts VALUES (?,?,?)', acceptRows)
+        conn.executemany('INSERT INTO provides VALUES (?,?,?,?)', provideRows)
+        conn.commit()
+
+        for statement in INDEXES:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+    return [indexPath, fragmentId]
+
+
+#Queries
+def OpenConnectionIndex(indexPath):
+    return sqlite3.connect(indexPath)
+
+
+def FragmentsAccepting(conn, atomType, kind=None):
+    # [[fragment name, kind, atom number], ...] of the atoms which have a branch eligible to connect to atomType
+    sql='SELECT f.name, f.kind, a.atom FROM accepts a JOIN fragments f ON f.id=a.fragment WHERE a.atom_type=?'
+    if kind == None:
+        return [list(x) for x in conn.execute(sql, (atomType,))]
+    return [list(x) for x in conn.execute(sql+' AND f.kind=?', (atomType, kind))]
+
+
+def FragmentsProviding(conn, atomType, kind=None):
+    # [[fragment name, kind, atom number, max contacts], ...] of the connectable atoms of type atomType
+    sql='SELECT f.name, f.kind, p.atom, p.max_contacts FROM provides p JOIN fragments f ON f.id=p.fragment WHERE p.atom_type=?'
+    if kind == None:
+        return [list(x) for x in conn.execute(sql, (atomType,))]
+    return [list(x) for x in conn.execute(sql+' AND f.kind=?', (atomType, kind))]
+
+
+def PartnersOf(conn, fragmentName, atomNum):
+    # [[fragment name, kind, atom number], ...] which can connect to the branch atom atomNum of a brick:
+    # the partner atom has a type the branch accepts, and a partner brick atom also accepts the type of atomNum
+    sql=('SELECT DISTINCT f2.name, f2.kind, p2.atom '
+         'FROM fragments f1 '
+         'JOIN accepts a1 ON a1.fragment=f1.id AND a1.atom=? '
+         'JOIN provides p1 ON p1.fragment=f1.id AND p1.atom=? '
+         'JOIN provides p2 ON p2.atom_type=a1.atom_type '
+         'JOIN fragments f2 ON f2.id=p2.fragment '
+         'WHERE f1.name=? AND (f2.kind=\'linker\' OR EXISTS '
+         '(SELECT 1 FROM accepts a2 WHERE a2.atom_type=p1.atom_type AND a2.fragment=p2.fragment AND a2.atom=p2.atom))')
+    return [list(x) for x in conn.execute(sql, (atomNum, atomNum, fragmentName))]
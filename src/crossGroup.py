@@ -0,0 +1,272 @@
+#Compare brick representatives across groups when the TC border is below 1.0.
+
+#Remove redundancy groups bricks by exact total/carbon/nitrogen/oxygen atom numbers, so with "-t" below 1.0
+#two bricks which differ by one atom are never compared. After the groups are done, the representatives
+#of neighbouring groups are compared:
+#1. Groups are sorted by total atom number. For a group of T atoms only the following groups with
+#   T' <= T/tcBorder are visited (tanimoto <= T/T'), and a pair of groups is kept if the element counts
+#   allow tanimoto >= tcBorder.
+#2. Representative pairs of the kept group pairs pass the pairBound.py prefilter and are run with pkcombu in the pool.
+#3. Greedy merge in a fixed order (larger similar list first, then name): each representative absorbs the
+#   later representatives similar to it. The absorbed representative is removed, its similar fragments are
+#   added to the similar list of the one kept, and its branches are added through the pkcombu alignment.
+#Merged pairs are listed in output-log/brick-cross-group.txt.
+
+import bisect
+import os
+import os.path
+import sys
+import time
+from functools import partial
+
+from loader import ReadPathConfigure
+from pkcombuRunner import RunPkcombuList
+from runReport import AddCount, AddItem, FlushMetrics
+from pairBound import GetDescriptor, CanReach, TANI_ROUNDING
+from fragRecord import BRANCH_HEAD, StripSimilarList, CountAtoms
+from fragmentLayout import ListFragments, LayoutPath, RemoveFragment
+
+
+def SplitRecords(lines):
+    # lines of a combined sdf file -> [[lines of one fragment], ...]
+    recordList=[]
+    tempLines=[]
+    for line in lines:
+        tempLines.append(line)
+        if line[:4] == '$$$$':
+            recordList.append(tempLines)
+            tempLines=[]
+    return recordList
+
+
+def ReadRepresentatives(outputDir, stream):
+    # [[name, fragment lines, similar list], ...] of the bricks after remove redundancy
+    repList=[]
+    if stream == 1:
+        with open(outputDir+'BrickUnique.sdf', 'r') as inf:
+            recordList=SplitRecords(inf.readlines())
+        for lines in recordList:
+            [newLines, similarList]=StripSimilarList(lines)
+            repList.append([os.path.basename(similarList[0]), lines, similarList])
+    else:
+        for relPath in sorted(ListFragments(outputDir+'output-brick/'), key=os.path.basename):
+            with open(outputDir+'output-brick/'+relPath, 'r') as inf:
+                lines=inf.readlines()
+            [newLines, similarList]=StripSimilarList(lines)
+            repList.append([os.path.basename(relPath), lines, similarList])
+    return repList
+
+
+def GroupBound(countsA, countsB):
+    # tanimoto upper bound of two groups [T, C, N, O] from their element counts
+    otherA=countsA[0]-countsA[1]-countsA[2]-countsA[3]
+    otherB=countsB[0]-countsB[1]-countsB[2]-countsB[3]
+    maxCommon=min(countsA[1], countsB[1])+min(countsA[2], countsB[2])+min(countsA[3], countsB[3])+min(otherA, otherB)
+    return float(maxCommon)/(countsA[0]+countsB[0]-maxCommon)
+
+
+def FeasibleGroupPairs(groupList, tcBorder):
+    # groupList: [[T, C, N, O], ...], return [[i, j], ...] of the group pairs which can reach tcBorder
+    order=sorted(range(len(groupList)), key=lambda x: groupList[x])
+    totalList=[groupList[x][0] for x in order]
+    pairList=[]
+    for m in range(len(order)):
+        maxTotal=totalList[m]/(tcBorder-TANI_ROUNDING)
+        upper=bisect.bisect_right(totalList, maxTotal)
+        for n in range(m+1, upper):
+            if GroupBound(groupList[order[m]], groupList[order[n]]) >= tcBorder-TANI_ROUNDING:
+                pairList.append([order[m], order[n]])
+    return pairList
+
+
+def EvaluatePairs(outputDir, tcBorder, pairList, pathList=None):
+    # run in the pool, pairList: [[nameA, pathA, nameB, pathB], ...] of one group pair
+    # return [[nameA, nameB, alignment], ...] of the similar pairs
+    if pathList == None:
+        pathList=ReadPathConfigure()
+        if pathList == None:
+            sys.exit()
+
+    startTime=time.time()
+    descriptorCache={}
+    similarPairs=[]
+    pruned=0
+    candidateMap={}
+    pathAList=[]
+    for [nameA, pathA, nameB, pathB] in pairList:
+        if not CanReach(GetDescriptor(descriptorCache, pathA), GetDescriptor(descriptorCache, pathB), tcBorder):
+            pruned=pruned+1
+            continue
+        if pathA not in candidateMap:
+            candidateMap[pathA]=[]
+            pathAList.append(pathA)
+        candidateMap[pathA].append([nameA, nameB, pathB])
+
+    for pathA in pathAList:
+        resultList=RunPkcombuList(pathList[1], pathA, [x[2] for x in candidateMap[pathA]])
+        for [[nameA, nameB, pathB], [tnm, ali]] in zip(candidateMap[pathA], resultList):
+            if float(tnm) >= tcBorder:
+                similarPairs.append([nameA, nameB, ali])
+
+    AddCount('brick-cross-pairs-evaluated', len(pairList)-pruned)
+    AddCount('brick-cross-pairs-pruned', pruned)
+    AddItem('brick-cross-group', pairList[0][0]+' '+pairList[0][2] if len(pairList) > 0 else '', time.time()-startTime, {'pairs':len(pairList)})
+    FlushMetrics(outputDir, 'brick')
+    return similarPairs
+
+
+def GreedyMerge(repList, similarPairs):
+    # return {kept name: [[absorbed name, alignment kept atom -> absorbed atom], ...]}
+    order=sorted(range(len(repList)), key=lambda x: (-len(repList[x][2]), repList[x][0]))
+    rank={}
+    for i in range(len(order)):
+        rank[repList[order[i]][0]]=i
+
+    neighborMap={}
+    for [nameA, nameB, ali] in similarPairs:
+        aliList=[x.split() for x in ali.split('|') if len(x.split()) == 2]
+        neighborMap.setdefault(nameA, []).append([nameB, [[x[0], x[1]] for x in aliList]])
+        neighborMap.setdefault(nameB, []).append([nameA, [[x[1], x[0]] for x in aliList]])
+
+    absorbed={}
+    mergeMap={}
+    for i in order:
+        name=repList[i][0]
+        if name in absorbed:
+            continue
+        for [otherName, aliList] in sorted(neighborMap.get(name, []), key=lambda x: rank[x[0]]):
+            if (rank[otherName] > rank[name]) and (otherName not in absorbed):
+                absorbed[otherName]=name
+                mergeMap.setdefault(name, []).append([otherName, aliList])
+    return mergeMap
+
+
+def BranchLines(lines):
+    # [[atom number, [atom types]], ...] of the BRANCH appendix
+    branchList=[]
+    inBranch=0
+    for line in lines:
+        tempStr=line.replace('\n','').strip()
+        if BRANCH_HEAD in tempStr:
+            inBranch=1
+        elif (tempStr[:1] == '>') or (tempStr == '$$$$'):
+            inBranch=0
+        elif (inBranch == 1) and (len(tempStr.split()) > 1):
+            branchList.append([tempStr.split()[0], tempStr.split()[1:]])
+    return branchList
+
+
+def MergedLines(keptLines, keptSimilar, absorbedList):
+    # absorbedList: [[lines, similar list, alignment kept atom -> absorbed atom], ...]
+    col1=[] #atom number list
+    col2=[] #atom type list of each atom number
+    branchList=BranchLines(keptLines)
+    for [lines, similarList, aliList] in absorbedList:
+        aliMap={}
+        for [keptAtom, absorbedAtom] in aliList:
+            aliMap[absorbedAtom]=keptAtom
+        for [atomNum, typeList] in BranchLines(lines):
+            if atomNum in aliMap:
+                branchList.append([aliMap[atomNum], typeList])
+    for [atomNum, typeList] in branchList:
+        if atomNum not in col1:
+            col1.append(atomNum)
+            col2.append([])
+        for atomType in typeList:
+            if atomType not in col2[col1.index(atomNum)]:
+                col2[col1.index(atomNum)].append(atomType)
+
+    branchHead=list(filter(lambda x: BRANCH_HEAD in x, keptLines))
+    newLines=keptLines[:keptLines.index(branchHead[0])+1]
+    for i in range(len(col1)):
+        newLines.append(' '.join([col1[i]]+col2[i])+'\n')
+    newLines.append('\n')
+
+    similarList=list(keptSimilar)
+    for [lines, absorbedSimilar, aliList] in absorbedList:
+        for similar in absorbedSimilar:
+            if similar not in similarList:
+                similarList.append(similar)
+    newLines.append('\n> <fragments similar> \n')
+    newLines=newLines+[x+'\n' for x in similarList]
+    newLines.append('\n')
+    newLines.append('$$$$\n')
+    return [newLines, similarList]
+
+
+def CrossGroupMerge(outputDir, tcBorder, pool, pathList=None, stream=0):
+    # return [group pairs visited, representative pairs compared, representatives merged]
+
+    repList=ReadRepresentatives(outputDir, stream)
+    groupMap={}
+    for i in range(len(repList)):
+        [newLines, similarList]=StripSimilarList(repList[i][1])
+        groupKey=tuple(CountAtoms(newLines))
+        groupMap.setdefault(groupKey, []).append(i)
+    groupKeyList=sorted(groupMap.keys())
+
+    taskList=[]
+    for [m, n] in FeasibleGroupPairs([list(x) for x in groupKeyList], tcBorder):
+        pairList=[]
+        for i in groupMap[groupKeyList[m]]:
+            for j in groupMap[groupKeyList[n]]:
+                pairList.append([repList[i][0], repList[i][2][0], repList[j][0], repList[j][2][0]])
+        taskList.append(pairList)
+    taskList=sorted(taskList, key=lambda x: len(x), reverse=True)
+
+    similarPairs=[]
+    for pairs in pool.map(partial(EvaluatePairs, outputDir, tcBorder, pathList=pathList), taskList):
+        similarPairs=similarPairs+pairs
+
+    mergeMap=GreedyMerge(repList, similarPairs)
+    repIndex={}
+    for i in range(len(repList)):
+        repIndex[repList[i][0]]=i
+
+    absorbedNames={}
+    redOutMap={}
+    crossLog=[]
+    for name in mergeMap:
+        absorbedList=[]
+        for [otherName, aliList] in mergeMap[name]:
+            absorbedNames[otherName]=1
+            absorbedList.append([repList[repIndex[otherName]][1], repList[repIndex[otherName]][2], aliList])
+            crossLog.append(repList[repIndex[name]][2][0]+':'+repList[repIndex[otherName]][2][0]+'\n')
+        [newLines, similarList]=MergedLines(repList[repIndex[name]][1], repList[repIndex[name]][2], absorbedList)
+        repList[repIndex[name]][1]=newLines
+        redOutMap[repList[repIndex[name]][2][0]]=similarList
+
+    if stream == 1:
+        with open(outputDir+'BrickUnique.sdf', 'w') as outf:
+            for [name, lines, similarList] in repList:
+                if name not in absorbedNames:
+                    outf.writelines(lines)
+    else:
+        for name in mergeMap:
+            with open(LayoutPath(outputDir+'output-brick/', name), 'w') as outf:
+                outf.writelines(repList[repIndex[name]][1])
+        for name in absorbedNames:
+            RemoveFragment(outputDir+'output-brick/', name)
+
+    # bricks-red-out.txt: one line per representative
+    absorbedPaths={}
+    for name in absorbedNames:
+        absorbedPaths[repList[repIndex[name]][2][0]]=1
+    redOutPath=outputDir+'output-log/bricks-red-out.txt'
+    if os.path.exists(redOutPath):
+        with open(redOutPath, 'r') as inf:
+            redOutLines=inf.readlines()
+        with open(redOutPath, 'w') as outf:
+            for line in redOutLines:
+                repPath=line.split(':')[0]
+                if repPath in absorbedPaths:
+                    continue
+                if repPath in redOutMap:
+                    line=repPath+':'+' '.join(redOutMap[repPath])+'\n'
+                outf.write(line)
+
+    with open(outputDir+'output-log/brick-cross-group.txt', 'at') as outf:
+        outf.writelines(crossLog)
+
+    AddCount('brick-cross-merged', len(absorbedNames))
+    return [len(taskList), sum([len(x) for x in taskList]), len(absorbedNames)]
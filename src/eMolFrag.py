@@ -15,8 +15,7 @@
 #   - chopRDKit03.py,
 #   - combineLinkers01.py 
 #   - rmRed01.py, 
-#   - rmRedLinker03.py, 
-#   - mol-ali-04.py. 
+#   - rmRedLinker03.py. 
 
 #Usage: Read README file for detailed information.
 # 1. Configure path: python ConfigurePath.py    # Path only need to be set before the first run if no changes to the paths.
@@ -25,7 +24,7 @@
 #Args:
 #   - /Path to Python/           ... Use python to run the script
 #   - /Path to scripts/echop.py ... The directory of scripts and the name of the entrance to the software
-#   - /Path to input directory/  ... The path to the input directory, in which is the input molecules in *.mol2 format
+#   - /Path to input directory/  ... The path to the input directory, in which is the input molecules in *.mol2 or *.sdf format
 #   - /Path to output directory/ ... The path to the output directory, in which is the output files
 #   - Number-Of-Cores            ... Number of processings to be used in the run 
 
@@ -71,16 +70,93 @@ from multiprocessing import Pool
 from functools import partial
 
 
+# Long options, given in any place after the script name: name -> number of values
+EXTRA_OPTIONS = {'--shard': 1, '--conn-index': 0, '--lsh': 0, '--stream-dedupe': 0, '--max-tasks': 1, '--worker-rss': 1, '--scratch': 1, '--plan': 0, '--plan-report': 1, '--dedupe-inputs': 0, '--layout': 1, '--input-list': 1, '--profile': 0, '--heavy': 0}
+
+
+def SplitExtraArgs(args):
+    # Separate long options from the positional -i/-o/-p/-m/-c/-t arguments
+    mainArgs = []
+    runOptions = {}
+    i = 0
+    while i < len(args):
+        if args[i] in EXTRA_OPTIONS:
+            valueNum = EXTRA_OPTIONS[args[i]]
+            if valueNum == 0:
+                runOptions[args[i][2:]] = 1
+            elif i + valueNum < len(args):
+                runOptions[args[i][2:]] = args[i+1]
+            else:
+                print('Error Code: 1200. Missing value of ' + args[i] + '.')
+                return
+            i = i + valueNum + 1
+        else:
+            mainArgs.append(args[i])
+            i = i + 1
+    return [mainArgs, runOptions]
+
+
+def ParseRunOptions(runOptions):
+    # Convert long option values, return None if any of them is invalid
+    if 'shard' in runOptions:
+        try:
+            [shardInd, shardNum] = [int(x) for x in runOptions['shard'].split('/')]
+        except:
+            print('Error Code: 1201. Invalid shard, use --shard i/N.')
+            return
+        if (shardNum < 1) or (shardInd < 0) or (shardInd >= shardNum):
+            print('Error Code: 1201. Invalid shard, use --shard i/N with 0 <= i < N.')
+            return
+        runOptions['shard'] = [shardInd, shardNum]
+    for name in ['max-tasks', 'worker-rss']:
+        # tasks of a worker before it is replaced, RSS in MB above which the workers are replaced (0: no limit)
+        if name in runOptions:
+            try:
+                runOptions[name] = int(runOptions[name])
+            except:
+                print('Error Code: 1203. Invalid ' + name + ', use --' + name + ' N.')
+                return
+            if runOptions[name] < 0:
+                print('Error Code: 1203. Invalid ' + name + ', use --' + name + ' N with N >= 0.')
+                return
+    if runOptions.get('max-tasks') == 0:
+        runOptions['max-tasks'] = None
+    if 'scratch' in runOptions:
+        # intermediate folders on node-local disk or tmpfs (scratchDir.py)
+        from scratchDir import ScratchRoot
+        if not os.path.isdir(ScratchRoot(runOptions['scratch'])):
+            print('Error Code: 1204. Scratch path ' + ScratchRoot(runOptions['scratch']) + ' does not exist, use --scratch local, tmpfs or an existing path.')
+            return
+    if 'input-list' in runOptions:
+        # input files listed in a file instead of the files under -i (inputDiscovery.py)
+        if not os.path.isfile(runOptions['input-list']):
+            print('Error Code: 1206. Input list ' + runOptions['input-list'] + ' does not exist.')
+            return
+        runOptions['input-list'] = os.path.abspath(runOptions['input-list'])
+    if runOptions.get('layout', 'flat') not in ['flat', 'sharded']:
+        # fragment files in hash-prefixed folders with a manifest (fragmentLayout.py)
+        print('Error Code: 1205. Invalid layout, use --layout flat or sharded.')
+        return
+    return runOptions
+
+
 def ParseArgs():
     #input and output path define and create
-    args=sys.argv
+    try:
+        [args, runOptions] = SplitExtraArgs(sys.argv)
+    except:
+        print('Error Code: 1019. Unknown error.')
+        return
     #inputFolderPath=args[1]
     #outputDir=args[2]
     mainEntryPath=os.path.abspath(args[0])
+    if ('input-list' in runOptions) and ((len(args) < 2) or (args[1] != '-i')):
+        # --input-list without -i: relative entries are taken from the folder of the list
+        args = args[:1] + ['-i', os.path.dirname(os.path.abspath(runOptions['input-list']))] + args[1:]
     
     inputFolderPath = []
     outputDir = []
-    processNum = 1
+    processNum = 0 # -p not given: from the CPUs and memory of the cgroup
     outputSelection = 0
     outputFormat = 0
     tcBorder = 1.0
@@ -145,7 +221,7 @@ def ParseArgs():
                 
                 # output format
                 tempOutputFormat = int(argList[9])
-                if (tempOutputFormat >= 0) and (tempOutputFormat <= 2):
+                if (tempOutputFormat >= 0) and (tempOutputFormat <= 3):
                     outputFormat = tempOutputFormat
                 else:
                     paraFlag = 0
@@ -179,7 +255,7 @@ def ParseArgs():
                 
                 # output format
                 tempOutputFormat = int(argList[9])
-                if (tempOutputFormat >= 0) and (tempOutputFormat <= 2):
+                if (tempOutputFormat >= 0) and (tempOutputFormat <= 3):
                     outputFormat = tempOutputFormat
                 else:
                     paraFlag = 0
@@ -217,7 +293,7 @@ def ParseArgs():
                 
                 # output format
                 tempOutputFormat = int(argList[7])
-                if (tempOutputFormat >= 0) and (tempOutputFormat <= 2):
+                if (tempOutputFormat >= 0) and (tempOutputFormat <= 3):
                     outputFormat = tempOutputFormat
                 else:
                     paraFlag = 0
@@ -240,7 +316,7 @@ def ParseArgs():
                 
                 # output format
                 tempOutputFormat = int(argList[7])
-                if (tempOutputFormat >= 0) and (tempOutputFormat <= 2):
+                if (tempOutputFormat >= 0) and (tempOutputFormat <= 3):
                     outputFormat = tempOutputFormat
                 else:
                     paraFlag = 0
@@ -282,7 +358,7 @@ def ParseArgs():
                 
                 # output format
                 tempOutputFormat = int(argList[7])
-                if (tempOutputFormat >= 0) and (tempOutputFormat <= 2):
+                if (tempOutputFormat >= 0) and (tempOutputFormat <= 3):
                     outputFormat = tempOutputFormat
                 else:
                     paraFlag = 0
@@ -313,7 +389,7 @@ def ParseArgs():
                 
                 # output format
                 tempOutputFormat = int(argList[7])
-                if (tempOutputFormat >= 0) and (tempOutputFormat <= 2):
+                if (tempOutputFormat >= 0) and (tempOutputFormat <= 3):
                     outputFormat = tempOutputFormat
                 else:
                     paraFlag = 0
@@ -337,7 +413,7 @@ def ParseArgs():
             elif (argList[4] == '-c') and (argList[6] == '-t'):
                 # output format
                 tempOutputFormat = int(argList[5])
-                if (tempOutputFormat >= 0) and (tempOutputFormat <= 2):
+                if (tempOutputFormat >= 0) and (tempOutputFormat <= 3):
                     outputFormat = tempOutputFormat
                 else:
                     paraFlag = 0
@@ -374,7 +450,7 @@ def ParseArgs():
             elif (argList[4] == '-c'):
                 # output format
                 tempOutputFormat = int(argList[5])
-                if (tempOutputFormat >= 0) and (tempOutputFormat <= 2):
+                if (tempOutputFormat >= 0) and (tempOutputFormat <= 3):
                     outputFormat = tempOutputFormat
                 else:
                     paraFlag = 0
@@ -407,12 +483,47 @@ def ParseArgs():
         print('Error Code: 1019. Unknown error.')
         return
 
+    runOptions = ParseRunOptions(runOptions)
+    if runOptions == None:
+        return
+
+    if 'shard' in runOptions:
+        # every shard writes a complete run into its own folder of the shared output path
+        if (outputSelection == 1) or (outputFormat != 0):
+            print('Error Code: 1202. Shard mode needs redundancy removal (-m 0 or 2) and -c 0.')
+            return
+        [shardInd, shardNum] = runOptions['shard']
+        outputDir = outputDir + 'shard-' + str(shardInd).zfill(3) + '-of-' + str(shardNum).zfill(3) + '/'
+
+    if ('lsh' in runOptions) and (tcBorder >= 1.0):
+        print('--lsh is only used with a TC border below 1.0 (-t), all pairs are compared.')
+
+    if ('lsh' in runOptions) and ('stream-dedupe' in runOptions):
+        print('--lsh is not used with --stream-dedupe, all pairs of a bucket are compared.')
+
+    if processNum == 0:
+        from workerPool import DefaultWorkerNum
+        processNum = DefaultWorkerNum()
+
     print(inputFolderPath, outputDir, processNum, outputSelection, outputFormat, tcBorder)
-    return [mainEntryPath, inputFolderPath, outputDir, processNum, outputSelection, outputFormat, tcBorder]
+    return [mainEntryPath, inputFolderPath, outputDir, processNum, outputSelection, outputFormat, tcBorder, runOptions]
 
 
 
-def PrepareEnv(outputDir, mainEntryPath, processNum):
+def PrepareEnv(outputDir, mainEntryPath, processNum, runOptions={}):
+    try:
+        # shared output path of shard runs, may be created by another node at the same time
+        sharedDir = os.path.dirname(os.path.dirname(outputDir))
+        if os.path.basename(os.path.dirname(outputDir))[:6] == 'shard-':
+            if not os.path.exists(sharedDir):
+                try:
+                    os.makedirs(sharedDir)
+                except OSError:
+                    pass
+    except:
+        print('Error Code: 1022. Failed to create shared output path.')
+        return
+
     try:
         # check output folder conflict or not
         # detect output folder
@@ -511,37 +622,41 @@ def PrepareEnv(outputDir, mainEntryPath, processNum):
         return
     
     try:
-        pool=Pool(processes=processNum)
+        from pkcombuRunner import PkcombuPool
+        from workerPool import WORKER_MAX_TASKS, WORKER_RSS_LIMIT_MB
+        profileFolder=None
+        if runOptions.get('profile') == 1:
+            # cProfile in every worker (workerProfile.py)
+            from workerProfile import PROFILE_FOLDER
+            profileFolder=outputDir+'output-log/'+PROFILE_FOLDER
+        pool=PkcombuPool(processNum, runOptions.get('max-tasks', WORKER_MAX_TASKS), runOptions.get('worker-rss', WORKER_RSS_LIMIT_MB), profileFolder)
     except:
         print('Error Code: 1040.')
         return
 
     try:
-        outputFolderPath_log=outputDir+'output-log/'
-        outputFolderPath_chop=outputDir+'output-chop/'
-        outputFolderPath_active=outputDir+'output-brick/'
-        outputFolderPath_linker=outputDir+'output-linker/'
-        outputFolderPath_sdf=outputDir+'output-sdf/'
-        outputFolderPath_chop_comb=outputDir+'output-chop-comb/'
-
-        if not os.path.exists(outputDir):
-            os.mkdir(outputDir)
-        if not os.path.exists(outputFolderPath_log):
-            os.mkdir(outputFolderPath_log)
-        if not os.path.exists(outputFolderPath_chop):
-            os.mkdir(outputFolderPath_chop)
-        if not os.path.exists(outputFolderPath_active):
-            os.mkdir(outputFolderPath_active)
-        if not os.path.exists(outputFolderPath_linker):
-            os.mkdir(outputFolderPath_linker)
-        if not os.path.exists(outputFolderPath_sdf):
-            os.mkdir(outputFolderPath_sdf)
-        if not os.path.exists(outputFolderPath_chop_comb):
-            os.mkdir(outputFolderPath_chop_comb)
+        outputPathList = CreateOutputFolders(outputDir)
     except:
         print('Error Code: 1050.')
         return
 
+    if 'scratch' in runOptions:
+        try:
+            from scratchDir import SetupScratch
+            scratchDir = SetupScratch(outputPathList[0], runOptions['scratch'])
+            print('Intermediate files: ' + scratchDir)
+        except:
+            print('Error Code: 1051. Failed to create scratch folders.')
+            return
+
+    if runOptions.get('layout') == 'sharded':
+        try:
+            from fragmentLayout import ShardFolders
+            ShardFolders(outputPathList[0])
+        except:
+            print('Error Code: 1052. Failed to create sharded output folders.')
+            return
+
     try:
         try:
             from loader import Loader
@@ -564,11 +679,37 @@ def PrepareEnv(outputDir, mainEntryPath, processNum):
         print('Error Code: 1060.')
         return
 
-    outputPathList = [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb]
     return [outputPathList, pool]
 
 
-def ProcessData(inputFolderPath, outputPathList, outputSelection, outputFormat, tcBorder, pool):
+def CreateOutputFolders(outputDir):
+    outputFolderPath_log=outputDir+'output-log/'
+    outputFolderPath_chop=outputDir+'output-chop/'
+    outputFolderPath_active=outputDir+'output-brick/'
+    outputFolderPath_linker=outputDir+'output-linker/'
+    outputFolderPath_sdf=outputDir+'output-sdf/'
+    outputFolderPath_chop_comb=outputDir+'output-chop-comb/'
+
+    if not os.path.exists(outputDir):
+        os.mkdir(outputDir)
+    if not os.path.exists(outputFolderPath_log):
+        os.mkdir(outputFolderPath_log)
+    if not os.path.exists(outputFolderPath_chop):
+        os.mkdir(outputFolderPath_chop)
+    if not os.path.exists(outputFolderPath_active):
+        os.mkdir(outputFolderPath_active)
+    if not os.path.exists(outputFolderPath_linker):
+        os.mkdir(outputFolderPath_linker)
+    if not os.path.exists(outputFolderPath_sdf):
+        os.mkdir(outputFolderPath_sdf)
+    if not os.path.exists(outputFolderPath_chop_comb):
+        os.mkdir(outputFolderPath_chop_comb)
+
+    outputPathList = [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb]
+    return outputPathList
+
+
+def ProcessData(inputFolderPath, outputPathList, outputSelection, outputFormat, tcBorder, pool, runOptions={}):
     try:
         [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     except:
@@ -592,33 +733,83 @@ def ProcessData(inputFolderPath, outputPathList, outputSelection, outputFormat,
     except:
         print('Error Code: 1071. Failed to write log file.')
 
+    # Output format 1/2/3: fragments are streamed into the combined sdf files as they are written
+    stream = 0
+    streamFull = 0
+    if (outputFormat == 1) or (outputFormat == 2) or (outputFormat == 3):
+        stream = 1
+        if outputSelection == 0:
+            streamFull = 1 # keep output-chop-comb as input of remove redundancy
+        elif outputSelection == 1:
+            streamFull = 2 # output-chop-comb is not needed
+
+    stageStartTime = time.time()
     try:
-        GetInputList(inputFolderPath, outputFolderPath_log)
+        inputList = GetInputList(inputFolderPath, outputFolderPath_log, runOptions)
+        PrintLog(outputFolderPath_log+'Process.log', ' Input Files: '+str(len(inputList))+' ')
     except:
         print('Error Code: 1072.')
         return
+    stageStartTime = StageDone('input', stageStartTime, pool, outputFolderPath_log)
 
-    try:
-        Chop(outputPathList, pool)
-    except:
-        print('Error Code: 1073.')
-        return
+    if runOptions.get('dedupe-inputs') == 1:
+        # chop one input of each structure (inputDedupe.py)
+        try:
+            from inputDedupe import DedupeInputs
+            keptList = DedupeInputs(outputPathList, pool, inputList)
+            PrintLog(outputFolderPath_log+'Process.log', ' Duplicate Inputs: '+str(len(inputList)-len(keptList))+' of '+str(len(inputList))+' ')
+            inputList = keptList
+        except:
+            print('Error Code: 1079. Failed to remove duplicate inputs.')
+            return
+        stageStartTime = StageDone('dedupe', stageStartTime, pool, outputFolderPath_log)
 
-    if (outputSelection == 0) or (outputSelection == 2):
+    streamDedupe = 0
+    if (runOptions.get('stream-dedupe', 0) == 1) and ((outputSelection == 0) or (outputSelection == 2)):
+        streamDedupe = 1
+
+    if streamDedupe == 1:
+        # remove redundancy of each bucket while the molecules are chopped
         try:
-            RmBrickRedundancy(outputPathList, tcBorder, pool)
+            StreamChopRedundancy(outputPathList, tcBorder, pool, streamFull, stream, inputList=inputList, heavy=runOptions.get('heavy', 0))
         except:
-            print('Error Code: 1074.')
+            print('Error Code: 1078.')
             return
+        stageStartTime = StageDone('stream', stageStartTime, pool, outputFolderPath_log)
+    else:
+        try:
+            Chop(outputPathList, pool, streamFull, inputList, runOptions.get('heavy', 0))
+        except:
+            print('Error Code: 1073.')
+            return
+        stageStartTime = StageDone('chop', stageStartTime, pool, outputFolderPath_log)
 
+    if (streamDedupe == 0) and ((outputSelection == 0) or (outputSelection == 2)):
         try:
-            RmLinkerRedundancy(outputPathList, pool)
+            RmRedundancy(outputPathList, tcBorder, pool, stream=stream, lsh=runOptions.get('lsh', 0))
         except:
-            print('Error Code: 1075.')
+            # bricks 1074, linkers 1075 are reported by RmRedundancy
+            print('Error Code: 1074-1075.')
             return
+        stageStartTime = StageDone('redundancy', stageStartTime, pool, outputFolderPath_log)
     else:
         pass
 
+    if runOptions.get('dedupe-inputs') == 1:
+        # fragments and similar lists of the duplicate inputs
+        try:
+            from inputDedupe import FanOutDuplicates
+            FanOutDuplicates(outputPathList)
+        except:
+            print('Error Code: 1079-1. Failed to write the fragments of duplicate inputs.')
+            return
+
+    # Run report
+    try:
+        FinishRunReport(outputDir)
+    except:
+        print('Error Code: 1077. Failed to write run report.')
+
     # End Work
     try:
         path = outputFolderPath_log+'Process.log'
@@ -636,26 +827,30 @@ def AdjustOutput(outputPathList, outputSelection, outputFormat):
     except:
         print('Error Code: 1130. Failed to parse output path list.')
         return
+    from scratchDir import RemoveFolder
 
     #Step 5: Clear temp file and directory.
     if outputSelection == 0: # default output selection, full process and output, left 4 folders: log, brick, linker, chop-comb
-        shutil.rmtree(outputFolderPath_chop)
-        shutil.rmtree(outputFolderPath_sdf)
+        RemoveFolder(outputFolderPath_chop)
+        RemoveFolder(outputFolderPath_sdf)
     elif outputSelection == 1: # only chop and reconnect, not remove redundancy, left 2 folders: log, chop-comb
-        shutil.rmtree(outputFolderPath_chop)
-        shutil.rmtree(outputFolderPath_sdf)
-        shutil.rmtree(outputFolderPath_active)
-        shutil.rmtree(outputFolderPath_linker)
+        RemoveFolder(outputFolderPath_chop)
+        RemoveFolder(outputFolderPath_sdf)
+        RemoveFolder(outputFolderPath_active)
+        RemoveFolder(outputFolderPath_linker)
     elif outputSelection == 2: # chop and remove redundancy, but remove temp files, left 3 folders: log brick, linker
-        shutil.rmtree(outputFolderPath_chop)
-        shutil.rmtree(outputFolderPath_sdf)
-        shutil.rmtree(outputFolderPath_chop_comb)
+        RemoveFolder(outputFolderPath_chop)
+        RemoveFolder(outputFolderPath_sdf)
+        RemoveFolder(outputFolderPath_chop_comb)
     else:
         print('Error Code: 1131. Invalid output selection.')
         return
 
     if outputFormat == 0: # default output format, traditional format, each file only contain one molecule
-        pass
+        from fragmentLayout import MergeManifest
+        for folderPath in [outputFolderPath_active, outputFolderPath_linker, outputFolderPath_chop_comb]:
+            if os.path.exists(folderPath):
+                MergeManifest(folderPath)
     elif outputFormat == 1: # only one brick file and only one linker file, one folder for log
         if outputSelection == 0:  # 4 output files, (brick, linker)*(before remove, after remove)
             try:
@@ -678,7 +873,10 @@ def AdjustOutput(outputPathList, outputSelection, outputFormat):
         else:
             print('Error Code: 1133.')
             return
-    elif outputFormat == 2: # only bricks and linkers, no log folder
+    elif outputFormat == 2: # only bricks and linkers, no log folder, keep the run report
+        for reportName in ['RunReport.json', 'RunReport.csv', 'SlowestItems.txt', 'HotFunctions.txt', 'profile']:
+            if os.path.exists(outputFolderPath_log+reportName):
+                shutil.move(outputFolderPath_log+reportName, outputDir+reportName)
         shutil.rmtree(outputFolderPath_log)
         if outputSelection == 0:  # 4 output files, (brick, linker)*(before remove, after remove)
             try:
@@ -701,91 +899,75 @@ def AdjustOutput(outputPathList, outputSelection, outputFormat):
         else:
             print('Error Code: 1133.')
             return
+    elif outputFormat == 3: # one database file for all the fragments, one folder for log
+        try:
+            AdjustSub3(outputPathList, outputSelection)
+        except:
+            print('Error Code: 1137.')
+            return
     else:
         print('Error Code: 1132. Invalid output format.')
         return
 
 
+def ConcatFragments(folderPath, prefixList, destPathList):
+    # write the fragment files of folderPath into the combined sdf files, through one handle each
+    # prefixList[i]: first letter of the fragment file names written to destPathList[i]
+    # destinations already written by the streaming writer (sdfStream.py) are kept as they are
+    if False not in [os.path.exists(x) for x in destPathList]:
+        return
+
+    [filePathList, fileNameList] = GetFileList(folderPath)
+    outfList = []
+    for destPath in destPathList:
+        if os.path.exists(destPath):
+            outfList.append(None)
+        else:
+            outfList.append(open(destPath, 'at'))
+    try:
+        for i in range(len(filePathList)):
+            if fileNameList[i][0] in prefixList:
+                outf = outfList[prefixList.index(fileNameList[i][0])]
+                if outf != None:
+                    with open(filePathList[i], 'r') as inf:
+                        shutil.copyfileobj(inf, outf)
+    finally:
+        for outf in outfList:
+            if outf != None:
+                outf.close()
+
+
 def AdjustSub0(outputPathList):
     try:
         [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     except:
         print('Error Code: 1140. Failed to parse output path list.')
         return
+    from scratchDir import RemoveFolder
 
     try:
-        [combFilePath, combFileName] = GetFileList(outputFolderPath_chop_comb)
-    except:
-        print('Error Code: 1141.')
-        return
-
-    try:
-        tempBrickContent = []
-        tempLinkerContent = []
         b4rmBrickPath = outputDir + 'BrickFull.sdf'
         b4rmLinkerPath = outputDir + 'LinkerFull.sdf'
-        for i in range(len(combFilePath)):
-            if combFileName[i][0] == 'b':
-                with open(combFilePath[i], 'r') as inf:
-                    tempBrickContent = inf.readlines()
-                with open(b4rmBrickPath, 'at') as outf:
-                    outf.writelines(tempBrickContent)
-                
-                tempBrickContent = []
-            elif combFileName[i][0] == 'l':
-                with open(combFilePath[i], 'r') as inf:
-                    tempLinkerContent = inf.readlines()
-                with open(b4rmLinkerPath, 'at') as outf:
-                    outf.writelines(tempLinkerContent)
-                
-                tempLinkerContent = []
-            else:
-                pass
+        ConcatFragments(outputFolderPath_chop_comb, ['b', 'l'], [b4rmBrickPath, b4rmLinkerPath])
     except:
         print('Error Code: 1142.')
 
     try:
-        [brickFilePath, brickFileName] = GetFileList(outputFolderPath_active)
-    except:
-        print('Error Code: 1143.')
-
-    try:
-        tempBrickContent = []
         rmdBrickPath = outputDir + 'BrickUnique.sdf'
-        for i in range(len(brickFilePath)):
-            if brickFileName[i][0] == 'b':
-                with open(brickFilePath[i], 'r') as inf:
-                    tempBrickContent = inf.readlines()
-                with open(rmdBrickPath, 'at') as outf:
-                    outf.writelines(tempBrickContent)
-                
-                tempBrickContent = []
+        ConcatFragments(outputFolderPath_active, ['b'], [rmdBrickPath])
     except:
         print('Error Code: 1144.')
 
     try:
-        [linkerFilePath, linkerFileName] = GetFileList(outputFolderPath_linker)
-    except:
-        print('Error Code: 1145.')
-
-    try:
-        tempLinkerContent = []
         rmdLinkerPath = outputDir + 'LinkerUnique.sdf'
-        for i in range(len(linkerFilePath)):
-            if linkerFileName[i][0] == 'l':
-                with open(linkerFilePath[i], 'r') as inf:
-                    tempLinkerContent = inf.readlines()
-                with open(rmdLinkerPath, 'at') as outf:
-                    outf.writelines(tempLinkerContent)
-                
-                tempLinkerContent = []
+        ConcatFragments(outputFolderPath_linker, ['l'], [rmdLinkerPath])
     except:
         print('Error Code: 1146.')
 
     try:
-        shutil.rmtree(outputFolderPath_chop_comb)
-        shutil.rmtree(outputFolderPath_active)
-        shutil.rmtree(outputFolderPath_linker)
+        RemoveFolder(outputFolderPath_chop_comb)
+        RemoveFolder(outputFolderPath_active)
+        RemoveFolder(outputFolderPath_linker)
     except:
         print('Error Code: 1147. Failed to remove temp files.')
 
@@ -797,40 +979,17 @@ def AdjustSub1(outputPathList):
     except:
         print('Error Code: 1150. Failed to parse output path list.')
         return
+    from scratchDir import RemoveFolder
 
     try:
-        [combFilePath, combFileName] = GetFileList(outputFolderPath_chop_comb)
-    except:
-        print('Error Code: 1151.')
-        return
-
-    try:
-        tempBrickContent = []
-        tempLinkerContent = []
         b4rmBrickPath = outputDir + 'BrickFull.sdf'
         b4rmLinkerPath = outputDir + 'LinkerFull.sdf'
-        for i in range(len(combFilePath)):
-            if combFileName[i][0] == 'b':
-                with open(combFilePath[i], 'r') as inf:
-                    tempBrickContent = inf.readlines()
-                with open(b4rmBrickPath, 'at') as outf:
-                    outf.writelines(tempBrickContent)
-                
-                tempBrickContent = []
-            elif combFileName[i][0] == 'l':
-                with open(combFilePath[i], 'r') as inf:
-                    tempLinkerContent = inf.readlines()
-                with open(b4rmLinkerPath, 'at') as outf:
-                    outf.writelines(tempLinkerContent)
-                
-                tempLinkerContent = []
-            else:
-                pass
+        ConcatFragments(outputFolderPath_chop_comb, ['b', 'l'], [b4rmBrickPath, b4rmLinkerPath])
     except:
         print('Error Code: 1152.')
 
     try:
-        shutil.rmtree(outputFolderPath_chop_comb)
+        RemoveFolder(outputFolderPath_chop_comb)
     except:
         print('Error Code: 1157. Failed to remove temp files.')
 
@@ -842,52 +1001,79 @@ def AdjustSub2(outputPathList):
     except:
         print('Error Code: 1160. Failed to parse output path list.')
         return
+    from scratchDir import RemoveFolder
 
     try:
-        [brickFilePath, brickFileName] = GetFileList(outputFolderPath_active)
+        rmdBrickPath = outputDir + 'BrickUnique.sdf'
+        ConcatFragments(outputFolderPath_active, ['b'], [rmdBrickPath])
     except:
-        print('Error Code: 1163.')
+        print('Error Code: 1164.')
 
     try:
-        tempBrickContent = []
-        rmdBrickPath = outputDir + 'BrickUnique.sdf'
-        for i in range(len(brickFilePath)):
-            if brickFileName[i][0] == 'b':
-                with open(brickFilePath[i], 'r') as inf:
-                    tempBrickContent = inf.readlines()
-                with open(rmdBrickPath, 'at') as outf:
-                    outf.writelines(tempBrickContent)
-                
-                tempBrickContent = []
+        rmdLinkerPath = outputDir + 'LinkerUnique.sdf'
+        ConcatFragments(outputFolderPath_linker, ['l'], [rmdLinkerPath])
     except:
-        print('Error Code: 1164.')
+        print('Error Code: 1166.')
 
     try:
-        [linkerFilePath, linkerFileName] = GetFileList(outputFolderPath_linker)
+        RemoveFolder(outputFolderPath_active)
+        RemoveFolder(outputFolderPath_linker)
     except:
-        print('Error Code: 1165.')
+        print('Error Code: 1167. Failed to remove temp files.')
+
+
 
+
+def AdjustSub3(outputPathList, outputSelection):
     try:
-        tempLinkerContent = []
-        rmdLinkerPath = outputDir + 'LinkerUnique.sdf'
-        for i in range(len(linkerFilePath)):
-            if linkerFileName[i][0] == 'l':
-                with open(linkerFilePath[i], 'r') as inf:
-                    tempLinkerContent = inf.readlines()
-                with open(rmdLinkerPath, 'at') as outf:
-                    outf.writelines(tempLinkerContent)
-                
-                tempLinkerContent = []
+        [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     except:
-        print('Error Code: 1166.')
+        print('Error Code: 1180. Failed to parse output path list.')
+        return
 
     try:
-        shutil.rmtree(outputFolderPath_active)
-        shutil.rmtree(outputFolderPath_linker)
+        from fragmentDB import BuildFragmentDB
+        from scratchDir import RemoveFolder
     except:
-        print('Error Code: 1167. Failed to remove temp files.')
+        print('Error Code: 1181. Failed to load required lib files.')
+        return
 
+    fullPathList = []
+    uniquePathList = []
+    folderList = []
+    if (outputSelection == 0) or (outputSelection == 1):
+        fullPathList = [outputDir + 'BrickFull.sdf', outputDir + 'LinkerFull.sdf']
+        folderList.append(outputFolderPath_chop_comb)
+    if (outputSelection == 0) or (outputSelection == 2):
+        uniquePathList = [outputDir + 'BrickUnique.sdf', outputDir + 'LinkerUnique.sdf']
+        folderList.append(outputFolderPath_active)
+        folderList.append(outputFolderPath_linker)
+
+    try:
+        if outputSelection != 2:
+            ConcatFragments(outputFolderPath_chop_comb, ['b', 'l'], fullPathList)
+        if outputSelection != 1:
+            ConcatFragments(outputFolderPath_active, ['b'], uniquePathList[:1])
+            ConcatFragments(outputFolderPath_linker, ['l'], uniquePathList[1:])
+    except:
+        print('Error Code: 1182.')
+        return
+
+    try:
+        BuildFragmentDB(outputDir, fullPathList, uniquePathList, outputFolderPath_log + 'linker-log.txt', outputFolderPath_log + 'DuplicateInputs.txt')
+    except:
+        print('Error Code: 1183. Failed to write fragment database.')
+        return
 
+    try:
+        for sdfPath in fullPathList + uniquePathList:
+            if os.path.exists(sdfPath):
+                os.remove(sdfPath)
+        for folderPath in folderList:
+            if os.path.exists(folderPath):
+                RemoveFolder(folderPath)
+    except:
+        print('Error Code: 1177. Failed to remove temp files.')
 
 
 def GetFileList(path):
@@ -895,10 +1081,10 @@ def GetFileList(path):
         fileNameList = []
         filePathList = []
         try:
-            for root, dirs, files in os.walk(path):
-                for file in files:
-                    fileNameList.append(file)
-                    filePathList.append(path+file)
+            from fragmentLayout import ListFragments
+            for relPath in ListFragments(path):
+                fileNameList.append(os.path.basename(relPath))
+                filePathList.append(path+relPath)
             return [filePathList, fileNameList]
         except:
             print('Error Code: 1171.')
@@ -908,35 +1094,41 @@ def GetFileList(path):
         return
 
 
-def GetInputList(inputFolderPath, outputFolderPath_log):
-    #Step 1: Get a list of original *.mol2 files
+def GetInputList(inputFolderPath, outputFolderPath_log, runOptions={}):
+    #Step 1: Get a list of original *.mol2 and *.sdf files, kept in memory and recorded in output-log/InputList
     try:
-        fileNameList=[]
-        infilePathList=[]
-        outfilePathList=[]
-
-        try:
-            for root, dirs, files in os.walk(inputFolderPath):
-                for file in files:
-                    fileNameList.append(file)
-                    infilePathList.append(inputFolderPath+file+'\n')
-        except:
-            print('Error Code: 1081.')
-            return
+        from inputDiscovery import DiscoverInputs
+    except:
+        print('Error Code: 1080. Failed to load required lib files.')
+        return
 
-        try:
-            with open(outputFolderPath_log+'InputList','at') as outList:
-                outList.writelines(infilePathList)
-        except:
-            print('Error Code: 1082.')
-            return
+    try:
+        inputList = DiscoverInputs(inputFolderPath, runOptions)
+    except:
+        print('Error Code: 1081. Failed to get input file list.')
+        return
 
+    try:
+        with open(outputFolderPath_log+'InputList','at') as outList:
+            outList.writelines([x+'\n' for x in inputList])
     except:
-        print('Error Code: 1080. Failed to get input file list.')
+        print('Error Code: 1082.')
         return
 
+    return inputList
+
 
-def Chop(outputPathList, pool):
+def ReadInputRecord(outputFolderPath_log):
+    # input list of a run, as recorded in output-log/InputList by GetInputList
+    inputList=[]
+    with open(outputFolderPath_log+'InputList','r') as inList:
+        for lines in inList:
+            inputList.append(lines.replace('\n',''))
+    return inputList
+
+
+def Chop(outputPathList, pool, streamFull=0, inputList=None, heavy=0, chopLog=0):
+    # returns 1, None if failed; chopLog 1: the progress messages of chop go to output-log/Chop.log
     try:
         [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     except:
@@ -945,6 +1137,7 @@ def Chop(outputPathList, pool):
     
     try:
         from chopRDKit03 import ChopWithRDKit
+        from sdfStream import MergeStreams
     except:
         print('Error Code: 1090-01.')
         return
@@ -960,21 +1153,27 @@ def Chop(outputPathList, pool):
         return
     
     try:
-        inputList=[]
-        with open(outputFolderPath_log+'InputList','r') as inList:
-            for lines in inList:
-                inputList.append(lines.replace('\n',''))
+        if inputList == None:
+            inputList=ReadInputRecord(outputFolderPath_log)
     except:
         print('Error Code: 1091.')
         return
 
     try:
-        partial_Chop=partial(ChopWithRDKit, outputDir)
+        partial_Chop=partial(ChopWithRDKit, outputDir, streamFull=streamFull, heavy=heavy, chopLog=chopLog)
         pool.map(partial_Chop,inputList)
     except:
         print('Error Code: 1092.')
         return
 
+    if streamFull != 0:
+        try:
+            MergeStreams(outputDir, 'BrickFull.sdf')
+            MergeStreams(outputDir, 'LinkerFull.sdf')
+        except:
+            print('Error Code: 1092-1. Failed to merge combined sdf files.')
+            return
+
     try:
         # Log
         path = outputFolderPath_log+'Process.log'
@@ -984,17 +1183,15 @@ def Chop(outputPathList, pool):
         print('Error Code: 1093.')
         return
 
-def RmBrickRedundancy(outputPathList, tcBorder, pool):
+    return 1
+
+def GroupBricks(outputPathList):
+    # [brick file name groups, group properties], groups of the same atom counts, None if failed
     try:
         [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     except:
         print('Error Code: 1130. Failed to parse output path list.')
         return
-    try:
-        from rmRedBrick01 import RmBrickRed
-    except:
-        print('Error Code: 1100-01')
-        return
 
     # Brick Part
     #Step 3: Form and group lists by atom numbers
@@ -1050,44 +1247,60 @@ def RmBrickRedundancy(outputPathList, tcBorder, pool):
         print('Error Code: 1105.')
         return
 
-    #Step 4: Generate similarity data and etc.
-    try:
-        fileNameGroup_Rs=sorted(fileNameGroup_R,key=lambda x:len(x),reverse=True) #process long list first
-    except:
-        print('Error Code: 1106.')
-        return
+    return [fileNameGroup_R, atomNumPro_R]
+
 
+def FinishBrickRedundancy(outputPathList, tcBorder, pool, pairCountList, pathList=None, stream=0, lsh=0):
+    # merge streams, compare across groups and log, after all brick groups are done
+    [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     try:
-        partial_RmBrick=partial(RmBrickRed, outputDir, tcBorder)
-        pool.map(partial_RmBrick,fileNameGroup_Rs)
+        from sdfStream import MergeStreams
     except:
-        print('Error Code: 1107.')
+        print('Error Code: 1100-01')
         return
 
+    if stream == 1:
+        try:
+            MergeStreams(outputDir, 'BrickUnique.sdf')
+        except:
+            print('Error Code: 1107-1. Failed to merge combined sdf files.')
+            return
+
+    if tcBorder < 1.0:
+        try:
+            from crossGroup import CrossGroupMerge
+            [groupPairNum, repPairNum, mergedNum] = CrossGroupMerge(outputDir, tcBorder, pool, pathList, stream)
+            path = outputFolderPath_log+'Process.log'
+            msg = ' Brick Cross Group Pairs: '+str(groupPairNum)+' Representative Pairs: '+str(repPairNum)+' Merged: '+str(mergedNum)+' '
+            PrintLog(path, msg)
+        except:
+            print('Error Code: 1107-2. Failed to compare bricks across groups.')
+            return
+
     try:
         # Log
         path = outputFolderPath_log+'Process.log'
+        msg = ' Brick Pairs Evaluated: '+str(sum([x[0] for x in pairCountList]))+' Pruned: '+str(sum([x[1] for x in pairCountList]))+' '
+        if lsh == 1:
+            msg = msg+'LSH Skipped: '+str(sum([x[2] for x in pairCountList]))+' '
+        PrintLog(path, msg)
         msg = ' End Remove Brick Redundancy '
         PrintLog(path, msg)
     except:
         print('Error Code: 1108.')
         return
 
+    return 1
 
-def RmLinkerRedundancy(outputPathList, pool):
+
+def GroupLinkers(outputPathList):
+    # [linker file name groups, group properties], groups of the same atom counts, None if failed
     try:
         [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     except:
         print('Error Code: 1130. Failed to parse output path list.')
         return
 
-    try:
-        from combineLinkers01 import combineLinkers
-        from rmRedLinker04 import RmLinkerRed
-    except:
-        print('Error Code: 1110-01')
-        return
-
     # Linker Part
     #Step 3: Form and group lists by atom numbers
     fileNameAndAtomNumList_L=[]
@@ -1142,43 +1355,267 @@ def RmLinkerRedundancy(outputPathList, pool):
         print('Error Code: 1115.')
         return
 
-    #Step 4: Generate similarity data and etc.
+    return [fileNameGroup_L, atomNumPro_L]
+
+
+def FinishLinkerRedundancy(outputPathList, pairCountList, stream=0):
+    # merge streams and log, after all linker groups are done
+    [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     try:
-        partial_RmLinker=partial(RmLinkerRed, outputDir)
+        from sdfStream import MergeStreams
     except:
-        print('Error Code: 1116.')
+        print('Error Code: 1110-01')
         return
 
-    inputL=[]
+    if stream == 1:
+        try:
+            MergeStreams(outputDir, 'LinkerUnique.sdf')
+        except:
+            print('Error Code: 1119-1. Failed to merge combined sdf files.')
+            return
 
     try:
-        for i in range(len(fileNameGroup_L)):
-            inputL.append([fileNameGroup_L[i],atomNumPro_L[i]])
+        # Log
+        path = outputFolderPath_log+'Process.log'
+        msg = ' Linker Pairs Evaluated: '+str(sum([x[0] for x in pairCountList]))+' Pruned: '+str(sum([x[1] for x in pairCountList]))+' '
+        PrintLog(path, msg)
+        msg = ' End Remove Linker Redundancy '
+        PrintLog(path, msg)
     except:
-        print('Error Code: 1117.')
+        print('Error Code: 1120.')
         return
 
+    return 1
+
+
+def RmRedundancy(outputPathList, tcBorder, pool, pathList=None, stream=0, lsh=0):
+    # remove redundancy of brick and linker groups in one schedule (bucketScheduler.py), returns 1, None if failed
     try:
-        inputLs=sorted(inputL,key=lambda x:len(x[0]),reverse=True)
+        [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
     except:
-        print('1118.')
+        print('Error Code: 1130. Failed to parse output path list.')
         return
+    try:
+        from rmRedBrick01 import RmBrickRed
+        from rmRedLinker04 import RmLinkerRed
+        from bucketScheduler import GroupAtomNum, BucketCost, RunBuckets
+    except:
+        print('Error Code: 1100-01')
+        return
+
+    #Step 4: Generate similarity data and etc.
+    taskList=[]
+    brickGroupList=GroupBricks(outputPathList)
+    if brickGroupList != None:
+        try:
+            partial_RmBrick=partial(RmBrickRed, outputDir, tcBorder, pathList=pathList, stream=stream, lsh=lsh)
+            for i in range(len(brickGroupList[0])):
+                taskList.append([partial_RmBrick, brickGroupList[0][i], BucketCost(len(brickGroupList[0][i]), GroupAtomNum(brickGroupList[1][i]))])
+        except:
+            print('Error Code: 1106.')
+            return
+    brickTaskNum=len(taskList)
+
+    # linker groups join the same schedule
+    linkerGroupList=GroupLinkers(outputPathList)
+    if linkerGroupList != None:
+        try:
+            partial_RmLinker=partial(RmLinkerRed, outputDir, pathList=pathList, stream=stream)
+        except:
+            print('Error Code: 1116.')
+            return
+        try:
+            for i in range(len(linkerGroupList[0])):
+                taskList.append([partial_RmLinker, [linkerGroupList[0][i], linkerGroupList[1][i]], BucketCost(len(linkerGroupList[0][i]), GroupAtomNum(linkerGroupList[1][i]))])
+        except:
+            print('Error Code: 1117.')
+            return
 
     try:
-        pool.map(partial_RmLinker,inputLs)
+        pairCountList=RunBuckets(pool, taskList)
     except:
-        print('1119.')
+        print('Error Code: 1107.')
+        return
+
+    # a group list is None without fragments of its kind (no list file) or if grouping failed
+    finished=1
+    if (brickGroupList == None) and os.path.exists(outputFolderPath_log+'BrickListAll.txt'):
+        finished=None
+    if (linkerGroupList == None) and os.path.exists(outputFolderPath_log+'LinkerListAll.txt'):
+        finished=None
+    if brickGroupList != None:
+        try:
+            if FinishBrickRedundancy(outputPathList, tcBorder, pool, pairCountList[:brickTaskNum], pathList, stream, lsh) == None:
+                finished=None
+        except:
+            print('Error Code: 1074.')
+            return
+    if linkerGroupList != None:
+        try:
+            if FinishLinkerRedundancy(outputPathList, pairCountList[brickTaskNum:], stream) == None:
+                finished=None
+        except:
+            print('Error Code: 1075.')
+            return
+    return finished
+
+
+def StreamChopRedundancy(outputPathList, tcBorder, pool, streamFull=0, stream=0, pathList=None, inputList=None, heavy=0):
+    # chop and remove redundancy at once (--stream-dedupe, streamIndex.py): the fragments of each chopped molecule
+    # go to the online index of their bucket, the end of the run only writes the representatives of each bucket
+    try:
+        [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
+    except:
+        print('Error Code: 1130. Failed to parse output path list.')
+        return
+    try:
+        import queue
+        from streamIndex import StreamChop, StepBucket, FlushBucket, StreamBuckets
+        from rmRedBrick01 import RmBrickRed
+        from rmRedLinker04 import RmLinkerRed
+        from bucketScheduler import GroupAtomNum, BucketCost, RunBuckets
+        from sdfStream import MergeStreams
+    except:
+        print('Error Code: 1230-01.')
         return
 
     try:
-        # Log
         path = outputFolderPath_log+'Process.log'
-        msg = ' End Remove Linker Redundancy '
-        PrintLog(path, msg)
+        PrintLog(path, ' Start Chop ')
+        PrintLog(path, ' Start Remove Brick Redundancy ')
+        PrintLog(path, ' Start Remove Linker Redundancy ')
     except:
-        print('Error Code: 1120.')
+        print('Error Code: 1230. Failed to write log file.')
         return
 
+    try:
+        if inputList == None:
+            inputList=ReadInputRecord(outputFolderPath_log)
+    except:
+        print('Error Code: 1231.')
+        return
+
+    buckets=StreamBuckets()
+    eventQueue=queue.Queue()
+    chopWindow=2*pool.processes
+    nextInput=0
+    runningChop=0
+    runningStep=0
+
+    while (nextInput < len(inputList)) or (runningChop > 0) or (runningStep > 0):
+        # keep a few molecules ahead in the chop queue, the steps of the buckets run between them
+        while (nextInput < len(inputList)) and (runningChop < chopWindow):
+            pool.apply_async(StreamChop, (outputDir, streamFull, inputList[nextInput], heavy),
+                callback=lambda result: eventQueue.put(['chop', result]),
+                error_callback=lambda error, inputPath=inputList[nextInput]: eventQueue.put(['chop', None, inputPath]))
+            nextInput=nextInput+1
+            runningChop=runningChop+1
+
+        event=eventQueue.get()
+        if event[0] == 'chop':
+            runningChop=runningChop-1
+            if event[1] == None:
+                print('Error Code: 1232. Failed to chop '+event[2]+'.')
+                continue
+            buckets.AddChopped(event[1])
+        else:
+            runningStep=runningStep-1
+            if event[2] == None:
+                print('Error Code: 1233. Failed to update the '+event[1][0]+' bucket '+event[1][1]+'.')
+            buckets.StepDone(event[1], event[2])
+
+        for [key, bucket] in buckets.TakeSteps():
+            pool.apply_async(StepBucket, (bucket['kind'], outputDir, tcBorder, pathList, bucket['reps'], bucket['step']),
+                callback=lambda result, key=key: eventQueue.put(['step', key, result]),
+                error_callback=lambda error, key=key: eventQueue.put(['step', key, None]))
+            runningStep=runningStep+1
+
+    if streamFull != 0:
+        try:
+            MergeStreams(outputDir, 'BrickFull.sdf')
+            MergeStreams(outputDir, 'LinkerFull.sdf')
+        except:
+            print('Error Code: 1234. Failed to merge combined sdf files.')
+            return
+
+    try:
+        PrintLog(path, ' End Chop ')
+    except:
+        print('Error Code: 1235.')
+        return
+
+    # write the representatives, buckets that were never indexed are reduced as in RmRedundancy
+    try:
+        taskList=[]
+        kindList=[]
+        for key in buckets.Keys():
+            bucket=buckets.Get(key)
+            atomNum=GroupAtomNum(bucket['group'])
+            if (len(bucket['reps']) > 0) and (bucket['failed'] == 0):
+                taskList.append([partial(FlushBucket, bucket['kind'], outputDir, stream), bucket['reps'], BucketCost(len(bucket['reps']), 1)])
+            elif bucket['kind'] == 'brick':
+                taskList.append([partial(RmBrickRed, outputDir, tcBorder, pathList=pathList, stream=stream), bucket['members'], BucketCost(len(bucket['members']), atomNum)])
+            else:
+                taskList.append([partial(RmLinkerRed, outputDir, pathList=pathList, stream=stream), [bucket['members'], bucket['group']], BucketCost(len(bucket['members']), atomNum)])
+            kindList.append(bucket['kind'])
+        resultList=RunBuckets(pool, taskList)
+    except:
+        print('Error Code: 1236.')
+        return
+
+    try:
+        for kind in ['brick', 'linker']:
+            with open(outputFolderPath_log+kind.capitalize()+'GroupList.txt','w') as groupOut:
+                for key in buckets.Keys(kind):
+                    groupOut.write(key[1]+' - ')
+                    groupOut.write('File Num: ')
+                    groupOut.write(str(len(buckets.Get(key)['members'])))
+                    groupOut.write('\n')
+    except:
+        print('Error Code: 1237.')
+        return
+
+    # pair counts of the steps and of the buckets reduced at the end
+    brickPairCountList=[buckets.Get(x)['pairs'] for x in buckets.Keys('brick')]+[resultList[i] for i in range(len(resultList)) if kindList[i] == 'brick']
+    linkerPairCountList=[buckets.Get(x)['pairs'] for x in buckets.Keys('linker')]+[resultList[i] for i in range(len(resultList)) if kindList[i] == 'linker']
+    try:
+        FinishBrickRedundancy(outputPathList, tcBorder, pool, brickPairCountList, pathList, stream)
+    except:
+        print('Error Code: 1074.')
+        return
+    try:
+        FinishLinkerRedundancy(outputPathList, linkerPairCountList, stream)
+    except:
+        print('Error Code: 1075.')
+        return
+
+
+def StageDone(stage, stageStartTime, pool=None, outputFolderPath_log=None):
+    # record the duration of a stage of the main process, return the start time of the next stage
+    # and log the peak memory of the stage, with the workers when pool is a ManagedPool (workerPool.py)
+    from runReport import AddTime, AddCount, PeakRSS
+    stageEndTime = time.time()
+    AddTime('stage-'+stage, stageEndTime-stageStartTime)
+    if outputFolderPath_log != None:
+        msg = ' Stage ' + stage + ' Peak RSS: main ' + str(PeakRSS()>>10) + ' MB'
+        if hasattr(pool, 'TakePeakRSS'):
+            workerPeak = pool.TakePeakRSS()
+            AddCount('stage-'+stage+'-worker-peak-rss-mb', workerPeak)
+            msg = msg + ', worker ' + str(workerPeak) + ' MB'
+        if hasattr(pool, 'processes'):
+            msg = msg + ', workers ' + str(pool.processes)
+        if hasattr(pool, 'recycleNum'):
+            msg = msg + ', recycled ' + str(pool.recycleNum)
+        PrintLog(outputFolderPath_log+'Process.log', msg + ' ')
+    return stageEndTime
+
+
+def FinishRunReport(outputDir):
+    # merge the metrics of all processes into output-log/RunReport.json, RunReport.csv and SlowestItems.txt
+    from runReport import FlushMetrics, WriteRunReport, MetricsFolder
+    FlushMetrics(outputDir, 'main')
+    WriteRunReport(outputDir)
+    shutil.rmtree(MetricsFolder(outputDir))
 
 
 def PrintLog(path, msg):
@@ -1189,24 +1626,56 @@ def PrintLog(path, msg):
         outLog.write('\n')
 
 def main():
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'merge'):
+        # merge the output of shard runs: eMolFrag.py merge -o /shared/output/ [-p N] [-t TC]
+        try:
+            from shardMerge import MergeMain
+            MergeMain(sys.argv)
+        except:
+            print('Error Code: 1210. Failed to merge shards.')
+        return
+
     try:
         try:
-            [mainEntryPath, inputFolderPath, outputDir, processNum, outputSelection, outputFormat, tcBorder] = ParseArgs()
+            [mainEntryPath, inputFolderPath, outputDir, processNum, outputSelection, outputFormat, tcBorder, runOptions] = ParseArgs()
         except:
             print('Error Code: 1001. Failed to parse input commands.')
             return
+
+        if runOptions.get('plan') == 1:
+            # dry run, only WorkPlan.json is written
+            try:
+                from workPlanner import PlanWork
+                PlanWork(inputFolderPath, outputDir, processNum, tcBorder, runOptions)
+            except:
+                print('Error Code: 1240. Failed to plan the run.')
+            return
         
         try:
-            [outputPathList, pool] = PrepareEnv(outputDir, mainEntryPath, processNum)
+            [outputPathList, pool] = PrepareEnv(outputDir, mainEntryPath, processNum, runOptions)
         except:
             print('Error Code: 1002. Failed to prepare running evnironment.')
             return
         
         try:
-            ProcessData(inputFolderPath, outputPathList, outputSelection, outputFormat, tcBorder, pool)
+            if runOptions.get('profile') == 1:
+                from workerProfile import StartProfile, ProfiledCall, PROFILE_FOLDER
+                StartProfile(outputPathList[1]+PROFILE_FOLDER)
+                ProfiledCall(ProcessData, (inputFolderPath, outputPathList, outputSelection, outputFormat, tcBorder, pool, runOptions))
+            else:
+                ProcessData(inputFolderPath, outputPathList, outputSelection, outputFormat, tcBorder, pool, runOptions)
         except:
             print('Error Code: 1003. Failed to process data.')
             return
+
+        if runOptions.get('profile') == 1:
+            try:
+                from workerProfile import WriteProfileReport
+                reportPath = WriteProfileReport(outputPathList[1])
+                if reportPath != None:
+                    print('Profile: ' + reportPath)
+            except:
+                print('Error Code: 1006. Failed to write profile report.')
         
         try:
             pass
@@ -1214,6 +1683,23 @@ def main():
         except:
             print('Error Code: 1004. Failed to adjust output format.')
             return
+
+        if 'scratch' in runOptions:
+            try:
+                from scratchDir import FinishScratch
+                FinishScratch(outputPathList[0])
+            except:
+                print('Error Code: 1005. Failed to move output from scratch path.')
+                return
+
+        if runOptions.get('conn-index') == 1:
+            try:
+                from connectionIndex import BuildConnectionIndex
+                [indexPath, fragmentNum] = BuildConnectionIndex(outputDir)
+                print('Connection index of ' + str(fragmentNum) + ' fragments: ' + indexPath)
+            except:
+                print('Error Code: 1220. Failed to build connection index.')
+                return
             
     except:
         print('Error Code: 1000')
@@ -0,0 +1,76 @@
+#Fragments of one remove redundancy task, read and parsed once at the start of the task.
+
+#A record holds the lines of the fragment file, the positions of the appendix head and of '$$$$', and the
+#appendix lines (BRANCH for bricks, MAX-NUMBER-Of-CONTACTS for linkers). Comparisons, branch merges and output
+#writes of the task work from the records instead of reading the files again.
+
+from pairBound import DescriptorOfLines
+
+
+BRICK_HEAD='> <BRANCH @atom-number eligible-atmtype-to-connect>'
+LINKER_HEAD='> <MAX-NUMBER-Of-CONTACTS ATOMTYPES>'
+
+
+def ReadRecord(path, appendixHead):
+    with open(path,'r') as inf:
+        lines=inf.readlines()
+    appendHead=list(filter(lambda x: appendixHead in x, lines))
+    indAppendHead=lines.index(appendHead[0])
+    molEnd=list(filter(lambda x: '$$$$' in x, lines))
+    indMolEnd=lines.index(molEnd[0])
+    return {'lines':lines, 'appendHead':indAppendHead, 'molEnd':indMolEnd, 'appendix':lines[indAppendHead+1:indMolEnd]}
+
+
+def LoadGroup(inputList, appendixHead, descriptorCache):
+    # {path: record} of the group, the pairBound descriptors go to descriptorCache
+    recordCache={}
+    for path in inputList:
+        recordCache[path]=ReadRecord(path, appendixHead)
+        descriptorCache[path]=DescriptorOfLines(recordCache[path]['lines'])
+    return recordCache
+
+
+def AppendixList(record):
+    # appendix lines split into [atom number or count, atom type, ...]
+    appList=[]
+    for templine in record['appendix']:
+        if len(templine)>2:
+            appList.append(templine.replace('\n','').split())
+    return appList
+
+
+def AlignBranches(ali, recordA, recordB):
+    # lines the former mol-ali-04.py wrote for molA and molB: the branches of molB moved to the aligned atoms of molA,
+    # then the branches of molA, without repeats
+    aliList=[]
+    for aliLine in ali.split('|'):
+        aliList.append(aliLine.split())
+
+    molAAppdS=[]
+    for molApp in recordA['appendix']:
+        temp1=molApp.replace('\n','')
+        if len(temp1) >2:
+            molAAppdS.append(temp1.split())
+
+    molBAppdS=[]
+    for molApp in recordB['appendix']:
+        temp1=molApp.replace('\n','')
+        if len(temp1) >2:
+            molBAppdS.append(temp1.split())
+
+    newAppd=[]
+    for molApp in molBAppdS:
+        tempInd1=molApp[0]
+        tempInd2=''
+        for aliSub in aliList:
+            if aliSub[1]==tempInd1:
+                tempInd2=aliSub[0]
+        newAppd.append([tempInd2,molApp[1]])
+    newAppd=newAppd+molAAppdS
+
+    tempAppd=[]
+    for appd in newAppd:
+        if appd not in tempAppd:
+            tempAppd.append(appd)
+
+    return [' '.join(x)+'\n' for x in tempAppd]
@@ -0,0 +1,172 @@
+#Parse eMolFrag brick and linker sdf output into fragment records.
+
+#A fragment record is a dict:
+#   name      - fragment file name, eg. 'b-CHEMBLxxxxx.mol2-000.sdf'
+#   kind      - 'brick' or 'linker'
+#   source    - input molecule the fragment was chopped from, eg. 'CHEMBLxxxxx.mol2'
+#   molblock  - mol block up to and including 'M  END'
+#   atoms     - element symbol of each atom
+#   bonds     - [atom1, atom2, bondtype] of each bond, atom index start from 1
+#   atomTypes - mol2 atom type of each atom (bricks only, linkers carry it in contacts)
+#   branches  - [[atom-number, [eligible atom types]], ...] (bricks)
+#   contacts  - [[max-number-of-contacts, atom type], ...] (linkers)
+#   similar   - list of similar fragment paths (bricks after remove redundancy)
+
+import os
+import os.path
+
+
+BRANCH_HEAD='> <BRANCH @atom-number eligible-atmtype-to-connect>'
+ATOMTYPE_HEAD='> <ATOMTYPES>'
+CONTACT_HEAD='> <MAX-NUMBER-Of-CONTACTS ATOMTYPES>'
+SIMILAR_HEAD='> <fragments similar>'
+
+
+def StripSimilarList(fragmentLines):
+    # cut the '> <fragments similar>' appendix, return [lines like a chop-comb fragment, similar list]
+    similarHead=list(filter(lambda x: SIMILAR_HEAD in x, fragmentLines))
+    if len(similarHead) == 0:
+        return [fragmentLines, []]
+
+    indSimilarHead=fragmentLines.index(similarHead[0])
+    similarList=[]
+    for line in fragmentLines[indSimilarHead+1:]:
+        tempStr=line.replace('\n','').strip()
+        if (len(tempStr) > 0) and (tempStr != '$$$$'):
+            similarList.append(tempStr)
+
+    newLines=fragmentLines[:indSimilarHead]
+    while (len(newLines) > 0) and (len(newLines[-1].strip()) == 0):
+        newLines=newLines[:-1]
+    newLines.append('\n')
+    newLines.append('$$$$\n')
+    return [newLines, similarList]
+
+
+def CountAtoms(fragmentLines):
+    # [T, C, N, O] as written in BrickListAll.txt / LinkerListAll.txt
+    fileHead=list(filter(lambda x: 'V2000' in x, fragmentLines))
+    fileHeadLineNum=fragmentLines.index(fileHead[0])
+    atomNum=int(fileHead[0][0:3])
+    countList=[0, 0, 0, 0]
+    for atomLine in fragmentLines[fileHeadLineNum+1:fileHeadLineNum+atomNum+1]:
+        atomSymbol=atomLine.split()[3]
+        if atomSymbol == 'H':
+            continue
+        countList[0]=countList[0]+1
+        if atomSymbol == 'C':
+            countList[1]=countList[1]+1
+        elif atomSymbol == 'N':
+            countList[2]=countList[2]+1
+        elif atomSymbol == 'O':
+            countList[3]=countList[3]+1
+    return countList
+
+
+def SourceOfFragment(fragName):
+    # 'b-CHEMBL123.mol2-000.sdf' -> 'CHEMBL123.mol2'
+    baseName=os.path.basename(fragName)
+    if baseName[:2] in ['b-','l-']:
+        baseName=baseName[2:]
+    if baseName[-4:]=='.sdf':
+        baseName=baseName[:-4]
+    tempInd=baseName.rfind('-')
+    if tempInd > 0:
+        baseName=baseName[:tempInd]
+    return baseName
+
+
+def ParseFragmentLines(lines, name=''):
+    #lines: lines of one fragment, '\n' at the end of each line, up to and including '$$$$'
+    fileHead=list(filter(lambda x: 'V2000' in x, lines))
+    fileHeadLineNum=lines.index(fileHead[0])
+    atomNum=int(fileHead[0][0:3])
+    bondNum=int(fileHead[0][3:6])
+    atomList=lines[fileHeadLineNum+1:fileHeadLineNum+atomNum+1]
+    bondList=lines[fileHeadLineNum+atomNum+1:fileHeadLineNum+atomNum+bondNum+1]
+
+    if name == '':
+        name=lines[0].replace('\n','').strip()
+
+    molEnd=list(filter(lambda x: 'M  END' in x, lines))
+    if len(molEnd)>0:
+        indMolEnd=lines.index(molEnd[0])
+    else:
+        indMolEnd=fileHeadLineNum+atomNum+bondNum
+    molblock=''.join(lines[:indMolEnd+1])
+
+    atoms=[]
+    for atomLine in atomList:
+        atoms.append(atomLine.split()[3])
+
+    bonds=[]
+    for bondLine in bondList:
+        templist=[bondLine[0:3],bondLine[3:6]]+bondLine[6:].split()
+        bonds.append([int(templist[0]),int(templist[1]),int(templist[2])])
+
+    #collect appendix sections
+    sections={}
+    currentHead=''
+    for line in lines[indMolEnd+1:]:
+        tempStr=line.replace('\n','').strip()
+        if tempStr[:1]=='>':
+            currentHead=tempStr
+            sections[currentHead]=[]
+        elif tempStr=='$$$$':
+            break
+        elif (currentHead != '') and (len(tempStr)>0):
+            sections[currentHead].append(tempStr)
+
+    atomTypes=[]
+    branches=[]
+    contacts=[]
+    similar=[]
+    for head in sections:
+        if head==ATOMTYPE_HEAD:
+            atomTypes=sections[head]
+        elif head==BRANCH_HEAD:
+            for tempStr in sections[head]:
+                tempList=tempStr.split()
+                branches.append([int(tempList[0]),tempList[1:]])
+        elif head==CONTACT_HEAD:
+            for tempStr in sections[head]:
+                tempList=tempStr.split()
+                contacts.append([int(tempList[0]),tempList[1]])
+        elif head==SIMILAR_HEAD:
+            similar=sections[head]
+
+    if (BRANCH_HEAD in sections) or (os.path.basename(name)[:2]=='b-'):
+        kind='brick'
+    else:
+        kind='linker'
+
+    record={'name':os.path.basename(name),
+            'kind':kind,
+            'source':SourceOfFragment(name),
+            'molblock':molblock,
+            'atoms':atoms,
+            'bonds':bonds,
+            'atomTypes':atomTypes,
+            'branches':branches,
+            'contacts':contacts,
+            'similar':similar}
+    return record
+
+
+def ReadFragmentFile(path):
+    with open(path,'r') as inf:
+        lines=inf.readlines()
+    return ParseFragmentLines(lines, os.path.basename(path))
+
+
+def IterFragmentRecords(path):
+    #a sdf file may hold one fragment (output-brick/...) or all of them (BrickUnique.sdf)
+    lines=[]
+    with open(path,'r') as inf:
+        for line in inf:
+            lines.append(line)
+            if line[:4]=='$$$$':
+                yield ParseFragmentLines(lines)
+                lines=[]
+    if len(''.join(lines).strip())>0:
+        yield ParseFragmentLines(lines)
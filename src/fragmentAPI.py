@@ -0,0 +1,195 @@
+#Importable entry of eMolFrag, run the pipeline on molecules held in memory.
+
+#Usage:
+#   import sys
+#   sys.path.append('/Path_to_scripts/')
+#   from fragmentAPI import fragment
+#   result = fragment(mols, tcBorder=1.0, workers=4)
+#   result['bricks'], result['linkers'] are lists of fragment records, see fragRecord.py.
+
+#mols is a list of mol2 blocks (str) or RDKit molecules with 3D coordinates; the mol2 atom types are those of the
+#atoms read from mol2 ('_TriposAtomType'), else they are given by sybylTyper.py.
+#Unlike eMolFrag.py main, nothing here parses sys.argv, changes the working directory or asks questions.
+#Intermediate files are kept in a private work directory which is removed before returning.
+#A failed stage, or pkcombu failing for every pair, raises RuntimeError. The progress messages of chop are not
+#printed, they go to logPath if it is given.
+
+import os
+import os.path
+import re
+import shutil
+import tempfile
+from pkcombuRunner import PkcombuPool
+
+from fragRecord import ReadFragmentFile
+from fragmentLayout import ListFragments
+
+
+def Mol2BlockFromMol(mol, molName):
+    # Write a Tripos mol2 block from an RDKit molecule, the mol2 atom types are needed for the appendices.
+    # a molecule not read from mol2 (no '_TriposAtomType') is typed by sybylTyper
+    from sybylTyper import Mol2AtomLines
+    atomTypes=None
+    if False not in [x.HasProp('_TriposAtomType') for x in mol.GetAtoms()]:
+        atomTypes=[x.GetProp('_TriposAtomType') for x in mol.GetAtoms()]
+    atomLines=Mol2AtomLines(mol, atomTypes)
+
+    bondLines=[]
+    for bond in mol.GetBonds():
+        if bond.GetIsAromatic():
+            bondType='ar'
+        else:
+            tempValue=bond.GetBondTypeAsDouble()
+            if abs(tempValue-2.0) < 0.01:
+                bondType='2'
+            elif abs(tempValue-3.0) < 0.01:
+                bondType='3'
+            else:
+                bondType='1'
+        bondLines.append('%6d %5d %5d %4s\n' % (bond.GetIdx()+1, bond.GetBeginAtomIdx()+1, bond.GetEndAtomIdx()+1, bondType))
+
+    mol2List=[]
+    mol2List.append('@<TRIPOS>MOLECULE\n')
+    mol2List.append(molName+'\n')
+    mol2List.append(' '+str(len(atomLines))+' '+str(len(bondLines))+' 0 0 0\n')
+    mol2List.append('SMALL\n')
+    mol2List.append('NO_CHARGES\n')
+    mol2List.append('\n')
+    mol2List.append('@<TRIPOS>ATOM\n')
+    mol2List=mol2List+atomLines
+    mol2List.append('@<TRIPOS>BOND\n')
+    mol2List=mol2List+bondLines
+    return ''.join(mol2List)
+
+
+def MolNameOf(mol, index):
+    # name used for the mol2 file, the fragment names are built from it
+    molName=''
+    if isinstance(mol, str):
+        tempList=mol.split('\n')
+        for i in range(len(tempList)-1):
+            if tempList[i].strip()=='@<TRIPOS>MOLECULE':
+                molName=tempList[i+1].strip()
+                break
+    elif mol.HasProp('_Name'):
+        molName=mol.GetProp('_Name').strip()
+
+    molName=re.sub('[^A-Za-z0-9_.-]','_',molName)
+    if len(molName.replace('_',''))==0:
+        molName='mol'+str(index).zfill(6)
+    return molName
+
+
+def WriteInputMols(mols, inputFolderPath):
+    # write each molecule as <name>.mol2, return {file name: molecule name}
+    nameMap={}
+    for i in range(len(mols)):
+        mol=mols[i]
+        molName=MolNameOf(mol, i)
+        fileName=molName+'.mol2'
+        if fileName in nameMap:
+            fileName=molName+'-'+str(i).zfill(6)+'.mol2'
+
+        if isinstance(mol, str):
+            if '@<TRIPOS>ATOM' not in mol:
+                raise ValueError('Input '+str(i)+' is not a mol2 block.')
+            mol2Block=mol
+        else:
+            mol2Block=Mol2BlockFromMol(mol, molName)
+
+        with open(inputFolderPath+fileName,'w') as outf:
+            outf.write(mol2Block)
+        nameMap[fileName]=molName
+    return nameMap
+
+
+def CollectRecords(folderPath, nameMap):
+    bricks=[]
+    linkers=[]
+    for relPath in sorted(ListFragments(folderPath), key=os.path.basename):
+        fileName=os.path.basename(relPath)
+        if fileName[:2] not in ['b-','l-']:
+            continue
+        record=ReadFragmentFile(folderPath+relPath)
+        record['source']=nameMap.get(record['source'], record['source'])
+        record['similar']=[os.path.basename(x) for x in record['similar']]
+        if fileName[0]=='b':
+            bricks.append(record)
+        else:
+            linkers.append(record)
+    return bricks, linkers
+
+
+def PkcombuCalls(outputDir):
+    # [pkcombu calls, failed pkcombu calls] of a run, from the metrics of its workers (runReport.py)
+    from runReport import ReadMetrics
+    calls=0
+    failed=0
+    for record in ReadMetrics(outputDir):
+        calls=calls+record.get('timers', {}).get('pkcombu', [0])[0]
+        failed=failed+record.get('counters', {}).get('pkcombu-failed', 0)
+    return [calls, failed]
+
+
+def fragment(mols, tcBorder=1.0, workers=1, removeRedundancy=True, pkcombuPath=None, pool=None, workDir=None, logPath=None):
+    # mols: list of mol2 blocks or RDKit molecules
+    # tcBorder: brick similarity criterion, same range as '-t'
+    # workers: processes used when no pool is given
+    # removeRedundancy: False only chops (and reconnects), same as '-m 1'
+    # pkcombuPath: pkcombu to be used, default is the one in PathConfigure.log
+    # pool: an existing multiprocessing pool, kept open for the caller
+    # workDir: parent folder of the private work directory, default is the system temp folder
+    # logPath: file the progress messages of chop are appended to, default is not to keep them
+    from loader import ReadPathConfigure
+    from eMolFrag import CreateOutputFolders, GetInputList, Chop, RmRedundancy
+
+    if (tcBorder < 0.90) or (tcBorder > 1.0):
+        raise ValueError('Invalid TC, tcBorder should be in [0.90, 1.0].')
+
+    scriptsPath=os.path.dirname(os.path.abspath(__file__))+'/'
+    if pkcombuPath == None:
+        pathList=ReadPathConfigure(scriptsPath)
+        if pathList == None:
+            raise RuntimeError('Cannot load PathConfigure.log, configure paths with ConfigurePath.py or pass pkcombuPath.')
+    else:
+        pathList=[scriptsPath, pkcombuPath]
+
+    runDir=tempfile.mkdtemp(prefix='emolfrag-', dir=workDir)
+    outputDir=runDir+'/'
+    ownPool=0
+    try:
+        inputFolderPath=outputDir+'input/'
+        os.mkdir(inputFolderPath)
+        nameMap=WriteInputMols(mols, inputFolderPath)
+        outputPathList=CreateOutputFolders(outputDir)
+
+        if pool == None:
+            pool=PkcombuPool(workers)
+            ownPool=1
+
+        inputList=GetInputList(inputFolderPath, outputPathList[1])
+        if inputList == None:
+            raise RuntimeError('Cannot list the input molecules.')
+        if Chop(outputPathList, pool, inputList=inputList, chopLog=1) == None:
+            raise RuntimeError('Chop failed, see the error code printed by eMolFrag.')
+        if removeRedundancy:
+            if RmRedundancy(outputPathList, tcBorder, pool, pathList) == None:
+                raise RuntimeError('Remove redundancy failed, see the error code printed by eMolFrag.')
+            [calls, failed]=PkcombuCalls(outputDir)
+            if (calls > 0) and (failed == calls):
+                raise RuntimeError('All '+str(calls)+' pkcombu calls failed, check the pkcombu path '+pathList[1]+'.')
+            bricks, tempLinkers=CollectRecords(outputPathList[3], nameMap)
+            tempBricks, linkers=CollectRecords(outputPathList[4], nameMap)
+        else:
+            bricks, linkers=CollectRecords(outputPathList[6], nameMap)
+    finally:
+        if ownPool == 1:
+            pool.close()
+            pool.join()
+        if (logPath != None) and os.path.exists(outputDir+'output-log/Chop.log'):
+            with open(outputDir+'output-log/Chop.log', 'r') as inf:
+                with open(logPath, 'at') as outf:
+                    shutil.copyfileobj(inf, outf)
+        shutil.rmtree(runDir, ignore_errors=True)
+
+    return {'bricks':bricks, 'linkers':linkers}
@@ -0,0 +1,221 @@
+#Write the fragments of a run into one SQLite database file (output format 3) and look them up.
+
+#Output format 3 streams the fragments into the combined sdf files like format 1/2 (sdfStream.py), then
+#BuildFragmentDB loads them into <outputDir>Fragments.db in bulk transactions and removes the sdf files.
+
+#Tables:
+#   fragments - one row per fragment:
+#               name, kind ('brick'/'linker'), source molecule, group key 'T n C n N n O n' and its counts,
+#               canonical hash (NULL if RDKit cannot read the mol block), representative (1: kept after remove redundancy), molblock,
+#               atom types, branches ('atom-number type type ...' per line), contacts ('count type' per line)
+#   members   - representative name, member fragment name, source molecule of the member
+#               (the fragments found similar to each representative, including itself)
+#   duplicates - input molecule chopped, identical input molecule not chopped (--dedupe-inputs)
+
+import os
+import os.path
+import hashlib
+import sqlite3
+
+from fragRecord import IterFragmentRecords, SourceOfFragment
+
+
+DB_NAME='Fragments.db'
+BATCH_SIZE=10000
+
+SCHEMA=['CREATE TABLE IF NOT EXISTS fragments (name TEXT PRIMARY KEY, kind TEXT, source TEXT, group_key TEXT, '
+        'total INTEGER, carbon INTEGER, nitrogen INTEGER, oxygen INTEGER, canonical_hash TEXT, representative INTEGER, '
+        'molblock TEXT, atom_types TEXT, branches TEXT, contacts TEXT)',
+        'CREATE TABLE IF NOT EXISTS members (representative TEXT, member TEXT, source TEXT)',
+        'CREATE TABLE IF NOT EXISTS duplicates (source TEXT, duplicate TEXT)']
+
+INDEXES=['CREATE INDEX IF NOT EXISTS fragments_group_key ON fragments (kind, group_key)',
+         'CREATE INDEX IF NOT EXISTS fragments_hash ON fragments (canonical_hash)',
+         'CREATE INDEX IF NOT EXISTS fragments_source ON fragments (source)',
+         'CREATE INDEX IF NOT EXISTS members_representative ON members (representative)',
+         'CREATE INDEX IF NOT EXISTS members_source ON members (source)',
+         'CREATE INDEX IF NOT EXISTS duplicates_duplicate ON duplicates (duplicate)']
+
+
+def GroupCounts(atoms):
+    # [T, C, N, O], same counts as BrickListAll.txt / LinkerListAll.txt
+    heavyAtoms=[x for x in atoms if x != 'H']
+    return [len(heavyAtoms), heavyAtoms.count('C'), heavyAtoms.count('N'), heavyAtoms.count('O')]
+
+
+def GroupKey(counts):
+    return 'T '+str(counts[0])+' C '+str(counts[1])+' N '+str(counts[2])+' O '+str(counts[3])
+
+
+def ReadableMolblock(molblock):
+    # chop removes dummy and hydrogen atom lines without renumbering the bonds and atom values (see pairBound.py).
+    # The atom lines left keep their order, so if every one of them is in a bond or atom value line, the numbers
+    # of these lines are mapped back to 1..atom number; otherwise the lines of removed atoms are dropped.
+    lines=molblock.split('\n')
+    countsLineNum=[x for x in range(len(lines)) if 'V2000' in lines[x]][0]
+    atomNum=int(lines[countsLineNum][0:3])
+    bondNum=int(lines[countsLineNum][3:6])
+    bondStart=countsLineNum+atomNum+1
+    bondLines=lines[bondStart:bondStart+bondNum]
+    propertyLines=lines[bondStart+bondNum:]
+    valueLines=[x for x in propertyLines if x.startswith('V ')]
+
+    numberList=sorted(set([int(x[0:3]) for x in bondLines]+[int(x[3:6]) for x in bondLines]+[int(x[1:6]) for x in valueLines]))
+    if (len(numberList) == atomNum) and (len(numberList) > 0) and (numberList[-1] > atomNum):
+        numberMap=dict([[numberList[i], i+1] for i in range(atomNum)])
+    else:
+        numberMap=dict([[i, i] for i in range(1, atomNum+1)])
+
+    newBondLines=[]
+    for bondLine in bondLines:
+        if (int(bondLine[0:3]) in numberMap) and (int(bondLine[3:6]) in numberMap):
+            newBondLines.append('%3d%3d' % (numberMap[int(bondLine[0:3])], numberMap[int(bondLine[3:6])])+bondLine[6:])
+    newPropertyLines=[]
+    for propertyLine in propertyLines:
+        if not propertyLine.startswith('V '):
+            newPropertyLines.append(propertyLine)
+        elif int(propertyLine[1:6]) in numberMap:
+            newPropertyLines.append('V  %3d' % numberMap[int(propertyLine[1:6])]+propertyLine[6:])
+    countsLine=lines[countsLineNum][:3]+'%3d' % len(newBondLines)+lines[countsLineNum][6:]
+    return '\n'.join(lines[:countsLineNum]+[countsLine]+lines[countsLineNum+1:bondStart]+newBondLines+newPropertyLines)
+
+
+def CanonicalHash(molblock):
+    # sha1 of the canonical smiles, None if RDKit cannot read the mol block
+    from rdkit import Chem
+    from rdkit import RDLogger
+    lg=RDLogger.logger()
+    lg.setLevel(RDLogger.CRITICAL)
+    try:
+        mol=Chem.MolFromMolBlock(ReadableMolblock(molblock), sanitize=False, removeHs=False)
+        text=Chem.MolToSmiles(mol, canonical=True)
+    except:
+        return None
+    return hashlib.sha1(text.encode('UTF-8')).hexdigest()
+
+
+def RecordRow(record, representative):
+    counts=GroupCounts(record['atoms'])
+    branches='\n'.join([' '.join([str(x[0])]+x[1]) for x in record['branches']])
+    contacts='\n'.join([str(x[0])+' '+x[1] for x in record['contacts']])
+    return (record['name'], record['kind'], record['source'], GroupKey(counts),
+            counts[0], counts[1], counts[2], counts[3], CanonicalHash(record['molblock']), representative,
+            record['molblock'], '\n'.join(record['atomTypes']), branches, contacts)
+
+
+def InsertRecords(conn, sdfPath, representative):
+    # insert (or replace) all fragments of a combined sdf file, return [fragments, members] rows written
+    fragmentCount=0
+    memberCount=0
+    rowList=[]
+    memberList=[]
+    for record in IterFragmentRecords(sdfPath):
+        rowList.append(RecordRow(record, representative))
+        for similar in record['similar']:
+            memberName=os.path.basename(similar)
+            memberList.append((record['name'], memberName, SourceOfFragment(memberName)))
+        if len(rowList) >= BATCH_SIZE:
+            conn.executemany('INSERT OR REPLACE INTO fragments VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)', rowList)
+            fragmentCount=fragmentCount+len(rowList)
+            rowList=[]
+        if len(memberList) >= BATCH_SIZE:
+            conn.executemany('INSERT INTO members VALUES (?,?,?)', memberList)
+            memberCount=memberCount+len(memberList)
+            memberList=[]
+    conn.executemany('INSERT OR REPLACE INTO fragments VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)', rowList)
+    conn.executemany('INSERT INTO members VALUES (?,?,?)', memberList)
+    return [fragmentCount+len(rowList), memberCount+len(memberList)]
+
+
+def ReadLinkerGroups(logPath):
+    # linker-log.txt: '<time> <representative> <count>' followed by one '\t<member>' line per member
+    # the one C/N/O cases list no members, their groups only hold the representative
+    groupList=[]
+    if not os.path.exists(logPath):
+        return groupList
+    with open(logPath, 'r') as inf:
+        for line in inf:
+            if line[:1] == '\t':
+                if (len(groupList) > 0) and (line.strip()[-4:] == '.sdf'):
+                    groupList[-1][1].append(os.path.basename(line.strip()))
+            elif len(line.split()) >= 7:
+                groupList.append([os.path.basename(line.split()[5]), []])
+    for group in groupList:
+        if len(group[1]) == 0:
+            group[1].append(group[0])
+    return groupList
+
+
+def BuildFragmentDB(outputDir, fullPathList, uniquePathList, linkerLogPath='', duplicateListPath=''):
+    # fullPathList: combined sdf files before remove redundancy (BrickFull.sdf, LinkerFull.sdf)
+    # uniquePathList: combined sdf files after remove redundancy (BrickUnique.sdf, LinkerUnique.sdf)
+    # duplicateListPath: DuplicateInputs.txt, '<kept input> <duplicate input> ...' per line
+    dbPath=outputDir+DB_NAME
+    conn=sqlite3.connect(dbPath)
+    try:
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+        for sdfPath in fullPathList:
+            if os.path.exists(sdfPath):
+                InsertRecords(conn, sdfPath, 0)
+        conn.commit()
+
+        for sdfPath in uniquePathList:
+            if os.path.exists(sdfPath):
+                InsertRecords(conn, sdfPath, 1)
+        conn.commit()
+
+        # the linker files carry no similar list, their groups are in the log
+        memberList=[]
+        for [representative, members] in ReadLinkerGroups(linkerLogPath):
+            for memberName in members:
+                memberList.append((representative, memberName, SourceOfFragment(memberName)))
+        conn.executemany('INSERT INTO members VALUES (?,?,?)', memberList)
+        conn.commit()
+
+        duplicateList=[]
+        if os.path.exists(duplicateListPath):
+            with open(duplicateListPath, 'r') as inf:
+                for line in inf:
+                    nameList=[os.path.basename(x) for x in line.split()]
+                    duplicateList=duplicateList+[(nameList[0], x) for x in nameList[1:]]
+        conn.executemany('INSERT INTO duplicates VALUES (?,?)', duplicateList)
+        conn.commit()
+
+        for statement in INDEXES:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+    return dbPath
+
+
+#Lookups
+def OpenFragmentDB(dbPath):
+    conn=sqlite3.connect(dbPath)
+    conn.row_factory=sqlite3.Row
+    return conn
+
+
+def FindByGroup(conn, kind, total, carbon, nitrogen, oxygen, representative=1):
+    # fragments with the given atom counts, representatives only by default (None for all)
+    groupKey=GroupKey([total, carbon, nitrogen, oxygen])
+    if representative == None:
+        return conn.execute('SELECT * FROM fragments WHERE kind=? AND group_key=?', (kind, groupKey)).fetchall()
+    return conn.execute('SELECT * FROM fragments WHERE kind=? AND group_key=? AND representative=?', (kind, groupKey, representative)).fetchall()
+
+
+def FindByHash(conn, canonicalHash):
+    return conn.execute('SELECT * FROM fragments WHERE canonical_hash=?', (canonicalHash,)).fetchall()
+
+
+def FindBySource(conn, source):
+    # representatives which have a member chopped from the source molecule, eg. 'CHEMBLxxxxx.mol2'
+    return conn.execute('SELECT DISTINCT f.* FROM members m JOIN fragments f ON f.name=m.representative WHERE m.source=?', (source,)).fetchall()
+
+
+def MembersOf(conn, name):
+    return [x[0] for x in conn.execute('SELECT member FROM members WHERE representative=?', (name,)).fetchall()]
@@ -0,0 +1,125 @@
+#Sharded layout of the fragment folders (--layout sharded), for runs with millions of fragments.
+
+#In a sharded folder, fragment 'b-CHEMBLxxxxx.mol2-000.sdf' is written to <folder><prefix>/b-CHEMBLxxxxx.mol2-000.sdf,
+#prefix being the first SHARD_PREFIX_LENGTH hex digits of the md5 of the file name, so no folder holds more than a
+#few thousand entries. A folder is sharded if it has a MANIFEST_NAME file. Each process adds the relative path of
+#every fragment it writes to its own part file <folder>.manifest/<pid>, one line per fragment, and '-' and the path
+#of a fragment it removes; MergeManifest joins the parts into MANIFEST_NAME when the run is finished. The readers
+#take the fragment list from ListFragments, which reads the manifest instead of listing the folder; for a folder
+#that is not sharded it lists the folder as before.
+
+import os
+import os.path
+import hashlib
+import shutil
+
+
+MANIFEST_NAME='manifest.txt'
+MANIFEST_PARTS='.manifest/'
+SHARD_PREFIX_LENGTH=3
+
+#fragment folders that are sharded with --layout sharded
+LAYOUT_FOLDERS=['output-chop/', 'output-chop-comb/', 'output-brick/', 'output-linker/']
+
+#open manifest parts of this process, and shard folders already created
+_manifests={}
+_shardDirs=set()
+
+
+def ShardFolders(outputDir):
+    # mark the fragment folders of outputDir as sharded
+    for folderName in LAYOUT_FOLDERS:
+        folderPath=outputDir+folderName
+        if not os.path.isdir(folderPath+MANIFEST_PARTS):
+            os.mkdir(folderPath+MANIFEST_PARTS)
+        open(folderPath+MANIFEST_NAME, 'at').close()
+
+
+def IsSharded(folderPath):
+    return os.path.isfile(folderPath+MANIFEST_NAME)
+
+
+def ShardPrefix(fileName):
+    return hashlib.md5(fileName.encode('utf-8')).hexdigest()[:SHARD_PREFIX_LENGTH]+'/'
+
+
+def LayoutPath(folderPath, fileName):
+    # path of fragment fileName in folderPath
+    if IsSharded(folderPath):
+        return folderPath+ShardPrefix(fileName)+fileName
+    return folderPath+fileName
+
+
+def FolderOf(fragPath):
+    # fragment folder of a fragment path, the folder above the shard folder in a sharded folder
+    folderPath=os.path.dirname(fragPath)+'/'
+    parentPath=os.path.dirname(folderPath[:-1])+'/'
+    if (len(os.path.basename(folderPath[:-1])) == SHARD_PREFIX_LENGTH) and IsSharded(parentPath):
+        return parentPath
+    return folderPath
+
+
+def FragmentPath(folderPath, fileName):
+    # path to write fragment fileName to, the fragment is added to the manifest of a sharded folder
+    if not IsSharded(folderPath):
+        return folderPath+fileName
+    prefix=ShardPrefix(fileName)
+    if folderPath+prefix not in _shardDirs:
+        if not os.path.isdir(folderPath+prefix):
+            try:
+                os.mkdir(folderPath+prefix)
+            except OSError:
+                pass
+        _shardDirs.add(folderPath+prefix)
+    AddToManifest(folderPath, prefix+fileName)
+    return folderPath+prefix+fileName
+
+
+def AddToManifest(folderPath, line):
+    partPath=folderPath+MANIFEST_PARTS+str(os.getpid())
+    if partPath not in _manifests:
+        # line buffered, a line is in the file once the fragment is written
+        _manifests[partPath]=open(partPath, 'at', 1)
+    _manifests[partPath].write(line+'\n')
+
+
+def RemoveFragment(folderPath, fileName):
+    # remove fragment fileName of folderPath, and from the manifest of a sharded folder
+    os.remove(LayoutPath(folderPath, fileName))
+    if IsSharded(folderPath):
+        AddToManifest(folderPath, '-'+ShardPrefix(fileName)+fileName)
+
+
+def ReadManifest(folderPath):
+    # relative paths of the fragments of a sharded folder, in writing order, removed fragments are applied last
+    pathList=[]
+    manifestList=[folderPath+MANIFEST_NAME]
+    if os.path.isdir(folderPath+MANIFEST_PARTS):
+        manifestList=manifestList+[folderPath+MANIFEST_PARTS+x for x in sorted(os.listdir(folderPath+MANIFEST_PARTS))]
+    for manifestPath in manifestList:
+        if os.path.exists(manifestPath):
+            with open(manifestPath, 'r') as inf:
+                pathList.extend([x.strip() for x in inf if len(x.strip()) > 0])
+    seen=set([x[1:] for x in pathList if x[0] == '-'])
+    return [x for x in pathList if not (x[0] == '-' or x in seen or seen.add(x))]
+
+
+def ListFragments(folderPath):
+    # relative paths of the fragment files of folderPath
+    if IsSharded(folderPath):
+        return ReadManifest(folderPath)
+    return [x.name for x in os.scandir(folderPath) if x.is_file()]
+
+
+def MergeManifest(folderPath):
+    # join the manifest parts into MANIFEST_NAME, after all processes finished writing
+    if (not IsSharded(folderPath)) or (not os.path.isdir(folderPath+MANIFEST_PARTS)):
+        return
+    for partPath in [x for x in _manifests if x.startswith(folderPath+MANIFEST_PARTS)]:
+        _manifests[partPath].close()
+        del _manifests[partPath]
+    pathList=ReadManifest(folderPath)
+    with open(folderPath+MANIFEST_NAME+'.partial', 'w') as outf:
+        outf.writelines([x+'\n' for x in pathList])
+    os.rename(folderPath+MANIFEST_NAME+'.partial', folderPath+MANIFEST_NAME)
+    shutil.rmtree(folderPath+MANIFEST_PARTS)
@@ -0,0 +1,245 @@
+#Remove identical input molecules before chop (--dedupe-inputs), and give their fragments back to every source.
+
+#DedupeInputs hashes each input on its canonical smiles (RDKit) and its sorted mol2 atom types (sybylTyper.py types
+#for an SDF input), keeps the first input of each hash in the input list (and InputList) and writes the others to
+#output-log/DuplicateInputs.txt:
+#   <kept input> <duplicate input> <duplicate input> ...
+#Only the kept inputs are chopped and compared by pkcombu. After remove redundancy, FanOutDuplicates gives the
+#fragments of a kept input to its duplicates: 'b-<kept>-000.sdf' is written again as 'b-<duplicate>-000.sdf'
+#(output-chop-comb or BrickFull.sdf / LinkerFull.sdf), and each fragment path of the similar lists, brick-log.txt,
+#linker-log.txt and bricks-red-out.txt is followed by the paths of the same fragment of the duplicates.
+
+import os
+import os.path
+import hashlib
+
+from fragRecord import SourceOfFragment
+from fragmentLayout import ListFragments, LayoutPath, FragmentPath, FolderOf
+from inputDiscovery import IsSDFInput
+
+
+DUPLICATE_LIST='DuplicateInputs.txt'
+
+
+def Mol2AtomTypes(path):
+    # atom types (6th column of @<TRIPOS>ATOM) of the first molecule of a mol2 file
+    atomTypes=[]
+    with open(path, 'r') as inf:
+        inAtom=0
+        for line in inf:
+            if line[:9] == '@<TRIPOS>':
+                if inAtom == 1:
+                    break
+                inAtom=int(line.strip() == '@<TRIPOS>ATOM')
+            elif (inAtom == 1) and (len(line.split()) >= 6):
+                atomTypes.append(line.split()[5])
+    return atomTypes
+
+
+def InputKey(inputPath):
+    # pool task: [inputPath, sha1 of canonical smiles and atom types], None if RDKit cannot read the input
+    try:
+        from rdkit import Chem
+        from rdkit import RDLogger
+        from sybylTyper import ReadInputMol, SybylTypes
+        # as in ChopWithRDKit, no RDKit warnings for the inputs it cannot sanitize
+        lg = RDLogger.logger()
+        lg.setLevel(RDLogger.CRITICAL)
+        mol=ReadInputMol(inputPath, removeHs=False)
+        if IsSDFInput(inputPath):
+            atomTypes=SybylTypes(mol)
+        else:
+            atomTypes=Mol2AtomTypes(inputPath)
+        text=Chem.MolToSmiles(mol, canonical=True)+'|'+' '.join(sorted(atomTypes))
+        return [inputPath, hashlib.sha1(text.encode('UTF-8')).hexdigest()]
+    except:
+        return [inputPath, None]
+
+
+def DedupeInputs(outputPathList, pool, inputList):
+    # keep one input of each structure, return the kept inputs
+    outputFolderPath_log=outputPathList[1]
+
+    groupMap={}
+    groupList=[]
+    for [inputPath, key] in pool.map(InputKey, inputList):
+        if key == None:
+            groupList.append([inputPath])
+        elif key in groupMap:
+            groupMap[key].append(inputPath)
+        else:
+            groupMap[key]=[inputPath]
+            groupList.append(groupMap[key])
+
+    with open(outputFolderPath_log+'InputList', 'w') as outList:
+        outList.writelines([x[0]+'\n' for x in groupList])
+    with open(outputFolderPath_log+DUPLICATE_LIST, 'w') as outf:
+        for group in groupList:
+            if len(group) > 1:
+                outf.write(' '.join(group)+'\n')
+    return [x[0] for x in groupList]
+
+
+def ReadDuplicates(outputFolderPath_log):
+    # {kept input file name: [duplicate input file names]}
+    duplicateMap={}
+    if not os.path.exists(outputFolderPath_log+DUPLICATE_LIST):
+        return duplicateMap
+    with open(outputFolderPath_log+DUPLICATE_LIST, 'r') as inf:
+        for line in inf:
+            nameList=[os.path.basename(x) for x in line.split()]
+            if len(nameList) > 1:
+                duplicateMap[nameList[0]]=nameList[1:]
+    return duplicateMap
+
+
+def KeptSource(fragName, duplicateMap):
+    # kept input of a fragment name 'b-<kept>-000.sdf' ('-000' may be followed by more '-n' parts), None if none
+    source=SourceOfFragment(fragName)
+    while source not in duplicateMap:
+        if source.rfind('-') <= 0:
+            return None
+        source=source[:source.rfind('-')]
+    return source
+
+
+def DuplicateNames(fragName, duplicateMap):
+    # 'b-<kept>-000.sdf' -> ['b-<duplicate>-000.sdf', ...]
+    source=KeptSource(fragName, duplicateMap)
+    if source == None:
+        return []
+    start=fragName.index(source)
+    return [fragName[:start]+x+fragName[start+len(source):] for x in duplicateMap[source]]
+
+
+def ExpandPath(path, duplicateMap):
+    # [path] and the paths of the same fragment of the duplicates
+    duplicateList=DuplicateNames(os.path.basename(path), duplicateMap)
+    if len(duplicateList) == 0:
+        return [path]
+    folderPath=FolderOf(path)
+    return [path]+[LayoutPath(folderPath, x) for x in duplicateList]
+
+
+def ExpandLines(lines, duplicateMap):
+    # follow each line holding fragment paths by the same line for the duplicates,
+    # 'x:x y z' lines of bricks-red-out.txt get the duplicate paths added to their list
+    newLines=[]
+    for line in lines:
+        body=line.rstrip('\n')
+        head=body[:len(body)-len(body.lstrip('\t'))]
+        text=body[len(head):]
+        if (':' in text) and (text.split(':')[0][-4:] == '.sdf'):
+            [keptPath, similarStr]=text.split(':', 1)
+            newLines.append(keptPath+':'+' '.join([y for x in similarStr.split() for y in ExpandPath(x, duplicateMap)])+'\n')
+        elif (text[-4:] == '.sdf') and ('/' in text) and (len(text.split()) == 1):
+            newLines=newLines+[head+x+line[len(body):] for x in ExpandPath(text, duplicateMap)]
+        else:
+            newLines.append(line)
+    return newLines
+
+
+def ExpandLog(logPath, duplicateMap):
+    # brick-log.txt / linker-log.txt: member lines are expanded, the count of each head line follows
+    if not os.path.exists(logPath):
+        return
+    with open(logPath, 'r') as inf:
+        lines=inf.readlines()
+    newLines=[]
+    headInd=-1
+    addNum=0
+    for line in lines + ['']:
+        if (line == '') or ((line[:1] != '\t') and (len(line.split()) >= 7)):
+            if (headInd >= 0) and (addNum > 0):
+                headList=newLines[headInd].split(' ')
+                headList[-1]=str(int(headList[-1])+addNum)+'\n'
+                newLines[headInd]=' '.join(headList)
+            headInd=len(newLines)
+            addNum=0
+            if line != '':
+                newLines.append(line)
+        else:
+            expandList=ExpandLines([line], duplicateMap)
+            addNum=addNum+len(expandList)-1
+            newLines=newLines+expandList
+    with open(logPath, 'w') as outf:
+        outf.writelines(newLines)
+
+
+def CopyFragment(lines, fragName, duplicateMap):
+    # lines of the fragment fragName for each duplicate, the first line of a fragment is its name
+    copyList=[]
+    for duplicateName in DuplicateNames(fragName, duplicateMap):
+        copyList.append([duplicateName, [duplicateName+'\n']+lines[1:]])
+    return copyList
+
+
+def FanOutFolder(folderPath, duplicateMap, copyFragments):
+    # copy the fragments of the kept inputs (copyFragments 1) or expand their similar lists (copyFragments 0)
+    if not os.path.isdir(folderPath):
+        return
+    for relPath in ListFragments(folderPath):
+        fragName=os.path.basename(relPath)
+        if copyFragments == 1:
+            if KeptSource(fragName, duplicateMap) == None:
+                continue
+            with open(folderPath+relPath, 'r') as inf:
+                lines=inf.readlines()
+            for [duplicateName, duplicateLines] in CopyFragment(lines, fragName, duplicateMap):
+                with open(FragmentPath(folderPath, duplicateName), 'w') as outf:
+                    outf.writelines(duplicateLines)
+        else:
+            with open(folderPath+relPath, 'r') as inf:
+                lines=inf.readlines()
+            newLines=ExpandLines(lines, duplicateMap)
+            if len(newLines) != len(lines):
+                with open(folderPath+relPath, 'w') as outf:
+                    outf.writelines(newLines)
+
+
+def FanOutFile(sdfPath, duplicateMap, copyFragments):
+    # the same for a combined sdf file, fragment copies are added at the end
+    if not os.path.exists(sdfPath):
+        return
+    if copyFragments == 1:
+        copyList=[]
+        with open(sdfPath, 'r') as inf:
+            lines=[]
+            for line in inf:
+                lines.append(line)
+                if line[:4] == '$$$$':
+                    copyList=copyList+[x[1] for x in CopyFragment(lines, lines[0].strip(), duplicateMap)]
+                    lines=[]
+        with open(sdfPath, 'at') as outf:
+            for duplicateLines in copyList:
+                outf.writelines(duplicateLines)
+    else:
+        with open(sdfPath, 'r') as inf:
+            lines=inf.readlines()
+        with open(sdfPath+'.partial', 'w') as outf:
+            outf.writelines(ExpandLines(lines, duplicateMap))
+        os.rename(sdfPath+'.partial', sdfPath)
+
+
+def FanOutDuplicates(outputPathList):
+    # give the fragments of the kept inputs to their duplicates, return the number of duplicate inputs
+    [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
+    duplicateMap=ReadDuplicates(outputFolderPath_log)
+    if len(duplicateMap) == 0:
+        return 0
+
+    FanOutFolder(outputFolderPath_chop_comb, duplicateMap, 1)
+    FanOutFile(outputDir+'BrickFull.sdf', duplicateMap, 1)
+    FanOutFile(outputDir+'LinkerFull.sdf', duplicateMap, 1)
+
+    FanOutFolder(outputFolderPath_active, duplicateMap, 0)
+    FanOutFile(outputDir+'BrickUnique.sdf', duplicateMap, 0)
+
+    ExpandLog(outputFolderPath_log+'brick-log.txt', duplicateMap)
+    ExpandLog(outputFolderPath_log+'linker-log.txt', duplicateMap)
+    if os.path.exists(outputFolderPath_log+'bricks-red-out.txt'):
+        with open(outputFolderPath_log+'bricks-red-out.txt', 'r') as inf:
+            lines=inf.readlines()
+        with open(outputFolderPath_log+'bricks-red-out.txt', 'w') as outf:
+            outf.writelines(ExpandLines(lines, duplicateMap))
+    return sum([len(x) for x in duplicateMap.values()])
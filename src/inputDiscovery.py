@@ -0,0 +1,80 @@
+#Find the input molecules of a run: the mol2 and sdf files under -i, or the entries of an input list (--input-list).
+
+#ScanInputs walks the input folder with os.scandir, which gives the file type of each entry without a stat call,
+#and keeps the files with an extension of INPUT_EXTENSIONS, also those in subfolders (with their own path).
+#An input list has one entry per line, relative entries are taken from the -i folder (or the folder of the list):
+#   /data/chembl/CHEMBL123.mol2     a file, used whatever its extension is
+#   /data/zinc/                     a folder, scanned as -i
+#   /data/zinc/*/ZINC*.mol2         a glob pattern ('**' for any depth), files only
+#   # comment                       empty lines and lines starting with '#' are skipped
+#The list of input paths is kept in memory and given to the chop stage, output-log/InputList is only the record
+#of the inputs of the run.
+#An input with an extension of SDF_EXTENSIONS is read as SDF (one molecule per file, its mol2 atom types are given
+#by sybylTyper.py), any other input as mol2.
+
+import os
+import os.path
+import glob
+import zlib
+
+
+SDF_EXTENSIONS=['.sdf']
+INPUT_EXTENSIONS=['.mol2']+SDF_EXTENSIONS
+
+
+def InputExtension(fileName):
+    return os.path.splitext(fileName)[1].lower() in INPUT_EXTENSIONS
+
+
+def IsSDFInput(inputPath):
+    return os.path.splitext(inputPath)[1].lower() in SDF_EXTENSIONS
+
+
+def InShard(fileName, shard):
+    # deterministic split of input files, same answer on every node
+    [shardInd, shardNum] = shard
+    return (zlib.crc32(fileName.encode('utf-8')) & 0xffffffff) % shardNum == shardInd
+
+
+def ScanInputs(folderPath, shard=None):
+    # input files under folderPath, subfolders included, hidden files and folders are skipped
+    inputList=[]
+    folderList=[folderPath]
+    while len(folderList) > 0:
+        with os.scandir(folderList.pop()) as entries:
+            for entry in entries:
+                if entry.name[0] == '.':
+                    continue
+                if entry.is_dir():
+                    folderList.append(entry.path)
+                elif InputExtension(entry.name) and ((shard == None) or InShard(entry.name, shard)):
+                    inputList.append(entry.path)
+    return inputList
+
+
+def ReadInputList(listPath, baseFolder, shard=None):
+    # input files of an input list, a file given by more than one entry is taken once
+    inputList=[]
+    with open(listPath, 'r') as inf:
+        for line in inf:
+            entry=line.strip()
+            if (len(entry) == 0) or (entry[0] == '#'):
+                continue
+            entry=os.path.join(baseFolder, os.path.expanduser(entry))
+            if True in [x in entry for x in '*?[']:
+                pathList=[x for x in glob.iglob(entry, recursive=True) if os.path.isfile(x)]
+            elif os.path.isdir(entry):
+                inputList.extend(ScanInputs(entry, shard))
+                continue
+            else:
+                pathList=[entry]
+            inputList.extend([x for x in pathList if (shard == None) or InShard(os.path.basename(x), shard)])
+    seen=set()
+    return [x for x in inputList if not (x in seen or seen.add(x))]
+
+
+def DiscoverInputs(inputFolderPath, runOptions={}):
+    # input files of a run, from --input-list if it is given, else from the input folder
+    if 'input-list' in runOptions:
+        return ReadInputList(runOptions['input-list'], inputFolderPath, runOptions.get('shard'))
+    return ScanInputs(inputFolderPath, runOptions.get('shard'))
@@ -0,0 +1,70 @@
+#In-process kcombu comparison of two molblocks through libkcombu.so (built by BuildKcombu.py).
+
+#MatchMolblocks returns what RunPkcombu reads from the pkcombu output, tanimoto and alignment of the best
+#match, for the same default options. No process is started and no file is written. kcombu keeps its
+#options and work data in globals, so the calls of a process are serialized with a lock; parallelism comes
+#from the worker processes of the pool.
+
+import ctypes
+import os
+import threading
+
+
+#[loaded, library or None] of this process
+_kcombu=[0, None]
+_kcombuLock=threading.Lock()
+
+MATCH_BUFFER_SIZE=65536
+
+
+def LibraryPath():
+    return os.path.dirname(os.path.abspath(__file__))+'/libkcombu.so'
+
+
+def LoadKcombu(libPath=None):
+    # library of this process, None if libkcombu.so is not built
+    if _kcombu[0] == 1:
+        return _kcombu[1]
+    with _kcombuLock:
+        if _kcombu[0] == 0:
+            if libPath == None:
+                libPath=LibraryPath()
+            lib=None
+            if os.path.isfile(libPath):
+                try:
+                    lib=ctypes.CDLL(libPath)
+                    lib.KcombuMatchMolblocks.argtypes=[ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+                    lib.KcombuMatchMolblocks.restype=ctypes.c_int
+                except:
+                    lib=None
+            _kcombu[1]=lib
+            _kcombu[0]=1
+    return _kcombu[1]
+
+
+def MatchLine(molblockA, molblockB):
+    # '#[  1] Nmcs tanimoto seldis:|anumA anumB|...', the first match line of pkcombu
+    lib=LoadKcombu()
+    if lib == None:
+        raise RuntimeError('libkcombu.so is not loaded.')
+    molA=molblockA.encode('UTF-8')
+    molB=molblockB.encode('UTF-8')
+    bufferSize=MATCH_BUFFER_SIZE
+    while True:
+        outBuffer=ctypes.create_string_buffer(bufferSize)
+        with _kcombuLock:
+            ret=lib.KcombuMatchMolblocks(molA, molB, outBuffer, bufferSize)
+        if ret != -2:
+            break
+        bufferSize=bufferSize*4
+    if ret <= 0:
+        raise RuntimeError('kcombu found no match.')
+    return outBuffer.value.decode('UTF-8')
+
+
+def MatchMolblocks(molblockA, molblockB):
+    # [tanimoto (str), alignment], read from the match line as RunPkcombu reads the pkcombu output
+    infoLine=MatchLine(molblockA, molblockB)
+    tnm=infoLine.split()[3]
+    ali=infoLine[infoLine.index('|')+1:]
+    return [tnm, ali]
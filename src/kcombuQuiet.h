@@ -0,0 +1,20 @@
+/*
+
+ <kcombuQuiet.h>
+
+ Included first in each kcombu source of libkcombu.so (gcc -include, see BuildKcombu.py).
+
+ kcombu prints its progress with printf() and fprintf(stdout,...). Inside the
+ library both go to KcombuOut (/dev/null, set by kcombuShim.c), so the file
+ descriptor 1 and the stdout of the process that loads the library are left as
+ they are.
+
+*/
+
+#include <stdio.h>
+
+extern FILE *KcombuOut;
+
+#undef  stdout
+#define stdout KcombuOut
+#define printf(...) fprintf(KcombuOut, __VA_ARGS__)
@@ -0,0 +1,169 @@
+/*
+
+ <kcombuShim.c>
+
+ Entry point of libkcombu.so (built by BuildKcombu.py from kcombu-src-20220610.tar.gz).
+
+ KcombuMatchMolblocks() compares two SDF molblocks given as strings with the
+ default options of pkcombu, and writes the best match in the same form as the
+ first line under "#   Nmcs|tani|seldis:" of 'pkcombu -A molA -B molB -oAm':
+
+   #[  1] Nmcs tanimoto seldis:|anumA anumB|anumA anumB...
+
+ kcombu keeps its options and work data in globals, so calls must not overlap.
+
+ The kcombu sources are compiled with kcombuQuiet.h, which sends their printf()
+ and stdout output to KcombuOut. The shim itself writes to no stream.
+
+*/
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include "globalvar.h"
+#include "molecule.h"
+#include "ioSDF.h"
+#include "match.h"
+#include "molprop.h"
+#include "options.h"
+#include "ioLINE.h"
+
+struct PARAMETERS PAR;
+
+/* stream of the printf() and stdout output of kcombu (kcombuQuiet.h) */
+FILE *KcombuOut = NULL;
+
+static int Read_MOLECULE_from_Molblock();
+static void Set_pkcombu_PAR();
+
+
+static void Set_pkcombu_PAR()
+{
+  /* same settings as main() of pkcombu.c without command line options */
+  Set_Default_Global_PAR();
+  PAR.PROGRAM_TYPE = 'p';
+  PAR.max_ring_size  = 30;
+  PAR.max_block_size = 40;
+  PAR.max_ring_descriptor  = PAR.max_ring_size + PAR.max_block_size  - 3;
+
+  if ((PAR.ConnectGraphType=='T') || (PAR.ConnectGraphType=='t')){
+    if (PAR.maxDIFtopodis <0) PAR.maxDIFtopodis = 0;
+  }
+
+  if ((PAR.WeightScheme=='D') && ((PAR.AlgoType=='B')||(PAR.AlgoType=='b'))){
+    PAR.Wneiatm  = 1.0;
+    PAR.Wextcon  = 1.0;
+    PAR.Wdistan  = 0.0;
+    PAR.Wncompo  = 0.0;
+    PAR.Wtopodis = 0.0;
+    if ((PAR.ConnectGraphType=='T')||(PAR.ConnectGraphType=='t')||(PAR.ConnectGraphType=='D')){ PAR.Wtopodis = 1.0;}
+  }
+
+  Set_max_atomtype_by_atomtype_class();
+
+} /* end of Set_pkcombu_PAR() */
+
+
+static int Read_MOLECULE_from_Molblock(molblock,mol)
+  const char *molblock;
+  struct MOLECULE *mol;
+{
+  /* Read_MOLECULE() of molprop.c, with the lines taken from a string instead of a file */
+  struct LINENODE HeadLineNode;
+  char *buff,*line,*next;
+  int ok,L;
+
+  Initialize_MOLECULE(mol);
+  sprintf(mol->core_molname,"molblock");
+  mol->filetype = 'S';
+
+  HeadLineNode.next = NULL;
+  HeadLineNode.prev = NULL;
+  buff = (char *)malloc(sizeof(char)*(strlen(molblock)+1));
+  sprintf(buff,"%s",molblock);
+  line = buff;
+  while ((line != NULL) && (line[0] != '\0')){
+    next = strchr(line,'\n');
+    if (next != NULL){ next[0] = '\0'; next += 1;}
+    L = strlen(line);
+    if ((L>0) && (line[L-1]=='\r')){ line[L-1] = '\0';}
+    Add_string_to_LINENODEs(line,&HeadLineNode);
+    line = next;
+  }
+  free(buff);
+
+  ok = Translate_Lines_into_SDF_Molecule(&HeadLineNode,mol);
+  Free_LINENODEs(&HeadLineNode);
+
+  if ((mol->maxNatom > 0) && (mol->Natom > mol->maxNatom)){ return(0);}
+  if (ok==0){ return(0);}
+
+  Set_MOLECULE(mol,'B');
+  return(ok);
+
+} /* end of Read_MOLECULE_from_Molblock() */
+
+
+int KcombuMatchMolblocks(molblockA,molblockB,outstr,outsize)
+  const char *molblockA, *molblockB;
+  char *outstr;
+  int  outsize;
+{
+  /* returns length of outstr, 0 : no match, -1 : molblock not read, -2 : outstr too short */
+  struct MOLECULE molA,molB;
+  struct MATCH optMlist,*mn;
+  char buff[64];
+  int i,L,okA,okB;
+
+  outstr[0] = '\0';
+
+  /* kcombu progress output, opened on the first call and kept open; stderr if /dev/null cannot be opened */
+  if (KcombuOut == NULL){ KcombuOut = fopen("/dev/null","w");}
+  if (KcombuOut == NULL){ KcombuOut = stderr;}
+
+  Set_pkcombu_PAR();
+
+  /* fields pkcombu does not set are zero, as on the first call in a new process; maxNatom -1 : no limit */
+  memset(&molA,0,sizeof(struct MOLECULE));
+  memset(&molB,0,sizeof(struct MOLECULE));
+  memset(&optMlist,0,sizeof(struct MATCH));
+  Initialize_MOLECULE(&molA);
+  Initialize_MOLECULE_string(&molA);
+  Initialize_MOLECULE(&molB);
+  Initialize_MOLECULE_string(&molB);
+  molA.filetype = molB.filetype = 'S';
+  molA.atmhet = molB.atmhet = 'B';
+  molA.BondType = molB.BondType = 'B';
+  molA.chain = molB.chain = '-';
+  molA.SetStereo3D = molB.SetStereo3D = 'F';
+  molA.maxNatom = molB.maxNatom = -1;
+
+  L = 0;
+  okA = Read_MOLECULE_from_Molblock(molblockA,&molA);
+  okB = 0;
+  if (okA != 0){ okB = Read_MOLECULE_from_Molblock(molblockB,&molB);}
+
+  if ((okA==0) || (okB==0)){
+    L = -1;
+  }
+  else{
+    Match_Two_Molecules(&molA,&molB,&optMlist,PAR.AlgoType,PAR.ConnectGraphType,PAR.maxDIFtopodis,PAR.Nkeep,"");
+
+    if ((optMlist.next != NULL) && (optMlist.next->nodetype != 'E')){
+      mn = optMlist.next;
+      L = snprintf(outstr,outsize,"#[%3d]%3d %5.3f %5.1f:",1,mn->Npair,Tanimoto_Coefficient(mn->Npair,&molA,&molB),mn->select_dis);
+      for (i=0;(i<mn->Npair)&&(L<outsize);++i){
+        sprintf(buff,"|%d %d",molA.atoms[mn->anumA[i]].num_in_file,molB.atoms[mn->anumB[i]].num_in_file);
+        L += snprintf(outstr+L,outsize-L,"%s",buff);
+      }
+      if (L >= outsize){ outstr[0] = '\0'; L = -2;}
+    }
+    Free_MATCHlist(&optMlist);
+  }
+
+  if (okB != 0){ Free_MOLECULE(&molB);}
+  if (okA != 0){ Free_MOLECULE(&molA);}
+
+  return(L);
+
+} /* end of KcombuMatchMolblocks() */
@@ -12,6 +12,26 @@ def LoadFolder(inputFolderPath):
         print('Error Code: 0015')
     return infilePathList
 
+def ReadPathConfigure(mainPath=None):
+    # Read [scriptsPath, pkcombuPath] from PathConfigure.log next to the scripts, independent of cwd.
+    if mainPath == None:
+        mainPath=os.path.dirname(os.path.abspath(__file__))
+    if mainPath[-1]=='/':
+        pass
+    else:
+        mainPath=mainPath+'/'
+
+    pathList=[]
+    with open(mainPath+'PathConfigure.log','r') as inf:
+        tempList=inf.readlines()
+        if len(tempList)==2:
+            pathList.append(tempList[0].replace('\n',''))
+            pathList.append(tempList[1].replace('\n',''))
+        else:
+            print('Path configuration is not correctly.')
+            return
+    return pathList
+
 def Loader(mainPath0):
     flag=0
     
@@ -105,13 +125,6 @@ def Loader(mainPath0):
             print('Cannot find part of script files.\nExit.')
             return 1
 
-        if os.path.exists(mainPath+'mol-ali-04.py'):
-            pass
-        else:
-            flag = 1
-            print('Cannot find part of script files.\nExit.')
-            return 1
-
         if os.path.exists(mainPath+'rmRedLinker04.py'):
             pass
         else:
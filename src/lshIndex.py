@@ -0,0 +1,87 @@
+#Approximate candidate pairs for brick remove redundancy with a TC border below 1.0 (--lsh).
+
+#Each fragment gets a MinHash signature of its bonded element pairs and two-bond element paths
+#(the pairBound.py descriptor, one token per occurrence). Signatures are cut into bands; fragments
+#sharing a band land in the same hash table bucket and become candidate pairs. Only candidate pairs are
+#checked with pkcombu, so the calls of a group follow the number of near duplicates instead of n*n.
+#Fragments with the same tokens always share every band. A pair of token set similarity s is a candidate
+#with probability 1-(1-s^LSH_ROWS)^LSH_BANDS (0.999 for s = 0.7, 0.35 for s = 0.3), pairs missed are not merged.
+
+import zlib
+
+from pairBound import GetDescriptor
+
+
+LSH_BANDS=16
+LSH_ROWS=3
+#smaller groups are compared exactly
+LSH_MIN_GROUP=32
+
+MERSENNE_PRIME=(1<<61)-1
+MAX_HASH=(1<<32)-1
+
+
+def HashParameters(hashNum):
+    # fixed (a, b) pairs, the same in every process and every run
+    parameters=[]
+    seed=1
+    for i in range(hashNum):
+        seed=(seed*6364136223846793005+1442695040888963407)&((1<<64)-1)
+        a=(seed>>3)%MERSENNE_PRIME
+        seed=(seed*6364136223846793005+1442695040888963407)&((1<<64)-1)
+        b=(seed>>3)%MERSENNE_PRIME
+        parameters.append([a|1, b])
+    return parameters
+
+HASH_PARAMETERS=HashParameters(LSH_BANDS*LSH_ROWS)
+
+
+def FragmentTokens(descriptor):
+    # ['C-C#0', 'C-C#1', 'C-C-O#0', ...], repeated pairs and paths are numbered
+    [heavyNum, elementCount, pairCount, pathCount]=descriptor
+    tokenList=[]
+    for countDict in [pairCount, pathCount]:
+        for key in countDict:
+            for i in range(countDict[key]):
+                tokenList.append('-'.join(key)+'#'+str(i))
+    if len(tokenList) == 0:
+        for key in elementCount:
+            for i in range(elementCount[key]):
+                tokenList.append(key+'#'+str(i))
+    return tokenList
+
+
+def MinHashSignature(tokenList):
+    tokenHashList=[zlib.crc32(x.encode('UTF-8'))&MAX_HASH for x in tokenList]
+    signature=[]
+    for [a, b] in HASH_PARAMETERS:
+        if len(tokenHashList) == 0:
+            signature.append(MAX_HASH)
+        else:
+            signature.append(min([((a*x+b)%MERSENNE_PRIME)&MAX_HASH for x in tokenHashList]))
+    return signature
+
+
+def CandidateMap(inputList, descriptorCache):
+    # {fragment path: set of fragment paths sharing at least one band}
+    bandTableList=[{} for i in range(LSH_BANDS)]
+    for path in inputList:
+        signature=MinHashSignature(FragmentTokens(GetDescriptor(descriptorCache, path)))
+        for i in range(LSH_BANDS):
+            bandKey=tuple(signature[i*LSH_ROWS:(i+1)*LSH_ROWS])
+            if bandKey not in bandTableList[i]:
+                bandTableList[i][bandKey]=[]
+            bandTableList[i][bandKey].append(path)
+
+    candidateMap={}
+    for path in inputList:
+        candidateMap[path]=set()
+    for bandTable in bandTableList:
+        for bandKey in bandTable:
+            bucket=bandTable[bandKey]
+            if len(bucket) > 1:
+                for path in bucket:
+                    candidateMap[path].update(bucket)
+    for path in inputList:
+        candidateMap[path].discard(path)
+    return candidateMap
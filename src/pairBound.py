@@ -0,0 +1,95 @@
+#Upper bound of the pkcombu tanimoto of two fragments, used to skip pkcombu calls which cannot reach the TC border.
+
+#pkcombu (default options) finds a connected MCS of the heavy atoms, matched atoms have the same atom type
+#(element, aromatic flag, O1/N1 for terminal O/N), and prints tanimoto = Ncommon/(NA+NB-Ncommon) with 3 decimals.
+#Ncommon is bounded by counts which only look at elements, so they never split what pkcombu would match:
+#   atoms  - Ncommon <= sum over elements of min(countA, countB)
+#   bonds  - the matched atoms are connected by at least Ncommon-1 matched bonds,
+#            Ncommon-1 <= sum over element pairs of min(bondCountA, bondCountB)
+#   paths  - a tree of Ncommon atoms has at least Ncommon-2 paths of two bonds,
+#            Ncommon-2 <= sum over element triples of min(pathCountA, pathCountB)
+
+#printed tanimoto is rounded to 3 decimals
+TANI_ROUNDING=0.0005+1e-6
+
+
+def FragmentDescriptor(path):
+    with open(path,'r') as inf:
+        lines=inf.readlines()
+    return DescriptorOfLines(lines)
+
+
+def DescriptorOfLines(lines):
+    # [heavy atom number, element counts, bond element pair counts, two-bond path element triple counts]
+    fileHead=list(filter(lambda x: 'V2000' in x, lines))
+    fileHeadLineNum=lines.index(fileHead[0])
+    atomNum=int(fileHead[0][0:3])
+    bondNum=int(fileHead[0][3:6])
+
+    elementList=[]
+    for atomLine in lines[fileHeadLineNum+1:fileHeadLineNum+atomNum+1]:
+        elementList.append(atomLine.split()[3])
+
+    neighborList=[[] for x in range(atomNum)]
+    for bondLine in lines[fileHeadLineNum+atomNum+1:fileHeadLineNum+atomNum+bondNum+1]:
+        a1=int(bondLine[0:3])-1
+        a2=int(bondLine[3:6])-1
+        if (a1 >= atomNum) or (a2 >= atomNum):
+            # chop removes dummy and hydrogen atom lines without renumbering the bonds
+            continue
+        if (elementList[a1] != 'H') and (elementList[a2] != 'H'):
+            neighborList[a1].append(a2)
+            neighborList[a2].append(a1)
+
+    elementCount={}
+    pairCount={}
+    pathCount={}
+    heavyNum=0
+    for i in range(atomNum):
+        if elementList[i] == 'H':
+            continue
+        heavyNum=heavyNum+1
+        elementCount[elementList[i]]=elementCount.get(elementList[i], 0)+1
+        for j in neighborList[i]:
+            if i < j:
+                pair=tuple(sorted([elementList[i], elementList[j]]))
+                pairCount[pair]=pairCount.get(pair, 0)+1
+        # paths j-i-k with i in the middle
+        for m in range(len(neighborList[i])):
+            for n in range(m+1, len(neighborList[i])):
+                ends=sorted([elementList[neighborList[i][m]], elementList[neighborList[i][n]]])
+                path=(ends[0], elementList[i], ends[1])
+                pathCount[path]=pathCount.get(path, 0)+1
+
+    return [heavyNum, elementCount, pairCount, pathCount]
+
+
+def CommonCount(countA, countB):
+    total=0
+    for key in countA:
+        if key in countB:
+            total=total+min(countA[key], countB[key])
+    return total
+
+
+def TanimotoBound(descA, descB):
+    [numA, elementA, pairA, pathA]=descA
+    [numB, elementB, pairB, pathB]=descB
+    if (numA == 0) or (numB == 0):
+        return 1.0
+    maxCommon=CommonCount(elementA, elementB)
+    maxCommon=min(maxCommon, CommonCount(pairA, pairB)+1)
+    maxCommon=min(maxCommon, CommonCount(pathA, pathB)+2)
+    return float(maxCommon)/(numA+numB-maxCommon)
+
+
+def CanReach(descA, descB, tcBorder):
+    # False only if the tanimoto printed by pkcombu is surely below tcBorder
+    return TanimotoBound(descA, descB) >= tcBorder-TANI_ROUNDING
+
+
+def GetDescriptor(descriptorCache, path):
+    # descriptors are computed once per fragment within a group
+    if path not in descriptorCache:
+        descriptorCache[path]=FragmentDescriptor(path)
+    return descriptorCache[path]
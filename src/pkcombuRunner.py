@@ -0,0 +1,108 @@
+#Run pkcombu on a pair of fragments, shared by remove redundancy of bricks and linkers.
+
+#RunPkcombuList and RunPkcombuPairs compare a list of fragment pairs from up to PKCOMBU_THREADS threads of the task,
+#pkcombu does the work in its own process while the threads wait. The pool created by PkcombuPool shares one
+#semaphore between its workers, so no more than processNum pkcombu processes run at the same time in the whole
+#pool: large groups use the cores left idle by finished workers without starting more processes than cores.
+
+#When libkcombu.so is built (BuildKcombu.py), the same comparison runs in-process through kcombuBinding.py on the
+#molblocks of the two files, one pair at a time per worker, and pkcombu is not started.
+
+from subprocess import Popen,PIPE
+from multiprocessing import BoundedSemaphore
+from multiprocessing.pool import ThreadPool
+import os
+import time
+
+from runReport import AddTime, AddCount, AddSlowItem
+from kcombuBinding import LoadKcombu, MatchMolblocks
+from workerPool import ManagedPool, WORKER_MAX_TASKS, WORKER_RSS_LIMIT_MB
+
+
+PKCOMBU_THREADS=4
+
+#semaphore shared by the workers of PkcombuPool, None in other processes
+_pkcombuLimit=None
+#[pid, thread pool] of this process, created on first use (a forked worker does not inherit the threads)
+_threadPool=[0, None]
+
+
+def InitPkcombuLimit(pkcombuLimit):
+    # Pool initializer
+    global _pkcombuLimit
+    _pkcombuLimit=pkcombuLimit
+
+
+def PkcombuPool(processNum, maxTasks=WORKER_MAX_TASKS, rssLimitMB=WORKER_RSS_LIMIT_MB, profileFolder=None):
+    # worker pool with at most processNum pkcombu processes running at once, workers are recycled (workerPool.py)
+    return ManagedPool(processNum, initializer=InitPkcombuLimit, initargs=(BoundedSemaphore(processNum),), maxTasks=maxTasks, rssLimitMB=rssLimitMB, profileFolder=profileFolder)
+
+
+def RunKcombu(molA, molB):
+    # RunPkcombu through libkcombu.so
+    startTime=time.time()
+    try:
+        with open(molA,'r') as inf:
+            molblockA=inf.read()
+        with open(molB,'r') as inf:
+            molblockB=inf.read()
+        [tnm, ali]=MatchMolblocks(molblockA, molblockB)
+    except:
+        tnm=str(0.00)
+        ali=''
+        AddCount('pkcombu-failed')
+
+    elapsed=time.time()-startTime
+    AddTime('pkcombu', elapsed)
+    AddSlowItem('pair', molA+'\t'+molB, elapsed)
+    return [tnm, ali]
+
+
+def RunPkcombu(pkcombuPath, molA, molB):
+    # return [tanimoto (str), alignment], ['0.0', ''] if pkcombu fails
+    if LoadKcombu() != None:
+        return RunKcombu(molA, molB)
+
+    if _pkcombuLimit != None:
+        _pkcombuLimit.acquire()
+    startTime=time.time()
+    try:
+        cmd1=Popen([pkcombuPath, '-A', molA, '-B', molB, '-oAm'],stdout=PIPE)
+        tempstr=cmd1.communicate()[0]
+        str1=tempstr.decode('UTF-8')
+
+        pos1=str1.index('#   Nmcs|tani|seldis:')
+        str2=str1[pos1:]
+        strList=str2.split('\n')
+        infoLine=strList[1]
+
+        tnm=infoLine.split()[3]
+        ali=infoLine[infoLine.index('|')+1:]
+    except:
+        tnm=str(0.00)
+        ali=''
+        AddCount('pkcombu-failed')
+    finally:
+        if _pkcombuLimit != None:
+            _pkcombuLimit.release()
+
+    elapsed=time.time()-startTime
+    AddTime('pkcombu', elapsed)
+    AddSlowItem('pair', molA+'\t'+molB, elapsed)
+    return [tnm, ali]
+
+
+def RunPkcombuPairs(pkcombuPath, pairList):
+    # return [[tanimoto, alignment], ...] of each [molA, molB] of pairList, in the order of pairList
+    if (PKCOMBU_THREADS <= 1) or (len(pairList) <= 1) or (LoadKcombu() != None):
+        return [RunPkcombu(pkcombuPath, pair[0], pair[1]) for pair in pairList]
+
+    if _threadPool[0] != os.getpid():
+        _threadPool[0]=os.getpid()
+        _threadPool[1]=ThreadPool(PKCOMBU_THREADS)
+    return _threadPool[1].map(lambda pair: RunPkcombu(pkcombuPath, pair[0], pair[1]), pairList, chunksize=1)
+
+
+def RunPkcombuList(pkcombuPath, molA, molBList):
+    # return [[tanimoto, alignment], ...] of molA with each of molBList, in the order of molBList
+    return RunPkcombuPairs(pkcombuPath, [[molA, molB] for molB in molBList])
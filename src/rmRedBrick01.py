@@ -5,20 +5,112 @@ import shutil
 import os
 import os.path
 import subprocess
-from subprocess import Popen,PIPE
 import time
 
-
-def RmBrickRed(outputPath, tcBorder, inputList):
-    pathList=[]
-    with open('PathConfigure.log','r') as inf:
-        tempList=inf.readlines()
-        if len(tempList)==2:
-            pathList.append(tempList[0].replace('\n',''))
-            pathList.append(tempList[1].replace('\n',''))
-        else:
+from loader import ReadPathConfigure
+from pkcombuRunner import RunPkcombuList
+from runReport import AddTime, AddCount, AddItem, AddHistogram, FlushMetrics
+from sdfStream import PutFragment, FlushStreams
+from pairBound import GetDescriptor, CanReach
+from lshIndex import CandidateMap, LSH_MIN_GROUP
+from fragCache import LoadGroup, AlignBranches, BRICK_HEAD
+
+
+def WriteBrickRepresentative(outputPath, streamName, record, similarList, appdList):
+    # write brick similarList[0] with the branches of its similar bricks (AlignBranches lines) and its log lines
+    # similarList: fragment paths ending with '\n', the representative first
+    mol1=similarList[0].replace('\n','')
+    #read aligned atom number and atom type able to connect, then add to the end of molecule.
+    if len(similarList)>1:
+        tempList1=[] #remove empty and '\n' in each element
+        for app in appdList:
+            if len(app)>2:
+                tempPair=app.replace('\n','')
+                tempList1.append(tempPair)
+        tempList2=[] #remove repeat
+        for app in tempList1:
+            if app not in tempList2:
+                tempList2.append(app)
+
+        #group atom types to the same atom number
+        col1=[] #atom number list
+        col2=[] #atom type list,[[],[],[]] each sublist stores the atom types the corresponding atom can connect
+        for app in tempList2:
+            tempApp=app.split()   ###Problem comes from here.
+            if tempApp[0] not in col1: #atom number list
+                col1.append(tempApp[0])
+            tempInd=col1.index(tempApp[0]) #find out the index for each atom number
+            if tempInd+1>len(col2): #if find a new atom number which has not create corresponding atom type list
+                col2.append([])
+            col2[tempInd].append(tempApp[1]) #add new atom type to the sublist corresponding to the atom number
+
+        finalAppdLine=[]
+        for i in range(len(col1)):
+            finalAppdLine.append(' '.join([col1[i]]+col2[i])+'\n')
+
+        finalAppdLine.append('\n')
+
+        #generate final output and move to destination
+        finalMolA=record['lines'][:record['appendHead']+1]+finalAppdLine
+
+    else: # no molecule same to molA or cannot run pkcombu to get result, similar list only contains itself.
+        finalMolA=record['lines'][:record['molEnd']]
+
+    finalMolA.append('\n> <fragments similar> \n')
+    finalMolA=finalMolA+similarList
+    finalMolA.append('\n')
+    finalMolA.append('$$$$\n')
+
+    inputFileName=os.path.basename(mol1)
+    outputFilePath=outputPath+'output-brick/'+inputFileName
+    PutFragment(outputPath,streamName,outputFilePath,finalMolA)
+    #finish process molecule molA
+
+    #print brick-red-out.txt
+    with open(outputPath+'output-log/bricks-red-out.txt','at') as outf:
+        tempSimilarList=list(map(lambda x: x.replace('\n',''), similarList)) #remove '\n' at the end of each molecule in the similarList
+        outf.write(tempSimilarList[0] + ':' + ' '.join(tempSimilarList)+'\n')
+
+    with open(outputPath+'output-log/brick-log.txt','at') as outf:
+        outf.write(time.asctime( time.localtime(time.time()) ))
+        outf.write(' ')
+        outf.write(mol1)
+        outf.write(' ')
+        outf.write(str(len(similarList)))
+        outf.write('\n')
+        outf.write('\t'+'\t'.join(similarList))
+
+
+#stream: 1 write the bricks to BrickUnique.sdf (output format 1/2) instead of one file each in output-brick
+#lsh: 1 with tcBorder below 1.0, only compare the pairs of large groups which share a MinHash band (lshIndex.py)
+#return [pairs sent to pkcombu, pairs skipped because their tanimoto bound is below tcBorder, pairs skipped by lsh]
+def RmBrickRed(outputPath, tcBorder, inputList, pathList=None, stream=0, lsh=0):
+    if pathList == None:
+        pathList=ReadPathConfigure()
+        if pathList == None:
             sys.exit()
 
+    streamName=''
+    if stream == 1:
+        streamName='BrickUnique.sdf'
+
+    startTime=time.time()
+    descriptorCache={}
+    pairCount=[0, 0, 0]
+    groupSize=len(inputList)
+    groupName=''
+    if groupSize > 0:
+        groupName=os.path.basename(inputList[0])
+
+    #read and parse every fragment of the group once
+    recordCache={}
+    if groupSize > 1:
+        recordCache=LoadGroup(inputList, BRICK_HEAD, descriptorCache)
+
+    candidateMap=None
+    if (lsh == 1) and (tcBorder < 1.0) and (groupSize >= LSH_MIN_GROUP):
+        candidateMap=CandidateMap(inputList, descriptorCache)
+
     if len(inputList) >1:
         tempInputList=inputList
         while len(tempInputList)>0:
@@ -32,149 +124,41 @@ def RmBrickRed(outputPath, tcBorder, inputList):
                 restMolList=[]
                 for mol2 in inputList:
                     if mol2 != mol1:
-                        restMolList.append(mol2)
-                aliOutputName=os.path.basename(mol1)+'-alioutput.txt'
-                #final result of molA and appendix
-                finalMolA=[]
+                        if (candidateMap == None) or (mol2 in candidateMap[mol1]):
+                            restMolList.append(mol2)
+                        else:
+                            pairCount[2]=pairCount[2]+1
+                #branches of the similar molecules aligned to molA (what the former mol-ali-04.py wrote to <molA>-alioutput.txt)
+                appdList=[]
+                molA=mol1
+                candidateList=[]
                 for molB in restMolList:
-            
-                    molA=mol1
-                    try:
-                        cmd1=Popen([pathList[1], '-A', molA, '-B', molB, '-oAm'],stdout=PIPE)
-                        #cmd1=Popen(['/home/tliu7/apps/pkcombu', '-A', molA, '-B', molB, '-oAm'],stdout=PIPE)
-                        #str1=cmd1.communicate()[0]
-                        #cmd1.stdout.close()
-
-                        tempstr=(cmd1.stdout.read())
-                        str1=tempstr.decode('UTF-8')
-
-                        pos1=str1.index('#   Nmcs|tani|seldis:')
-                        str2=str1[pos1:]
-                        strList=str2.split('\n')
-                        infoLine=strList[1]
-            
-                        tnm=infoLine.split()[3]
-                        ali=infoLine[infoLine.index('|')+1:]
-            
-                    except:
-                        tnm=str(0.00)
+                    if not CanReach(GetDescriptor(descriptorCache, molA), GetDescriptor(descriptorCache, molB), tcBorder):
+                        pairCount[1]=pairCount[1]+1
+                        continue
+                    candidateList.append(molB)
+                pairCount[0]=pairCount[0]+len(candidateList)
+                #run pkcombu on all candidates at once, then go through the results in order
+                resultList=RunPkcombuList(pathList[1], molA, candidateList)
+                for [molB, [tnm, ali]] in zip(candidateList, resultList):
 
                     if float(tnm) >= tcBorder:
                     
                         similarList.append(molB+'\n')
                         alignmentList.append(ali)
-                        #aliOutputName=os.path.basename(molA)+'-alioutput.txt'
-                        #subprocess.call(['python', '/work/tliu7/run0406/script0406/mol-ali-04.py',outputPath, ali, molA, molB, aliOutputName])
-                        subprocess.call(['python', pathList[0]+'mol-ali-04.py',outputPath, ali, molA, molB, aliOutputName])
-                        #get file output, then add the info of output to a copy of molA
-                        molAList=[]
-                        with open(molA,'r') as inf:
-                            molAList=inf.readlines()
-                
-                        appendIHead=list(filter(lambda x: '> <BRANCH @atom-number eligible-atmtype-to-connect>' in x, molAList))
-                        indAAppendIHead=molAList.index(appendIHead[0])
-                        molEnd=list(filter(lambda x: '$$$$' in x, molAList))
-                        indAMolEnd=molAList.index(molEnd[0])
-                
-                        molABasic=molAList[:indAAppendIHead+1]
-                
-                        finalMolA=molABasic
-                
-                        
-
-                #read aligned atom number and atom type able to connect, then add to the end of molecule.
-                if len(similarList)>1:
-                    appdList=[]
-                    with open(outputPath+aliOutputName,'r') as inf:
-                        appdList=inf.readlines()
-                    tempList1=[] #remove empty and '\n' in each element
-                    for app in appdList:
-                        if len(app)>2:
-                            tempPair=app.replace('\n','')
-                            tempList1.append(tempPair)
-                    tempList2=[] #remove repeat
-                    for app in tempList1:
-                        if app not in tempList2:
-                            tempList2.append(app)
-        
-                    #group atom types to the same atom number
-                    col1=[] #atom number list
-                    col2=[] #atom type list,[[],[],[]] each sublist stores the atom types the corresponding atom can connect
-                    for app in tempList2:
-                        tempApp=app.split()   ###Problem comes from here.
-                        if tempApp[0] not in col1: #atom number list
-                            col1.append(tempApp[0])
-                        tempInd=col1.index(tempApp[0]) #find out the index for each atom number
-                        if tempInd+1>len(col2): #if find a new atom number which has not create corresponding atom type list
-                            col2.append([])
-                        col2[tempInd].append(tempApp[1]) #add new atom type to the sublist corresponding to the atom number
-        
-                    finalAppdLine=[]
-                    for i in range(len(col1)):
-                        finalAppdLine.append(' '.join([col1[i]]+col2[i])+'\n')
-            
-        
-                    finalAppdLine.append('\n')
- 
-                    os.remove(outputPath+aliOutputName)
-            
-                    #generate final output and move to destination
-                    finalMolA=finalMolA+finalAppdLine
-
-                    finalMolA.append('\n> <fragments similar> \n')
-                    finalMolA=finalMolA+similarList
-                    finalMolA.append('\n')
-                    finalMolA.append('$$$$\n')
-
-                    inputFileName=os.path.basename(mol1)
-                    outputFilePath=outputPath+'output-brick/'+inputFileName
-                    with open(outputFilePath,'w') as outf:
-                        outf.writelines(finalMolA)
-                    #finish process molecule molA
-
-                else: # no molecule same to molA or cannot run pkcombu to get result, similar list only contains itself.
-                    molA=similarList[0].replace('\n','')
-                    molAList=[]
-                    with open(molA,'r') as inf:
-                        molAList=inf.readlines()
-
-                    appendIHead=list(filter(lambda x: '> <BRANCH @atom-number eligible-atmtype-to-connect>' in x, molAList))
-                    indAAppendIHead=molAList.index(appendIHead[0])
-                    molEnd=list(filter(lambda x: '$$$$' in x, molAList))
-                    indAMolEnd=molAList.index(molEnd[0])
-                    finalMolA=molAList[:indAMolEnd]
-
-                    finalMolA.append('\n> <fragments similar> \n')
-                    finalMolA=finalMolA+similarList
-                    finalMolA.append('\n')
-                    finalMolA.append('$$$$\n')
-        
-                    inputFileName=os.path.basename(mol1)
-                    outputFilePath=outputPath+'output-brick/'+inputFileName
-                    with open(outputFilePath,'w') as outf:
-                        outf.writelines(finalMolA)
-                    #finish process molecule molA
+                        aliStartTime=time.time()
+                        try:
+                            appdList=appdList+AlignBranches(ali, recordCache[molA], recordCache[molB])
+                        except:
+                            pass
+                        AddTime('mol-ali', time.time()-aliStartTime)
+
+                WriteBrickRepresentative(outputPath, streamName, recordCache[mol1], similarList, appdList)
 
                 #remove similarList from tempInputList
                 for i in range(len(similarList)):
                     tempInputList.remove(similarList[i].replace('\n',''))
 
-        
-                #print brick-red-out.txt        
-                with open(outputPath+'output-log/bricks-red-out.txt','at') as outf:
-                    tempSimilarList=list(map(lambda x: x.replace('\n',''), similarList)) #remove '\n' at the end of each molecule in the similarList
-                    outf.write(tempSimilarList[0] + ':' + ' '.join(tempSimilarList)+'\n')
-        
-                with open(outputPath+'output-log/brick-log.txt','at') as outf:
-                    outf.write(time.asctime( time.localtime(time.time()) ))
-                    outf.write(' ')
-                    outf.write(mol1)
-                    outf.write(' ')
-                    outf.write(str(len(similarList)))
-                    outf.write('\n')
-                    outf.write('\t'+'\t'.join(similarList))
-            
-
 
     # only one molecule in the list, there will be no molecule similar to that molecule
     elif len(inputList)==1:
@@ -194,8 +178,7 @@ def RmBrickRed(outputPath, tcBorder, inputList):
 
             inputFileName=os.path.basename(mol1)
             outputFilePath=outputPath+'output-brick/'+inputFileName
-            with open(outputFilePath,'w') as outf:
-                outf.writelines(finalMolA)
+            PutFragment(outputPath,streamName,outputFilePath,finalMolA)
             with open(outputPath+'output-log/bricks-red-out.txt','at') as outf:
                 outf.write(mol1+':'+mol1+'\n')
             with open(outputPath+'output-log/brick-log.txt','at') as outf:
@@ -209,4 +192,12 @@ def RmBrickRed(outputPath, tcBorder, inputList):
     else:
         pass
 
+    AddHistogram('brick-bucket-size', groupSize)
+    AddItem('brick-bucket', groupName, time.time()-startTime, {'fragments':groupSize})
+    AddCount('brick-pairs-evaluated', pairCount[0])
+    AddCount('brick-pairs-pruned', pairCount[1])
+    AddCount('brick-pairs-lsh-skipped', pairCount[2])
+    FlushMetrics(outputPath, 'brick')
+    FlushStreams()
+    return pairCount
 
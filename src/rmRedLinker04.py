@@ -5,19 +5,63 @@ import shutil
 import os
 import os.path
 import subprocess
-from subprocess import Popen,PIPE
 import time
 
+from loader import ReadPathConfigure
+from pkcombuRunner import RunPkcombuList
+from runReport import AddCount, AddItem, AddHistogram, FlushMetrics
+from sdfStream import PutFragment, PutFragmentFile, FlushStreams
+from pairBound import GetDescriptor, CanReach
+from fragCache import LoadGroup, AppendixList, LINKER_HEAD
 
-#groupProp: ['T','1','C','1','N','0','O','0']
-def RmLinkerRed(outputDir,inputL):
-    pathList=[]
-    with open('PathConfigure.log','r') as inf:
-        tempList=inf.readlines()
-        if len(tempList)==2:
-            pathList.append(tempList[0].replace('\n',''))
-            pathList.append(tempList[1].replace('\n',''))
+
+def SameContactTypes(ali, molAAppList, molBAppList):
+    # 1 if every aligned atom pair has the same atom type in the MAX-NUMBER-Of-CONTACTS appendices, else 0
+    aliList=ali.split('|')
+    similarFlag=1
+    for alipair in aliList:
+        aliInd=alipair.split()
+        tempMolBApp=molBAppList[int(aliInd[1])-1]
+        tempMolAApp=molAAppList[int(aliInd[0])-1]
+        if (tempMolAApp[1] == tempMolBApp[1]):
+            pass
         else:
+            similarFlag=0
+    return similarFlag
+
+
+def WriteLinkerRepresentative(outputDir, streamName, record, similarList, maxConnection):
+    # write linker similarList[0] with the largest contact numbers of its similar linkers, and its log lines
+    outputPath_linker=outputDir+'output-linker/'
+    mol1=similarList[0]
+    molAAppList=AppendixList(record)
+    molANewAppdInfo = []
+    for i in range(len(molAAppList)):
+        molANewAppdInfo.append(str(maxConnection[i])+' '+molAAppList[i][1]+'\n')
+    molANewAllInfo = record['lines'][:record['appendHead']+1] + molANewAppdInfo
+    molANewAllInfo.append('\n$$$$\n')
+    molBaseName=os.path.basename(mol1)
+    dest=outputPath_linker+molBaseName
+    PutFragment(outputDir,streamName,dest,molANewAllInfo)
+
+    #write log file
+    with open(outputDir+'output-log/linker-log.txt','at') as outf:
+        outf.write(time.asctime( time.localtime(time.time()) ))
+        outf.write(' ')
+        outf.write(mol1)
+        outf.write(' ')
+        outf.write(str(len(similarList)))
+        outf.write('\n')
+        outf.write('\t'+'\n\t'.join(similarList)+'\n')
+
+
+#groupProp: ['T','1','C','1','N','0','O','0']
+#stream: 1 write the linkers to LinkerUnique.sdf (output format 1/2) instead of one file each in output-linker
+#return [pairs sent to pkcombu, pairs skipped because their tanimoto bound cannot pass 0.99]
+def RmLinkerRed(outputDir,inputL,pathList=None,stream=0):
+    if pathList == None:
+        pathList=ReadPathConfigure()
+        if pathList == None:
             sys.exit()
 
     inputList=inputL[0]
@@ -26,6 +70,17 @@ def RmLinkerRed(outputDir,inputL):
     outputPath_log=outputDir+'output-log/'
     outputPath_chop_comb=outputDir+'output-chop-comb/'
     outputPath_linker=outputDir+'output-linker/'
+    streamName=''
+    if stream == 1:
+        streamName='LinkerUnique.sdf'
+
+    startTime=time.time()
+    descriptorCache={}
+    pairCount=[0, 0]
+    groupSize=len(inputList)
+    groupName=''
+    if groupSize > 0:
+        groupName=os.path.basename(inputList[0].replace('\n',''))
 
     #get a list of input file path without '\n' end
     tempInputList=[]
@@ -80,7 +135,7 @@ def RmLinkerRed(outputDir,inputL):
             #copy file to destination
             molBaseName=os.path.basename(pathList[ind])
             dest=outputPath_linker+molBaseName
-            shutil.copyfile(pathList[ind],dest)
+            PutFragmentFile(outputDir,streamName,dest,pathList[ind])
 
             #with open(outputPath+'output-log/linkers-red-out.txt','at') as outf:
             #    outf.write(pathList[ind]+':'+pathList[ind]+':'+'1\n')
@@ -149,7 +204,7 @@ def RmLinkerRed(outputDir,inputL):
             #copy file to destination
             molBaseName=os.path.basename(pathList[ind])
             dest=outputPath_linker+molBaseName
-            shutil.copyfile(pathList[ind],dest)
+            PutFragmentFile(outputDir,streamName,dest,pathList[ind])
             
             #with open(outputPath+'output-log/linkers-red-out.txt','at') as outf:
             #    outf.write(pathList[ind]+':'+pathList[ind]+':'+'1\n')
@@ -216,7 +271,7 @@ def RmLinkerRed(outputDir,inputL):
             #copy file to destination
             molBaseName=os.path.basename(pathList[ind])
             dest=outputPath_linker+molBaseName
-            shutil.copyfile(pathList[ind],dest)
+            PutFragmentFile(outputDir,streamName,dest,pathList[ind])
 
             #with open(outputPath+'output-log/linkers-red-out.txt','at') as outf:
             #    outf.write(pathList[ind]+':'+pathList[ind]+':'+'1\n')
@@ -239,24 +294,13 @@ def RmLinkerRed(outputDir,inputL):
 
     else: #all other cases
         if len(tempInputList)>1:
+            #read and parse every fragment of the group once
+            recordCache=LoadGroup(tempInputList, LINKER_HEAD, descriptorCache)
             
             while len(tempInputList)>0:
                 for mol1 in tempInputList:
                     molA=mol1
-                    molAList=[]
-                    with open(molA,'r') as infA:
-                        molAList=infA.readlines()
-                    appendAIHead=list(filter(lambda x: '> <MAX-NUMBER-Of-CONTACTS ATOMTYPES>' in x, molAList))
-                    indAAppendIHead=molAList.index(appendAIHead[0])
-                    molAEnd=list(filter(lambda x: '$$$$' in x, molAList))
-                    indAMolEnd=molAList.index(molAEnd[0])
-                    molAAppd=molAList[indAAppendIHead+1:indAMolEnd]
-                    molAAppList=[]
-                    for templine in molAAppd:
-                        if len(templine)>2:
-                            tempStr=templine.replace('\n','')
-                            tempList=tempStr.split()
-                            molAAppList.append(tempList)
+                    molAAppList=AppendixList(recordCache[molA])
                     #print(molAAppList)
                     maxConnection = [0]*len(molAAppList)
                     for i in range(len(molAAppList)):
@@ -275,57 +319,22 @@ def RmLinkerRed(outputDir,inputL):
                         if mol2 != mol1:
                             restMolList.append(mol2)
                     
+                    candidateList=[]
                     for molB in restMolList:        
-                        try:
-                            cmd1=Popen([pathList[1], '-A', molA, '-B', molB, '-oAm'],stdout=PIPE)
-                            #cmd1=Popen(['/home/tliu7/apps/pkcombu', '-A', molA, '-B', molB, '-oAm'],stdout=PIPE)
-                            #str1=cmd1.communicate()[0]
-                            #cmd1.stdout.close()
-                            tempstr=(cmd1.stdout.read())
-                            str1=tempstr.decode('UTF-8')
-                            
-                            
-                            
-                            pos1=str1.index('#   Nmcs|tani|seldis:')
-                            
-                            str2=str1[pos1:]
-                            strList=str2.split('\n')
-                            infoLine=strList[1]
-            
-                            tnm=infoLine.split()[3]
-                            ali=infoLine[infoLine.index('|')+1:]
-                            
-                        except:
-                            tnm=str(0.00)
+                        # tnm > 0.99 with 3 decimals is tnm >= 0.991
+                        if not CanReach(GetDescriptor(descriptorCache, molA), GetDescriptor(descriptorCache, molB), 0.991):
+                            pairCount[1]=pairCount[1]+1
+                            continue
+                        candidateList.append(molB)
+                    pairCount[0]=pairCount[0]+len(candidateList)
+                    #run pkcombu on all candidates at once, then go through the results in order
+                    resultList=RunPkcombuList(pathList[1], molA, candidateList)
+                    for [molB, [tnm, ali]] in zip(candidateList, resultList):
                         
                         if float(tnm)>0.99:
                                    
-                            molBList=[]
-                            with open(molB,'r') as infB:
-                                molBList=infB.readlines()
-                            appendBIHead=list(filter(lambda x: '> <MAX-NUMBER-Of-CONTACTS ATOMTYPES>' in x, molBList))
-                            indBAppendIHead=molBList.index(appendBIHead[0])
-                            molBEnd=list(filter(lambda x: '$$$$' in x, molBList))
-                            indBMolEnd=molBList.index(molBEnd[0])
-                            molBAppd=molBList[indBAppendIHead+1:indBMolEnd]
-                            molBAppList=[]
-                            for templine in molBAppd:
-                                if len(templine)>2:
-                                    tempStr=templine.replace('\n','')
-                                    tempList=tempStr.split()
-                                    molBAppList.append(tempList)
-                
-                            aliList=ali.split('|')
-                            similarFlag=1
-                            for alipair in aliList:
-                                aliInd=alipair.split()
-                                tempMolBApp=molBAppList[int(aliInd[1])-1]
-                                tempMolAApp=molAAppList[int(aliInd[0])-1]
-                                #print(tempMolAApp,tempMolBApp)
-                                if (tempMolAApp[1] == tempMolBApp[1]):
-                                    pass
-                                else:
-                                    similarFlag=0
+                            molBAppList=AppendixList(recordCache[molB])
+                            similarFlag=SameContactTypes(ali, molAAppList, molBAppList)
                             
                             if similarFlag==1:
                                 similarList.append(molB) 
@@ -334,43 +343,13 @@ def RmLinkerRed(outputDir,inputL):
                                     if int(molBAppList[i][0]) > maxConnection[i]:
                                         maxConnection[i] = int(molBAppList[i][0])
                             
-                    #print(similarList)        
-                    #print all the molecules and their similar molecules to the output
-                    #for i in range(len(similarList)):
-                    #with open(outputPath+'output-log/linkers-red-out.txt','at') as outf:
-                    #    outf.write(similarList[0]+':'+similarList[0]+':'+'1\n')
-                    #for j in range(len(similarList)):
-                    #    with open(outputPath+'output-log/linkers-red-out.txt','at') as outf:
-                    #        outf.write(similarList[0]+':'+similarList[j]+':'+similarityList[j]+'\n')
-
                     #copy file to destination
-                    #print(maxConnection)
-                    #print(molAList[:indAAppendIHead+1])
-                    molANewAppdInfo = []
-                    for i in range(len(molAAppList)):
-                        molANewAppdInfo.append(str(maxConnection[i])+' '+molAAppList[i][1]+'\n')
-                    #print(molANewAppdInfo)
-                    molANewAllInfo = molAList[:indAAppendIHead+1] + molANewAppdInfo 
-                    molANewAllInfo.append('\n$$$$\n')
-                    molBaseName=os.path.basename(mol1)
-                    dest=outputPath_linker+molBaseName
-                    #shutil.copyfile(mol1,dest)
-                    with open(dest, 'w') as outf:
-                        outf.writelines(molANewAllInfo)
+                    WriteLinkerRepresentative(outputDir, streamName, recordCache[mol1], similarList, maxConnection)
 
                     #remove all the similar molecules from the list, such that there are less molecules appear in the next loop
                     for i in range(len(similarList)):
                         tempInputList.remove(similarList[i])
 
-                    #write log file
-                    with open(outputPath+'output-log/linker-log.txt','at') as outf:
-                        outf.write(time.asctime( time.localtime(time.time()) ))
-                        outf.write(' ')
-                        outf.write(mol1)
-                        outf.write(' ')
-                        outf.write(str(len(similarList)))
-                        outf.write('\n')
-                        outf.write('\t'+'\n\t'.join(similarList)+'\n')
                     #print(len(tempInputList))
    
         # only one molecule in the list, there will be no molecule similar to that molecule
@@ -383,7 +362,7 @@ def RmLinkerRed(outputDir,inputL):
                 #copy file to destination
                 molBaseName=os.path.basename(mol1)
                 dest=outputPath_linker+molBaseName
-                shutil.copyfile(mol1,dest)
+                PutFragmentFile(outputDir,streamName,dest,mol1)
 
 
                 with open(outputPath+'output-log/linker-log.txt','at') as outf:
@@ -397,4 +376,11 @@ def RmLinkerRed(outputDir,inputL):
         else:
             pass
 
+    AddHistogram('linker-bucket-size', groupSize)
+    AddItem('linker-bucket', groupName, time.time()-startTime, {'fragments':groupSize, 'group':''.join(groupProp)})
+    AddCount('linker-pairs-evaluated', pairCount[0])
+    AddCount('linker-pairs-pruned', pairCount[1])
+    FlushMetrics(outputDir, 'linker')
+    FlushStreams()
+    return pairCount
 
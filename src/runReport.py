@@ -0,0 +1,279 @@
+#Counters and timings of one run, written as RunReport.json and RunReport.csv in output-log.
+
+#Each process (main process and pool workers) keeps its numbers in memory, and appends them as one json line to
+#output-log/metrics/<stage>-<pid>.jsonl at the end of each task. WriteRunReport merges all of them at the end of the run.
+#   counters   - name: count, eg. cache hits and misses ('cache-hit-xxx', 'cache-miss-xxx')
+#   timers     - name: [count, total seconds, max seconds], eg. pkcombu calls
+#   histograms - name: {value: count}, eg. bucket sizes
+#   items      - [kind, name, seconds, {info}], eg. duration of each molecule in chop
+#   slow       - kind: [[seconds, name]], the SLOW_ITEM_TOP slowest items of kinds too frequent to keep all of them,
+#                eg. each pkcombu pair
+#WriteRunReport also writes output-log/SlowestItems.txt: the slowest molecules of chop and the slowest pkcombu pairs,
+#with the atom counts and the bucket ('T n C n N n O n' of BrickListAll.txt / LinkerListAll.txt) of their fragments.
+
+import os
+import os.path
+import json
+import csv
+import time
+import threading
+import heapq
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# stages of the main process whose workers flush under other stage names
+STAGE_PARTS = {'redundancy':['brick', 'linker'], 'stream':['chop', 'brick', 'linker']}
+
+# items of each kind in SlowestItems.txt, and slow items kept by each process between two flushes
+SLOW_ITEM_TOP = 25
+SLOWEST_REPORT = 'SlowestItems.txt'
+
+_metrics = {'counters':{}, 'timers':{}, 'histograms':{}, 'items':[], 'slow':{}}
+# the metrics are also updated from the pkcombu threads of a task
+_lock = threading.Lock()
+
+
+def AddCount(name, value=1):
+    with _lock:
+        _metrics['counters'][name] = _metrics['counters'].get(name, 0) + value
+
+
+def AddTime(name, seconds):
+    with _lock:
+        timer = _metrics['timers'].setdefault(name, [0, 0.0, 0.0])
+        timer[0] = timer[0] + 1
+        timer[1] = timer[1] + seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+
+
+def AddHistogram(name, value):
+    with _lock:
+        histogram = _metrics['histograms'].setdefault(name, {})
+        histogram[str(value)] = histogram.get(str(value), 0) + 1
+
+
+def AddItem(kind, name, seconds, info=None):
+    if info == None:
+        info = {}
+    with _lock:
+        _metrics['items'].append([kind, name, seconds, info])
+
+
+def AddSlowItem(kind, name, seconds):
+    # keep name if it is one of the SLOW_ITEM_TOP slowest items of kind of this process
+    with _lock:
+        heap = _metrics['slow'].setdefault(kind, [])
+        if len(heap) < SLOW_ITEM_TOP:
+            heapq.heappush(heap, [seconds, name])
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, [seconds, name])
+
+
+def PeakRSS():
+    # peak resident memory of this process in KB
+    if resource == None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def MetricsFolder(outputDir):
+    return outputDir + 'output-log/metrics/'
+
+
+def FlushMetrics(outputDir, stage):
+    global _metrics
+    metricsFolder = MetricsFolder(outputDir)
+    if not os.path.exists(metricsFolder):
+        try:
+            os.makedirs(metricsFolder)
+        except OSError:
+            pass
+
+    record = {'stage':stage, 'pid':os.getpid(), 'time':time.time(), 'peakRSS':PeakRSS()}
+    with _lock:
+        record.update(_metrics)
+        _metrics = {'counters':{}, 'timers':{}, 'histograms':{}, 'items':[], 'slow':{}}
+    with open(metricsFolder + stage + '-' + str(os.getpid()) + '.jsonl', 'at') as outf:
+        outf.write(json.dumps(record) + '\n')
+
+
+def ReadMetrics(outputDir):
+    metricsFolder = MetricsFolder(outputDir)
+    recordList = []
+    if not os.path.exists(metricsFolder):
+        return recordList
+    for fileName in sorted(os.listdir(metricsFolder)):
+        if fileName[-6:] != '.jsonl':
+            continue
+        with open(metricsFolder + fileName, 'r') as inf:
+            for line in inf:
+                if len(line.strip()) > 0:
+                    recordList.append(json.loads(line))
+    return recordList
+
+
+def WriteRunReport(outputDir):
+    recordList = ReadMetrics(outputDir)
+
+    counters = {}
+    timers = {}
+    histograms = {}
+    workers = {}
+    stageRSS = {}
+    itemSummary = {}
+    itemList = []
+    slowItems = {}
+    for record in recordList:
+        for name in record['counters']:
+            counters[name] = counters.get(name, 0) + record['counters'][name]
+
+        for name in record['timers']:
+            timer = timers.setdefault(name, [0, 0.0, 0.0])
+            tempTimer = record['timers'][name]
+            timer[0] = timer[0] + tempTimer[0]
+            timer[1] = timer[1] + tempTimer[1]
+            timer[2] = max(timer[2], tempTimer[2])
+
+        for name in record['histograms']:
+            histogram = histograms.setdefault(name, {})
+            for value in record['histograms'][name]:
+                histogram[value] = histogram.get(value, 0) + record['histograms'][name][value]
+
+        pid = str(record['pid'])
+        worker = workers.setdefault(pid, {'peakRSSKB':0, 'tasks':0, 'stages':[]})
+        worker['peakRSSKB'] = max(worker['peakRSSKB'], record['peakRSS'])
+        worker['tasks'] = worker['tasks'] + 1
+        if record['stage'] not in worker['stages']:
+            worker['stages'].append(record['stage'])
+        stageRSS[record['stage']] = max(stageRSS.get(record['stage'], 0), record['peakRSS'])
+
+        for item in record['items']:
+            summary = itemSummary.setdefault(item[0], {'count':0, 'total':0.0, 'max':0.0})
+            summary['count'] = summary['count'] + 1
+            summary['total'] = summary['total'] + item[2]
+            summary['max'] = max(summary['max'], item[2])
+            itemList.append([item[0], item[1], item[2], pid, item[3]])
+
+        for kind in record.get('slow', {}):
+            slowItems.setdefault(kind, []).extend(record['slow'][kind])
+
+    # stage durations are timers named 'stage-xxx', written by the main process
+    stages = {}
+    for name in list(timers.keys()):
+        if name[:6] == 'stage-':
+            stageRSSKB = max([stageRSS.get(x, 0) for x in STAGE_PARTS.get(name[6:], [name[6:]])])
+            stages[name[6:]] = {'seconds':timers[name][1], 'peakRSSKB':stageRSSKB}
+            del timers[name]
+
+    timerReport = {}
+    for name in timers:
+        [count, total, maxTime] = timers[name]
+        timerReport[name] = {'count':count, 'total':total, 'max':maxTime, 'mean':(total/count if count > 0 else 0.0)}
+
+    for kind in itemSummary:
+        summary = itemSummary[kind]
+        summary['mean'] = summary['total']/summary['count'] if summary['count'] > 0 else 0.0
+
+    cacheHitRate = {}
+    for name in counters:
+        if name[:10] == 'cache-hit-':
+            cacheName = name[10:]
+            hit = counters[name]
+            miss = counters.get('cache-miss-' + cacheName, 0)
+            cacheHitRate[cacheName] = float(hit)/(hit+miss) if hit+miss > 0 else 0.0
+
+    report = {'stages':stages,
+              'counters':counters,
+              'timers':timerReport,
+              'histograms':histograms,
+              'cacheHitRate':cacheHitRate,
+              'items':itemSummary,
+              'workers':workers,
+              'peakRSSKBByStage':stageRSS}
+
+    outputFolderPath_log = outputDir + 'output-log/'
+    report['slowest'] = SlowestItems(outputFolderPath_log, itemList, slowItems)
+    WriteSlowestReport(outputFolderPath_log + SLOWEST_REPORT, report['slowest'])
+
+    with open(outputFolderPath_log + 'RunReport.json', 'w') as outf:
+        json.dump(report, outf, indent=1, sort_keys=True)
+
+    with open(outputFolderPath_log + 'RunReport.csv', 'w') as outf:
+        writer = csv.writer(outf)
+        writer.writerow(['kind', 'name', 'seconds', 'pid', 'info'])
+        for item in itemList:
+            infoStr = ' '.join([str(x) + '=' + str(item[4][x]) for x in sorted(item[4].keys())])
+            writer.writerow([item[0], item[1], '%.6f' % item[2], item[3], infoStr])
+
+    return report
+
+
+def FragmentGroups(outputFolderPath_log, nameSet, sourceSet):
+    # [{fragment file name: [kind, 'T n C n N n O n']} of the fragments in nameSet,
+    #  {input name: sorted buckets of its fragments} of the inputs in sourceSet]
+    from fragRecord import SourceOfFragment
+    groupMap = {}
+    sourceMap = {}
+    for [kind, listName] in [['brick', 'BrickListAll.txt'], ['linker', 'LinkerListAll.txt']]:
+        if not os.path.exists(outputFolderPath_log + listName):
+            continue
+        with open(outputFolderPath_log + listName, 'r') as inf:
+            for line in inf:
+                lineList = line.split()
+                if len(lineList) < 2:
+                    continue
+                fragName = os.path.basename(lineList[0])
+                group = ' '.join(lineList[1:])
+                if fragName in nameSet:
+                    groupMap[fragName] = [kind, group]
+                # a fragment name can have more '-n' parts after its input name
+                source = SourceOfFragment(fragName)
+                while (source not in sourceSet) and (source.rfind('-') > 0):
+                    source = source[:source.rfind('-')]
+                if source in sourceSet:
+                    bucket = kind + ' ' + group
+                    if bucket not in sourceMap.setdefault(source, []):
+                        sourceMap[source].append(bucket)
+    for source in sourceMap:
+        sourceMap[source].sort()
+    return [groupMap, sourceMap]
+
+
+def SlowestItems(outputFolderPath_log, itemList, slowItems):
+    # {'chop': slowest molecules, 'pair': slowest pkcombu pairs}, SLOW_ITEM_TOP of each
+    chopList = sorted([x for x in itemList if x[0] == 'chop'], key=lambda x: -x[2])[:SLOW_ITEM_TOP]
+    pairList = sorted(slowItems.get('pair', []), key=lambda x: -x[0])[:SLOW_ITEM_TOP]
+
+    nameSet = set([os.path.basename(y) for x in pairList for y in x[1].split('\t')])
+    sourceSet = set([x[1] for x in chopList])
+    [groupMap, sourceMap] = FragmentGroups(outputFolderPath_log, nameSet, sourceSet)
+
+    slowest = {'chop':[], 'pair':[]}
+    for [kind, name, seconds, pid, info] in chopList:
+        slowest['chop'].append({'name':name, 'seconds':seconds, 'atoms':info.get('atoms'),
+                                'fragments':info.get('fragments'), 'buckets':sourceMap.get(name, [])})
+    for [seconds, name] in pairList:
+        pair = [os.path.basename(x) for x in name.split('\t')]
+        groups = [groupMap.get(x, ['', '']) for x in pair]
+        atoms = [int(x[1].split()[1]) if len(x[1]) > 0 else None for x in groups]
+        bucket = ' '.join([x for x in groups[0] if len(x) > 0])
+        if groups[1] != groups[0]:
+            # pairs of two buckets, eg. of crossGroup
+            bucket = bucket + ' | ' + ' '.join([x for x in groups[1] if len(x) > 0])
+        slowest['pair'].append({'pair':pair, 'seconds':seconds, 'atoms':atoms, 'bucket':bucket})
+    return slowest
+
+
+def WriteSlowestReport(reportPath, slowest):
+    with open(reportPath, 'w') as outf:
+        outf.write('Slowest molecules of chop (seconds, atoms, fragments, input, buckets of its fragments):\n')
+        for item in slowest['chop']:
+            outf.write('%10.3f  %5s  %5s  %s  %s\n' % (item['seconds'], item['atoms'], item['fragments'], item['name'], ', '.join(item['buckets'])))
+        outf.write('\nSlowest pkcombu pairs (seconds, atoms, fragments, bucket):\n')
+        for item in slowest['pair']:
+            outf.write('%10.3f  %5s %5s  %s %s  %s\n' % (item['seconds'], item['atoms'][0], item['atoms'][1], item['pair'][0], item['pair'][1], item['bucket']))
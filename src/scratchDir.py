@@ -0,0 +1,83 @@
+#Intermediate folders of a run on a scratch path (--scratch), eg. node-local disk or tmpfs instead of a network file system.
+
+#SetupScratch replaces the intermediate folders of the output path by symbolic links to folders of a new directory
+#under the scratch path, so every script keeps writing <outputDir>output-chop/... and the paths written into the
+#logs and similar lists stay the paths of the output directory. After AdjustOutput, FinishScratch moves the folders
+#that are still there (the final bricks, linkers and chop-comb fragments) to the output path, each one first to a
+#hidden folder on the output file system, then renamed to its name, and removes the scratch directory.
+#AdjustOutput removes the folders that are not kept with RemoveFolder, which follows the links.
+
+import os
+import os.path
+import shutil
+import tempfile
+
+
+SCRATCH_FOLDERS=['output-chop/', 'output-sdf/', 'output-chop-comb/', 'output-brick/', 'output-linker/']
+
+#--scratch local / tmpfs
+SCRATCH_ALIASES={'tmpfs':'/dev/shm'}
+
+#scratch directory of this run, set by SetupScratch
+_scratchDir=[None]
+
+
+def ScratchRoot(scratchOption):
+    # path of --scratch: 'local' (TMPDIR or /tmp), 'tmpfs' (/dev/shm) or a path
+    if scratchOption == 'local':
+        return tempfile.gettempdir()
+    return os.path.abspath(SCRATCH_ALIASES.get(scratchOption, scratchOption))
+
+
+def SetupScratch(outputDir, scratchOption):
+    # link the empty intermediate folders of outputDir to a new directory under the scratch path, return its path
+    scratchDir=tempfile.mkdtemp(prefix='emolfrag-', dir=ScratchRoot(scratchOption))+'/'
+    for folderName in SCRATCH_FOLDERS:
+        linkPath=outputDir+folderName[:-1]
+        os.mkdir(scratchDir+folderName)
+        if os.path.isdir(linkPath) and (not os.path.islink(linkPath)):
+            os.rmdir(linkPath)
+        os.symlink(scratchDir+folderName[:-1], linkPath)
+    _scratchDir[0]=scratchDir
+    return scratchDir
+
+
+def RemoveFolder(folderPath):
+    # shutil.rmtree, also for a folder linked to the scratch path
+    linkPath=folderPath.rstrip('/')
+    if os.path.islink(linkPath):
+        targetPath=os.path.realpath(linkPath)
+        os.unlink(linkPath)
+        shutil.rmtree(targetPath)
+    else:
+        shutil.rmtree(folderPath)
+
+
+def MoveFolder(srcPath, destPath):
+    # move srcPath to destPath, which appears at once under its name
+    try:
+        os.rename(srcPath, destPath)
+        return
+    except OSError:
+        pass
+    partialPath=os.path.join(os.path.dirname(destPath), '.'+os.path.basename(destPath)+'.partial')
+    if os.path.exists(partialPath):
+        shutil.rmtree(partialPath)
+    shutil.copytree(srcPath, partialPath)
+    os.rename(partialPath, destPath)
+    shutil.rmtree(srcPath)
+
+
+def FinishScratch(outputDir):
+    # move the folders left on the scratch path to outputDir and remove the scratch directory
+    for folderName in SCRATCH_FOLDERS:
+        linkPath=outputDir+folderName[:-1]
+        if not os.path.islink(linkPath):
+            continue
+        targetPath=os.path.realpath(linkPath)
+        os.unlink(linkPath)
+        if os.path.isdir(targetPath):
+            MoveFolder(targetPath, linkPath)
+    if (_scratchDir[0] != None) and os.path.isdir(_scratchDir[0]):
+        shutil.rmtree(_scratchDir[0])
+    _scratchDir[0]=None
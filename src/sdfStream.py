@@ -0,0 +1,77 @@
+#Stream fragments into the combined sdf files of output format 1/2 (BrickFull.sdf, LinkerFull.sdf, BrickUnique.sdf, LinkerUnique.sdf).
+
+#Each process keeps one buffered handle per combined file and writes to its own part file,
+#<outputDir>output-sdf/<name>.part-<pid> (on the scratch path with --scratch), so no two processes write to the same file. FlushStreams is called at the end of each task, after the pool finished
+#a stage the main process joins the parts with MergeStreams.
+
+import os
+import os.path
+import shutil
+
+from fragmentLayout import FragmentPath
+
+
+STREAM_BUFFER_SIZE=1<<20
+
+_streams={}
+
+
+def PartFolder(outputDir):
+    # folder of the part files, outputDir itself if there is no output-sdf folder
+    if os.path.isdir(outputDir+'output-sdf/'):
+        return outputDir+'output-sdf/'
+    return outputDir
+
+
+def PartPath(outputDir, streamName):
+    return PartFolder(outputDir)+streamName+'.part-'+str(os.getpid())
+
+
+def OpenStream(outputDir, streamName):
+    partPath=PartPath(outputDir, streamName)
+    if partPath not in _streams:
+        _streams[partPath]=open(partPath, 'at', STREAM_BUFFER_SIZE)
+    return _streams[partPath]
+
+
+def PutFragment(outputDir, streamName, destPath, lines):
+    # write one fragment to destPath, or to the stream streamName if it is not ''
+    if streamName == '':
+        destPath=FragmentPath(os.path.dirname(destPath)+'/', os.path.basename(destPath))
+        with open(destPath,'w') as outf:
+            outf.writelines(lines)
+    else:
+        OpenStream(outputDir, streamName).writelines(lines)
+
+
+def PutFragmentFile(outputDir, streamName, destPath, srcPath):
+    # copy the fragment file srcPath to destPath, or to the stream streamName if it is not ''
+    if streamName == '':
+        shutil.copyfile(srcPath, FragmentPath(os.path.dirname(destPath)+'/', os.path.basename(destPath)))
+    else:
+        outf=OpenStream(outputDir, streamName)
+        with open(srcPath,'r') as inf:
+            shutil.copyfileobj(inf, outf)
+
+
+def FlushStreams():
+    for partPath in _streams:
+        _streams[partPath].flush()
+
+
+def CloseStreams():
+    for partPath in list(_streams.keys()):
+        _streams[partPath].close()
+        del _streams[partPath]
+
+
+def MergeStreams(outputDir, streamName):
+    # join the part files of all processes into <outputDir><streamName>
+    CloseStreams()
+    partFolder=PartFolder(outputDir)
+    partList=sorted([x for x in os.listdir(partFolder) if x.startswith(streamName+'.part-')])
+    with open(outputDir+streamName, 'at', STREAM_BUFFER_SIZE) as outf:
+        for partName in partList:
+            with open(partFolder+partName, 'r') as inf:
+                shutil.copyfileobj(inf, outf, STREAM_BUFFER_SIZE)
+            os.remove(partFolder+partName)
@@ -0,0 +1,318 @@
+#Merge the output of shard runs into one global set of unique bricks and linkers.
+
+#Process:
+#1. Each node runs: python eMolFrag.py -i /input/ -o /shared/output/ -p N --shard i/M
+#   Shard i chops only its part of the input and removes redundancy locally, output goes to /shared/output/shard-i-of-M/
+#2. After all shards finished: python eMolFrag.py merge -o /shared/output/ [-p N] [-t TC]
+#   The representatives of all shards are grouped again by total/carbon/nitrogen/oxygen atom numbers,
+#   and the brick and linker redundancy removal runs once more on them, output goes to /shared/output/merged/
+#3. The similar fragments list of each merged brick, brick-log.txt, linker-log.txt and bricks-red-out.txt are expanded
+#   to the fragments of the shard runs, the merge input copies in merged/output-chop-comb/ are removed.
+
+import os
+import os.path
+import shutil
+import sys
+import time
+
+from fragRecord import StripSimilarList, CountAtoms
+from fragmentLayout import ListFragments, LayoutPath, FragmentPath, IsSharded, ShardFolders, MergeManifest
+
+
+def ParseMergeArgs(args):
+    # args: ['eMolFrag.py', 'merge', '-o', path, '-p', N, '-t', TC]
+    outputDir = []
+    processNum = 0 # -p not given: from the CPUs and memory of the cgroup
+    tcBorder = 1.0
+
+    argList = args[2:]
+    if (len(argList) < 2) or (len(argList)%2 == 1):
+        print('Error Code: 1211. Incorrect arguments, use: eMolFrag.py merge -o /Path_to_output_directory/ [-p N] [-t TC]')
+        return
+
+    for i in range(0, len(argList), 2):
+        if argList[i] == '-o':
+            outputDir = os.path.abspath(argList[i+1])
+            if outputDir[-1] != '/':
+                outputDir = outputDir + '/'
+        elif argList[i] == '-p':
+            tempCoreNum = int(argList[i+1])
+            if (tempCoreNum >= 1) and (tempCoreNum <= 16):
+                processNum = tempCoreNum
+            else:
+                print('Error Code: 1212. Invalid number of cores.')
+                return
+        elif argList[i] == '-t':
+            tempTCBorder = float(argList[i+1])
+            if (tempTCBorder >= 0.90) and (tempTCBorder <= 1.0):
+                tcBorder = tempTCBorder
+            else:
+                print('Error Code: 1212-1. Invalid TC.')
+                return
+        else:
+            print('Error Code: 1211. Unknown argument ' + argList[i] + '.')
+            return
+
+    if outputDir == []:
+        print('Error Code: 1211. Missing -o.')
+        return
+
+    if processNum == 0:
+        from workerPool import DefaultWorkerNum
+        processNum = DefaultWorkerNum()
+
+    return [outputDir, processNum, tcBorder]
+
+
+def FindShardDirs(outputDir):
+    # return the shard folders, None if some shards are missing or not finished
+    shardDirs = []
+    shardNumList = []
+    for name in sorted(os.listdir(outputDir)):
+        if (name[:6] == 'shard-') and os.path.isdir(outputDir + name):
+            shardDirs.append(outputDir + name + '/')
+            shardNumList.append(int(name.split('-')[-1]))
+
+    if len(shardDirs) == 0:
+        print('Error Code: 1213. No shard output found in ' + outputDir)
+        return
+
+    if (len(set(shardNumList)) != 1) or (len(shardDirs) != shardNumList[0]):
+        print('Error Code: 1214. Expected ' + str(max(shardNumList)) + ' shards, found ' + str(len(shardDirs)) + '.')
+        return
+
+    for shardDir in shardDirs:
+        finished = 0
+        if os.path.exists(shardDir + 'output-log/Process.log'):
+            with open(shardDir + 'output-log/Process.log', 'r') as inf:
+                for line in inf:
+                    if ' End Work ' in line:
+                        finished = 1
+        if finished == 0:
+            print('Error Code: 1215. Shard ' + shardDir + ' is not finished.')
+            return
+
+    return shardDirs
+
+
+def ReadGroupLog(logPath):
+    # brick-log.txt / linker-log.txt: {representative: [count, member lines]}, a member line is a fragment path
+    # or the case of a one C / N / O linker group ('One Nitrogen Case - 2 N.am'), which lists no members
+    groupMap = {}
+    if not os.path.exists(logPath):
+        return groupMap
+    representative = ''
+    with open(logPath, 'r') as inf:
+        for line in inf:
+            if line[:1] == '\t':
+                if representative != '':
+                    groupMap[representative][1].append(line.strip())
+            elif len(line.split()) >= 7:
+                representative = line.split()[5]
+                groupMap[representative] = [int(line.split()[6]), []]
+    return groupMap
+
+
+def CollectShardFragments(shardDirs, outputPathList):
+    # copy the shard representatives as merge input
+    # return [memberMap, pathMap, caseCountMap]:
+    #   memberMap    - {merge input path: fragments of the shard runs it stands for}
+    #   pathMap      - {merge input path: the same fragment in output-chop-comb of its shard}
+    #   caseCountMap - {one C / N / O linker case: number of linkers of the shard runs}
+    [outputDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
+
+    memberMap = {}
+    pathMap = {}
+    caseCountMap = {}
+    for shardDir in shardDirs:
+        # linkers keep no similar list, their members are in linker-log.txt
+        linkerGroupMap = {}
+        for [representative, [count, memberLines]] in ReadGroupLog(shardDir + 'output-log/linker-log.txt').items():
+            linkerGroupMap[os.path.basename(representative)] = [x for x in memberLines if x[-4:] == '.sdf']
+            for case in [x for x in memberLines if x[-4:] != '.sdf']:
+                caseCountMap[case] = caseCountMap.get(case, 0) + count
+
+        for [folderName, listName] in [['output-brick/', 'BrickListAll.txt'], ['output-linker/', 'LinkerListAll.txt']]:
+            if not os.path.exists(shardDir + folderName):
+                continue
+            listLines = []
+            for relPath in sorted(ListFragments(shardDir + folderName), key=os.path.basename):
+                fileName = os.path.basename(relPath)
+                with open(shardDir + folderName + relPath, 'r') as inf:
+                    fragmentLines = inf.readlines()
+                [newLines, similarList] = StripSimilarList(fragmentLines)
+                destPath = FragmentPath(outputFolderPath_chop_comb, fileName)
+                with open(destPath, 'w') as outf:
+                    outf.writelines(newLines)
+
+                pathMap[destPath] = LayoutPath(shardDir + 'output-chop-comb/', fileName)
+                if len(similarList) == 0:
+                    similarList = linkerGroupMap.get(fileName, [])
+                if len(similarList) == 0:
+                    similarList = [pathMap[destPath]]
+                memberMap[destPath] = similarList
+
+                countList = CountAtoms(newLines)
+                listLines.append(destPath + ' T ' + str(countList[0]) + ' C ' + str(countList[1]) + ' N ' + str(countList[2]) + ' O ' + str(countList[3]) + '\n')
+
+            with open(outputFolderPath_log + listName, 'at') as outf:
+                outf.writelines(listLines)
+
+    return [memberMap, pathMap, caseCountMap]
+
+
+def ExpandMembers(pathList, memberMap):
+    # fragments of the shard runs of the merge input paths, in order, without repeats
+    expandList = []
+    for path in pathList:
+        for member in memberMap.get(path, [path]):
+            if member not in expandList:
+                expandList.append(member)
+    return expandList
+
+
+def ExpandSimilarLists(outputFolderPath_active, memberMap):
+    # replace merge input paths in '> <fragments similar>' by the fragments of the shard runs
+    for relPath in ListFragments(outputFolderPath_active):
+        filePath = outputFolderPath_active + relPath
+        with open(filePath, 'r') as inf:
+            fragmentLines = inf.readlines()
+        [newLines, similarList] = StripSimilarList(fragmentLines)
+        if len(similarList) == 0:
+            continue
+
+        newLines = newLines[:-1]
+        newLines.append('> <fragments similar> \n')
+        newLines = newLines + [x + '\n' for x in ExpandMembers(similarList, memberMap)]
+        newLines.append('\n')
+        newLines.append('$$$$\n')
+        with open(filePath, 'w') as outf:
+            outf.writelines(newLines)
+
+
+def ExpandGroupLog(logPath, memberMap, pathMap, caseCountMap):
+    # brick-log.txt / linker-log.txt of the merge: representatives point to the shard runs, members are expanded
+    # to the fragments of the shard runs, the count of a one C / N / O linker case is the one of the shard runs
+    if not os.path.exists(logPath):
+        return
+    with open(logPath, 'r') as inf:
+        lines = inf.readlines()
+
+    groupList = []
+    for line in lines:
+        if line[:1] == '\t':
+            if len(groupList) > 0:
+                groupList[-1][1].append(line.strip())
+        elif len(line.split()) >= 7:
+            groupList.append([line.split(), []])
+
+    newLines = []
+    for [headList, memberLines] in groupList:
+        pathList = ExpandMembers([x for x in memberLines if x[-4:] == '.sdf'], memberMap)
+        caseList = [x for x in memberLines if x[-4:] != '.sdf']
+        count = int(headList[6])
+        if len(pathList) > 0:
+            count = len(pathList)
+        elif len(caseList) > 0:
+            count = sum([caseCountMap.get(x, 0) for x in caseList])
+        newLines.append(' '.join(headList[:5] + [pathMap.get(headList[5], headList[5]), str(count)]) + '\n')
+        newLines = newLines + ['\t' + x + '\n' for x in pathList + caseList]
+
+    with open(logPath, 'w') as outf:
+        outf.writelines(newLines)
+
+
+def ExpandLogs(outputFolderPath_log, memberMap, pathMap, caseCountMap):
+    # the logs of the merge point to merged/output-chop-comb/, which is removed, point them to the shard runs
+    ExpandGroupLog(outputFolderPath_log + 'brick-log.txt', memberMap, pathMap, caseCountMap)
+    ExpandGroupLog(outputFolderPath_log + 'linker-log.txt', memberMap, pathMap, caseCountMap)
+
+    # bricks-red-out.txt: 'representative:member member ...' per line
+    if os.path.exists(outputFolderPath_log + 'bricks-red-out.txt'):
+        with open(outputFolderPath_log + 'bricks-red-out.txt', 'r') as inf:
+            lines = inf.readlines()
+        newLines = []
+        for line in lines:
+            [representative, similarStr] = line.rstrip('\n').split(':', 1)
+            newLines.append(pathMap.get(representative, representative) + ':' + ' '.join(ExpandMembers(similarStr.split(), memberMap)) + '\n')
+        with open(outputFolderPath_log + 'bricks-red-out.txt', 'w') as outf:
+            outf.writelines(newLines)
+
+    # BrickListAll.txt / LinkerListAll.txt: '<merge input path> T n C n N n O n' per line
+    for listName in ['BrickListAll.txt', 'LinkerListAll.txt']:
+        if not os.path.exists(outputFolderPath_log + listName):
+            continue
+        with open(outputFolderPath_log + listName, 'r') as inf:
+            lines = inf.readlines()
+        newLines = []
+        for line in lines:
+            path = line.split(' ', 1)[0]
+            newLines.append(pathMap.get(path, path) + line[len(path):])
+        with open(outputFolderPath_log + listName, 'w') as outf:
+            outf.writelines(newLines)
+
+
+def MergeShards(outputDir, processNum, tcBorder):
+    from eMolFrag import CreateOutputFolders, RmRedundancy, PrintLog, StageDone, FinishRunReport
+    from loader import ReadPathConfigure
+    from pkcombuRunner import PkcombuPool
+
+    pathList = ReadPathConfigure()
+    if pathList == None:
+        print('Error Code: 1216. Cannot load PathConfigure.log.')
+        return
+
+    shardDirs = FindShardDirs(outputDir)
+    if shardDirs == None:
+        return
+
+    mergeDir = outputDir + 'merged/'
+    if os.path.exists(mergeDir):
+        print('Error Code: 1217. ' + mergeDir + ' already exists, remove it before merging again.')
+        return
+    outputPathList = CreateOutputFolders(mergeDir)
+    [mergeDir, outputFolderPath_log, outputFolderPath_chop, outputFolderPath_active, outputFolderPath_linker, outputFolderPath_sdf, outputFolderPath_chop_comb] = outputPathList
+    if IsSharded(shardDirs[0] + 'output-brick/'):
+        # the merged output has the layout of the shard runs (--layout sharded)
+        ShardFolders(mergeDir)
+
+    path = outputFolderPath_log + 'Process.log'
+    PrintLog(path, ' Start Merge ' + str(len(shardDirs)) + ' shards ' + outputDir)
+
+    [memberMap, pathMap, caseCountMap] = CollectShardFragments(shardDirs, outputPathList)
+
+    pool = PkcombuPool(processNum)
+    try:
+        stageStartTime = time.time()
+        RmRedundancy(outputPathList, tcBorder, pool, pathList)
+        stageStartTime = StageDone('redundancy', stageStartTime, pool, outputFolderPath_log)
+    finally:
+        pool.close()
+        pool.join()
+
+    ExpandSimilarLists(outputFolderPath_active, memberMap)
+    ExpandLogs(outputFolderPath_log, memberMap, pathMap, caseCountMap)
+
+    # the merge input are copies of shard output, keep only the merged bricks, linkers and logs
+    shutil.rmtree(outputFolderPath_chop)
+    shutil.rmtree(outputFolderPath_sdf)
+    shutil.rmtree(outputFolderPath_chop_comb)
+    MergeManifest(outputFolderPath_active)
+    MergeManifest(outputFolderPath_linker)
+
+    FinishRunReport(mergeDir)
+    PrintLog(path, ' End Merge ')
+
+
+def MergeMain(args):
+    try:
+        [outputDir, processNum, tcBorder] = ParseMergeArgs(args)
+    except:
+        print('Error Code: 1218. Failed to parse merge commands.')
+        return
+
+    if not os.path.isdir(outputDir):
+        print('Error Code: 1219. ' + outputDir + ' is not a directory.')
+        return
+
+    MergeShards(outputDir, processNum, tcBorder)
@@ -0,0 +1,193 @@
+#Online remove redundancy of the fragments of one bucket (--stream-dedupe), fed while the molecules are chopped.
+
+#A bucket is one brick or linker group of BrickListAll.txt / LinkerListAll.txt (same atom counts). The main process
+#sends the new fragments of a bucket to StepBucket, one step at a time per bucket, so the steps of a bucket see the
+#fragments in arrival order. StepBucket is leader clustering, the rule RmBrickRed and RmLinkerRed apply to a whole
+#group: a new fragment joins the first representative it is similar to (bricks: tanimoto >= TC border; linkers:
+#tanimoto > 0.99 and the same contact atom types), and the branches (bricks) or contact numbers (linkers) of the
+#representative are updated; otherwise it becomes a new representative. FlushBucket writes the representatives
+#at the end of the run, in the same format as RmBrickRed and RmLinkerRed.
+
+#representative of a brick bucket:  [path, [similar paths], [aligned branch lines], descriptor]
+#representative of a linker bucket: [path, [similar paths], [max contact numbers], descriptor]
+#StreamBuckets keeps the buckets in the main process and decides which bucket runs its next step.
+
+import os
+import time
+
+from loader import ReadPathConfigure
+from pkcombuRunner import RunPkcombuPairs
+from pairBound import DescriptorOfLines, CanReach
+from fragCache import ReadRecord, AppendixList, AlignBranches, BRICK_HEAD, LINKER_HEAD
+from runReport import AddTime, AddCount, AddItem, FlushMetrics
+from sdfStream import FlushStreams
+
+
+def StreamChop(outputDir, streamFull, inputPath, heavy=0):
+    # pool task: chop one molecule, return [list file name, RL List line] of its fragments
+    from chopRDKit03 import ChopWithRDKit
+    from combineLinkers01 import TakeRLEntries
+    TakeRLEntries()
+    ChopWithRDKit(outputDir, inputPath, streamFull, heavy)
+    return TakeRLEntries()
+
+
+def OneAtomLinkerGroup(groupProp):
+    # one C, N or O linker groups are reduced by atom type in RmLinkerRed, without pkcombu
+    return (groupProp[1]=='1') and ((groupProp[3]=='1') or (groupProp[5]=='1') or (groupProp[7]=='1'))
+
+
+class StreamBuckets(object):
+    # buckets of the main process, by key (kind, group property line), in the order of their first fragment
+    # bucket: {'kind', 'group': group property, 'members': all fragments, 'reps': representatives,
+    #          'waiting': fragments not sent to a step yet, 'step': fragments of the running step (None: idle),
+    #          'pairs': pair counts of the steps, 'failed': 1 when a step failed}
+
+    def __init__(self):
+        self._bucketMap={}
+        self._bucketOrder=[]
+        self._readyList=[]
+
+    def Keys(self, kind=None):
+        return [x for x in self._bucketOrder if (kind == None) or (x[0] == kind)]
+
+    def Get(self, key):
+        return self._bucketMap[key]
+
+    def AddChopped(self, entryList):
+        # [list file name, RL List line] of the fragments of a chopped molecule (StreamChop)
+        for [listName, line] in entryList:
+            lineList=line.split()
+            if listName == 'BrickListAll.txt':
+                kind='brick'
+            else:
+                kind='linker'
+            key=(kind, ' '.join(lineList[1:]))
+            if key not in self._bucketMap:
+                self._bucketMap[key]={'kind':kind, 'group':lineList[1:], 'members':[], 'reps':[], 'waiting':[],
+                                      'step':None, 'pairs':[0, 0], 'failed':0}
+                self._bucketOrder.append(key)
+            bucket=self._bucketMap[key]
+            bucket['members'].append(lineList[0])
+            if (kind == 'linker') and OneAtomLinkerGroup(bucket['group']):
+                continue
+            bucket['waiting'].append(lineList[0])
+            # a bucket starts its index with its second fragment, single fragments are written as they are
+            if (bucket['step'] == None) and (len(bucket['members']) > 1) and (key not in self._readyList):
+                self._readyList.append(key)
+
+    def StepDone(self, key, result):
+        # result of StepBucket, None when the step failed: the bucket is then done by RmBrickRed / RmLinkerRed at the end
+        bucket=self._bucketMap[key]
+        if result == None:
+            bucket['failed']=1
+        else:
+            [bucket['reps'], pairCount]=result
+            bucket['pairs']=[bucket['pairs'][0]+pairCount[0], bucket['pairs'][1]+pairCount[1]]
+        bucket['step']=None
+        if (bucket['failed'] == 0) and (len(bucket['waiting']) > 0):
+            self._readyList.append(key)
+
+    def TakeSteps(self):
+        # [key, bucket] of the buckets to step now, their waiting fragments become the fragments of the step
+        stepList=[]
+        for key in self._readyList:
+            bucket=self._bucketMap[key]
+            if bucket['failed'] == 1:
+                continue
+            bucket['step']=bucket['waiting']
+            bucket['waiting']=[]
+            stepList.append([key, bucket])
+        self._readyList=[]
+        return stepList
+
+
+def NewRepresentative(kind, path, record):
+    descriptor=DescriptorOfLines(record['lines'])
+    if kind == 'brick':
+        return [path, [path], [], descriptor]
+    return [path, [path], [int(x[0]) for x in AppendixList(record)], descriptor]
+
+
+def StepBucket(kind, outputDir, tcBorder, pathList, repList, newList):
+    # pool task: leader clustering of newList (paths in arrival order) into repList
+    # return [repList, [pairs sent to pkcombu, pairs skipped by the tanimoto bound]]
+    if pathList == None:
+        pathList=ReadPathConfigure()
+    startTime=time.time()
+    pairCount=[0, 0]
+    if kind == 'brick':
+        appendixHead=BRICK_HEAD
+    else:
+        appendixHead=LINKER_HEAD
+        # tnm > 0.99 with 3 decimals is tnm >= 0.991
+        tcBorder=0.991
+
+    recordCache={}
+    for molB in newList:
+        recordCache[molB]=ReadRecord(molB, appendixHead)
+        descB=DescriptorOfLines(recordCache[molB]['lines'])
+
+        candidateList=[]
+        for rep in repList:
+            if (rep[3] != None) and (not CanReach(rep[3], descB, tcBorder)):
+                pairCount[1]=pairCount[1]+1
+                continue
+            candidateList.append(rep)
+        pairCount[0]=pairCount[0]+len(candidateList)
+
+        joined=0
+        resultList=RunPkcombuPairs(pathList[1], [[x[0], molB] for x in candidateList])
+        for [rep, [tnm, ali]] in zip(candidateList, resultList):
+            molA=rep[0]
+            if molA not in recordCache:
+                recordCache[molA]=ReadRecord(molA, appendixHead)
+            if kind == 'brick':
+                if float(tnm) >= tcBorder:
+                    aliStartTime=time.time()
+                    try:
+                        rep[2]=rep[2]+AlignBranches(ali, recordCache[molA], recordCache[molB])
+                    except:
+                        pass
+                    AddTime('mol-ali', time.time()-aliStartTime)
+                    joined=1
+            elif float(tnm) > 0.99:
+                from rmRedLinker04 import SameContactTypes
+                molBAppList=AppendixList(recordCache[molB])
+                if SameContactTypes(ali, AppendixList(recordCache[molA]), molBAppList) == 1:
+                    for i in range(len(molBAppList)):
+                        if int(molBAppList[i][0]) > rep[2][i]:
+                            rep[2][i]=int(molBAppList[i][0])
+                    joined=1
+            if joined == 1:
+                rep[1].append(molB)
+                break
+
+        if joined == 0:
+            repList.append(NewRepresentative(kind, molB, recordCache[molB]))
+
+    AddItem(kind+'-stream-step', os.path.basename(newList[0]), time.time()-startTime, {'fragments':len(newList), 'representatives':len(repList)})
+    AddCount(kind+'-pairs-evaluated', pairCount[0])
+    AddCount(kind+'-pairs-pruned', pairCount[1])
+    FlushMetrics(outputDir, kind)
+    return [repList, pairCount]
+
+
+def FlushBucket(kind, outputDir, stream, repList):
+    # pool task: write the representatives of a bucket and their log lines
+    if kind == 'brick':
+        from rmRedBrick01 import WriteBrickRepresentative
+        streamName=''
+        if stream == 1:
+            streamName='BrickUnique.sdf'
+        for rep in repList:
+            WriteBrickRepresentative(outputDir, streamName, ReadRecord(rep[0], BRICK_HEAD), [x+'\n' for x in rep[1]], rep[2])
+    else:
+        from rmRedLinker04 import WriteLinkerRepresentative
+        streamName=''
+        if stream == 1:
+            streamName='LinkerUnique.sdf'
+        for rep in repList:
+            WriteLinkerRepresentative(outputDir, streamName, ReadRecord(rep[0], LINKER_HEAD), rep[1], rep[2])
+    FlushStreams()
+    return [0, 0, 0]
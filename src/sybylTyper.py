@@ -0,0 +1,168 @@
+#Sybyl (mol2) atom types from RDKit, so 3D SDF inputs are chopped directly, without a mol2 conversion pass.
+
+#ChopWithRDKit takes nothing from the mol2 file of an input but the coordinates and the atom type of each atom
+#(6th column of @<TRIPOS>ATOM), which go to the ATOMTYPES and BRANCH appendices of the fragments. For an SDF input
+#Mol2AtomLines writes these lines itself, the atom types following the rules of the openbabel mol2 writer:
+#   C   C.ar aromatic, C.cat amidinium / guanidinium cation, C.1 triple bond or two double bonds, C.2 double bond, C.3
+#   N   N.ar aromatic, N.am amide (C=O or C=S neighbour), N.4 four neighbours, N.1 triple bond or two double bonds,
+#       N.pl3 nitro or three neighbours one of which is an aromatic or unsaturated C / N, N.2 double bond, N.3
+#   O   O.co2 carboxylate / phosphate (two terminal O on the same C or P), O.2 aromatic, double bond or nitro, O.3
+#   S   S.O2 / S.O two / one terminal O, S.2 aromatic or double bond, S.3
+#   P   P.3;   dummy atoms Du;   H, halogens and others their element symbol
+#The agreement with the openbabel types of test-set100 is measured by benchmark/src/sybylAgreement.py, the groups
+#test-set100 lacks (nitro, carboxylate, ...) are checked by benchmark/src/sybylTypeCheck.py.
+
+from rdkit import Chem
+
+from inputDiscovery import IsSDFInput
+
+
+def ReadInputMol(inputPath, removeHs=True):
+    # molecule of an input file, not sanitized: a mol2 file, or the first molecule of an SDF file
+    if not IsSDFInput(inputPath):
+        return Chem.MolFromMol2File(inputPath, sanitize=False, removeHs=removeHs)
+    mol=Chem.MolFromMolFile(inputPath, sanitize=False, removeHs=removeHs)
+    if mol != None:
+        MarkAromaticAtoms(mol)
+    return mol
+
+
+def MarkAromaticAtoms(mol):
+    # the mol2 reader marks the atoms of aromatic bonds aromatic, the mol file reader only the bonds;
+    # BRICS and the typing of a molecule that cannot be sanitized need the atoms marked
+    for bond in mol.GetBonds():
+        if bond.GetIsAromatic():
+            bond.GetBeginAtom().SetIsAromatic(True)
+            bond.GetEndAtom().SetIsAromatic(True)
+
+
+def PerceiveMol(mol):
+    # copy of mol with rings, aromaticity and hybridization set, also for a molecule RDKit cannot sanitize
+    typedMol=Chem.Mol(mol)
+    try:
+        Chem.SanitizeMol(typedMol)
+    except:
+        typedMol=Chem.Mol(mol)
+        typedMol.UpdatePropertyCache(strict=False)
+        Chem.SanitizeMol(typedMol, Chem.SanitizeFlags.SANITIZE_SYMMRINGS|Chem.SanitizeFlags.SANITIZE_SETAROMATICITY|
+                         Chem.SanitizeFlags.SANITIZE_SETHYBRIDIZATION, catchErrors=True)
+    return typedMol
+
+
+def BondCount(atom, bondType):
+    return len([x for x in atom.GetBonds() if x.GetBondType() == bondType])
+
+
+def TerminalOxygens(atom):
+    # oxygen neighbours of atom without other neighbours or hydrogens
+    return [x for x in atom.GetNeighbors() if (x.GetAtomicNum() == 8) and (x.GetTotalDegree() == 1)]
+
+
+def Unsaturated(atom):
+    return atom.GetIsAromatic() or (BondCount(atom, Chem.BondType.DOUBLE) > 0) or (BondCount(atom, Chem.BondType.TRIPLE) > 0)
+
+
+def CarbonType(atom):
+    if atom.GetIsAromatic():
+        return 'C.ar'
+    doubleNum=BondCount(atom, Chem.BondType.DOUBLE)
+    if (BondCount(atom, Chem.BondType.TRIPLE) > 0) or (doubleNum > 1):
+        return 'C.1'
+    if doubleNum == 1:
+        nitrogenList=[x for x in atom.GetNeighbors() if x.GetAtomicNum() == 7]
+        for bond in atom.GetBonds():
+            otherAtom=bond.GetOtherAtom(atom)
+            if (bond.GetBondType() == Chem.BondType.DOUBLE) and (otherAtom.GetAtomicNum() == 7) and \
+               (otherAtom.GetFormalCharge() > 0) and (len(nitrogenList) >= 2):
+                return 'C.cat'
+        return 'C.2'
+    return 'C.3'
+
+
+def NitrogenType(atom):
+    if atom.GetIsAromatic():
+        return 'N.ar'
+    doubleNum=BondCount(atom, Chem.BondType.DOUBLE)
+    if (BondCount(atom, Chem.BondType.TRIPLE) > 0) or (doubleNum > 1):
+        return 'N.1'
+    if atom.GetTotalDegree() == 4:
+        return 'N.4'
+    if doubleNum == 1:
+        if len(TerminalOxygens(atom)) == 2:
+            # nitro
+            return 'N.pl3'
+        return 'N.2'
+    for otherAtom in atom.GetNeighbors():
+        if otherAtom.GetAtomicNum() != 6:
+            continue
+        for bond in otherAtom.GetBonds():
+            if (bond.GetBondType() == Chem.BondType.DOUBLE) and (bond.GetOtherAtom(otherAtom).GetAtomicNum() in [8, 16]):
+                return 'N.am'
+    if atom.GetTotalDegree() == 3:
+        for otherAtom in atom.GetNeighbors():
+            if (otherAtom.GetAtomicNum() in [6, 7]) and Unsaturated(otherAtom):
+                return 'N.pl3'
+    return 'N.3'
+
+
+def OxygenType(atom):
+    if atom.GetIsAromatic():
+        return 'O.2'
+    if atom.GetTotalDegree() == 1:
+        otherAtom=atom.GetNeighbors()[0]
+        if (otherAtom.GetAtomicNum() in [6, 15]) and (len(TerminalOxygens(otherAtom)) >= 2):
+            return 'O.co2'
+        if (otherAtom.GetAtomicNum() == 7) and (len(TerminalOxygens(otherAtom)) == 2):
+            # nitro
+            return 'O.2'
+    if BondCount(atom, Chem.BondType.DOUBLE) > 0:
+        return 'O.2'
+    return 'O.3'
+
+
+def SulfurType(atom):
+    oxygenNum=len(TerminalOxygens(atom))
+    if oxygenNum >= 2:
+        return 'S.O2'
+    if oxygenNum == 1:
+        return 'S.O'
+    if Unsaturated(atom):
+        return 'S.2'
+    return 'S.3'
+
+
+def SybylType(atom):
+    # Sybyl type of an atom of a molecule given by PerceiveMol
+    atomicNum=atom.GetAtomicNum()
+    if atomicNum == 0:
+        return 'Du'
+    if atomicNum == 6:
+        return CarbonType(atom)
+    if atomicNum == 7:
+        return NitrogenType(atom)
+    if atomicNum == 8:
+        return OxygenType(atom)
+    if atomicNum == 15:
+        return 'P.3'
+    if atomicNum == 16:
+        return SulfurType(atom)
+    return atom.GetSymbol()
+
+
+def SybylTypes(mol):
+    # Sybyl type of each atom of mol, in atom order
+    typedMol=PerceiveMol(mol)
+    return [SybylType(x) for x in typedMol.GetAtoms()]
+
+
+def Mol2AtomLines(mol, atomTypes=None):
+    # @<TRIPOS>ATOM lines of mol, typed by SybylTypes if atomTypes is not given
+    if atomTypes == None:
+        atomTypes=SybylTypes(mol)
+    conf=mol.GetConformer()
+    atomLines=[]
+    for atom in mol.GetAtoms():
+        pos=conf.GetAtomPosition(atom.GetIdx())
+        atomName=atom.GetSymbol()+str(atom.GetIdx()+1)
+        atomLines.append('%7d %-8s %9.4f %9.4f %9.4f %-5s %5d  %-8s %9.4f\n' % (atom.GetIdx()+1, atomName, pos.x, pos.y, pos.z, atomTypes[atom.GetIdx()], 1, 'LIG1', 0.0))
+    return atomLines
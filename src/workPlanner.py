@@ -0,0 +1,252 @@
+#Dry run (--plan): predict the size and the wall time of a run before it is started.
+
+#1. Prescan: the atom number of every input molecule, read from the @<TRIPOS>MOLECULE record of the mol2 file
+#   (the counts line of an SDF file).
+#2. Sample: PLAN_SAMPLE_SIZE input molecules are chopped and reduced in a temporary folder with the normal pipeline,
+#   its run report gives the chop seconds and fragments per input atom, the share of the pairs of a bucket that
+#   were sent to pkcombu and the seconds per pkcombu call.
+#3. History: the run report of an earlier run (--plan-report RunReport.json or an output path) replaces the
+#   per molecule and per pair numbers of the sample, which come from a few molecules only.
+#Each group of the sample (the T C N O grouping of remove redundancy) is scaled to the whole input, the pkcombu
+#calls of a bucket of n fragments are estimated as pair share x n(n-1)/2, and the wall time for the -p workers is
+#the larger of the total work over the workers and the largest bucket. Groups not seen in the sample and the
+#comparisons across groups of a TC border below 1.0 are not counted. The plan is printed and written to
+#<outputDir>WorkPlan.json, no other output is written.
+
+import os
+import os.path
+import json
+import random
+import shutil
+import tempfile
+
+
+PLAN_SAMPLE_SIZE=200
+
+
+def Mol2AtomNum(path):
+    # atom number of the first molecule of a mol2 file, 0 if it cannot be read
+    try:
+        with open(path, 'r') as inf:
+            line=inf.readline()
+            while (line != '') and (line.strip() != '@<TRIPOS>MOLECULE'):
+                line=inf.readline()
+            inf.readline()
+            return int(inf.readline().split()[0])
+    except:
+        return 0
+
+
+def SDFAtomNum(path):
+    # atom number of the first molecule of an SDF file, 0 if it cannot be read
+    try:
+        with open(path, 'r') as inf:
+            for i in range(3):
+                inf.readline()
+            return int(inf.readline()[0:3])
+    except:
+        return 0
+
+
+def FindReport(path):
+    # RunReport.json given as a file or found in an output path (output-log/ or, with -c 2, the output path itself)
+    if os.path.isfile(path):
+        return path
+    for reportPath in [os.path.join(path, 'output-log', 'RunReport.json'), os.path.join(path, 'RunReport.json')]:
+        if os.path.isfile(reportPath):
+            return reportPath
+    return None
+
+
+def PairBound(n):
+    return n*(n-1)/2
+
+
+def BucketFragments(report, kind):
+    # [fragments, pair bound] of the buckets of a run report
+    histogram=report.get('histograms', {}).get(kind+'-bucket-size', {})
+    fragmentNum=sum([int(x)*histogram[x] for x in histogram])
+    pairNum=sum([PairBound(int(x))*histogram[x] for x in histogram])
+    return [fragmentNum, pairNum]
+
+
+def Calibrate(report, atomNum=0):
+    # numbers of a run report, None if the report does not have them
+    #   chopSeconds / fragments: per input atom if atomNum (input atoms of the run) is given, else per input molecule
+    calibration={'chopSeconds':None, 'fragments':None, 'pkcombuSeconds':None, 'pairShare':{'brick':None, 'linker':None}}
+    chopItem=report.get('items', {}).get('chop')
+    if (chopItem != None) and (chopItem['count'] > 0):
+        scale=float(chopItem['count'])
+        if atomNum > 0:
+            scale=float(atomNum)
+        calibration['chopSeconds']=chopItem['total']/scale
+        calibration['fragments']=(BucketFragments(report, 'brick')[0]+BucketFragments(report, 'linker')[0])/scale
+    pkcombuTimer=report.get('timers', {}).get('pkcombu')
+    if (pkcombuTimer != None) and (pkcombuTimer['count'] > 0):
+        calibration['pkcombuSeconds']=pkcombuTimer['mean']
+    for kind in ['brick', 'linker']:
+        pairNum=BucketFragments(report, kind)[1]
+        if pairNum > 0:
+            calibration['pairShare'][kind]=min(1.0, report.get('counters', {}).get(kind+'-pairs-evaluated', 0)/float(pairNum))
+    return calibration
+
+
+def ReadGroups(outputFolderPath_log):
+    # {(kind, 'T n C n N n O n'): fragments} of BrickListAll.txt and LinkerListAll.txt
+    groupMap={}
+    for [kind, listName] in [['brick', 'BrickListAll.txt'], ['linker', 'LinkerListAll.txt']]:
+        if not os.path.exists(outputFolderPath_log+listName):
+            continue
+        with open(outputFolderPath_log+listName, 'r') as inf:
+            for line in inf:
+                lineList=line.split()
+                if len(lineList) > 1:
+                    key=(kind, ' '.join(lineList[1:]))
+                    groupMap[key]=groupMap.get(key, 0)+1
+    return groupMap
+
+
+def SizeLabel(n):
+    # bucket size bins 1, 2-3, 4-7, 8-15, ...
+    low=1
+    while low*2 <= n:
+        low=low*2
+    if low == 1:
+        return '1'
+    return str(low)+'-'+str(low*2-1)
+
+
+def RunSample(inputList, processNum, tcBorder, sampleDir, heavy=0):
+    # chop and remove redundancy of inputList in sampleDir, return the run report
+    from eMolFrag import CreateOutputFolders, Chop, RmRedundancy
+    from pkcombuRunner import PkcombuPool
+    from runReport import WriteRunReport
+
+    outputPathList=CreateOutputFolders(sampleDir)
+    with open(outputPathList[1]+'InputList', 'w') as outList:
+        outList.writelines([x+'\n' for x in inputList])
+    pool=PkcombuPool(processNum)
+    try:
+        Chop(outputPathList, pool, inputList=inputList, heavy=heavy)
+        RmRedundancy(outputPathList, tcBorder, pool)
+    finally:
+        pool.close()
+        pool.join()
+    return [WriteRunReport(sampleDir), ReadGroups(outputPathList[1])]
+
+
+def PlanWork(inputFolderPath, outputDir, processNum, tcBorder, runOptions={}):
+    from inputDiscovery import DiscoverInputs, IsSDFInput
+    from pkcombuRunner import PKCOMBU_THREADS
+    from kcombuBinding import LoadKcombu
+
+    # 1. prescan
+    inputList=DiscoverInputs(inputFolderPath, runOptions)
+    if len(inputList) == 0:
+        print('Error Code: 1241. No input molecule.')
+        return
+    atomMap={}
+    for inputPath in inputList:
+        if IsSDFInput(inputPath):
+            atomMap[inputPath]=SDFAtomNum(inputPath)
+        else:
+            atomMap[inputPath]=Mol2AtomNum(inputPath)
+    totalAtoms=sum(atomMap.values())
+
+    # 2. sample
+    sampleList=sorted(random.Random(0).sample(inputList, min(PLAN_SAMPLE_SIZE, len(inputList))))
+    sampleAtoms=sum([atomMap[x] for x in sampleList])
+    sampleDir=tempfile.mkdtemp(prefix='emolfrag-plan-')+'/'
+    try:
+        [sampleReport, sampleGroups]=RunSample(sampleList, processNum, tcBorder, sampleDir+'output/', runOptions.get('heavy', 0))
+    finally:
+        shutil.rmtree(sampleDir, ignore_errors=True)
+    if sampleAtoms == 0:
+        sampleAtoms=len(sampleList)
+        totalAtoms=len(inputList)
+    calibration=Calibrate(sampleReport, sampleAtoms)
+    calibration['fragments']=sum(sampleGroups.values())/float(sampleAtoms)
+    scale=float(totalAtoms)
+    source={'chop':'sample', 'pkcombu':'sample', 'pairShare':'sample'}
+
+    # 3. history
+    history=None
+    if 'plan-report' in runOptions:
+        reportPath=FindReport(runOptions['plan-report'])
+        if reportPath == None:
+            print('Error Code: 1242. No RunReport.json in ' + runOptions['plan-report'] + ', the sample is used.')
+        else:
+            with open(reportPath, 'r') as inf:
+                history=Calibrate(json.load(inf))
+            if history['chopSeconds'] != None:
+                calibration['chopSeconds']=history['chopSeconds']
+                calibration['fragments']=history['fragments']
+                scale=float(len(inputList))
+                source['chop']=reportPath
+            if history['pkcombuSeconds'] != None:
+                calibration['pkcombuSeconds']=history['pkcombuSeconds']
+                source['pkcombu']=reportPath
+            for kind in ['brick', 'linker']:
+                if history['pairShare'][kind] != None:
+                    calibration['pairShare'][kind]=history['pairShare'][kind]
+                    source['pairShare']=reportPath
+
+    for name in ['chopSeconds', 'fragments', 'pkcombuSeconds']:
+        if calibration[name] == None:
+            calibration[name]=0.0
+    for kind in ['brick', 'linker']:
+        if calibration['pairShare'][kind] == None:
+            calibration['pairShare'][kind]=1.0
+
+    # scale the groups of the sample to the input
+    fragmentNum=calibration['fragments']*scale
+    sampleFragmentNum=sum(sampleGroups.values())
+    pairThreads=PKCOMBU_THREADS
+    if LoadKcombu() != None:
+        pairThreads=1
+    bucketPlan={'brick':{}, 'linker':{}}
+    pkcombuCalls={'brick':0.0, 'linker':0.0}
+    largestBucket=[0.0, '']
+    for key in sampleGroups:
+        [kind, groupProp]=key
+        n=float(fragmentNum)*sampleGroups[key]/max(sampleFragmentNum, 1)
+        calls=calibration['pairShare'][kind]*PairBound(n)
+        pkcombuCalls[kind]=pkcombuCalls[kind]+calls
+        label=SizeLabel(max(1, int(round(n))))
+        bucketPlan[kind][label]=bucketPlan[kind].get(label, 0)+1
+        if calls > largestBucket[0]:
+            largestBucket=[calls, kind+' '+groupProp]
+
+    chopSeconds=calibration['chopSeconds']*scale
+    pkcombuSeconds=calibration['pkcombuSeconds']*(pkcombuCalls['brick']+pkcombuCalls['linker'])
+    largestSeconds=calibration['pkcombuSeconds']*largestBucket[0]/pairThreads
+    wallSeconds=chopSeconds/processNum+max(pkcombuSeconds/processNum, largestSeconds)
+
+    plan={'inputMolecules':len(inputList),
+          'inputAtoms':sum(atomMap.values()),
+          'sampleMolecules':len(sampleList),
+          'tcBorder':tcBorder,
+          'workers':processNum,
+          'expectedFragments':int(round(fragmentNum)),
+          'groups':{'brick':len([x for x in sampleGroups if x[0] == 'brick']), 'linker':len([x for x in sampleGroups if x[0] == 'linker'])},
+          'bucketSizes':bucketPlan,
+          'pkcombuCalls':{'brick':int(round(pkcombuCalls['brick'])), 'linker':int(round(pkcombuCalls['linker']))},
+          'largestBucket':{'group':largestBucket[1], 'pkcombuCalls':int(round(largestBucket[0]))},
+          'seconds':{'chopCPU':chopSeconds, 'pkcombuCPU':pkcombuSeconds, 'largestBucket':largestSeconds, 'wall':wallSeconds},
+          'calibration':calibration,
+          'source':source}
+
+    if not os.path.exists(outputDir):
+        os.makedirs(outputDir)
+    with open(outputDir+'WorkPlan.json', 'w') as outf:
+        json.dump(plan, outf, indent=1, sort_keys=True)
+
+    print('Input molecules: ' + str(plan['inputMolecules']) + ', atoms: ' + str(plan['inputAtoms']) + ', sample: ' + str(plan['sampleMolecules']))
+    print('Expected fragments: ' + str(plan['expectedFragments']) + ' in ' + str(plan['groups']['brick']) + ' brick and ' + str(plan['groups']['linker']) + ' linker groups')
+    for kind in ['brick', 'linker']:
+        labelList=sorted(bucketPlan[kind].keys(), key=lambda x: int(x.split('-')[0]))
+        print('  ' + kind + ' bucket sizes: ' + ', '.join([x + ': ' + str(bucketPlan[kind][x]) for x in labelList]))
+    print('Estimated pkcombu calls at TC ' + str(tcBorder) + ': brick ' + str(plan['pkcombuCalls']['brick']) + ', linker ' + str(plan['pkcombuCalls']['linker']) + ', largest bucket ' + str(plan['largestBucket']['pkcombuCalls']) + ' (' + largestBucket[1] + ')')
+    print('Projected wall time with ' + str(processNum) + ' workers: %.1f s (chop %.1f s, pkcombu %.1f s of CPU)' % (wallSeconds, chopSeconds, pkcombuSeconds))
+    print('Plan: ' + outputDir + 'WorkPlan.json')
+    return plan
@@ -0,0 +1,246 @@
+#Worker pool that recycles its workers and follows the memory of the machine, used by PkcombuPool.
+
+#RDKit objects and fragment lists pile up in long-lived workers over a large input, so:
+#1. A worker is replaced after WORKER_MAX_TASKS tasks (maxtasksperchild of multiprocessing.Pool).
+#2. map and imap_unordered send the tasks through a window of at most two tasks per worker. After each task the RSS
+#   of the workers is read from /proc; when one is above the RSS limit, the window is drained and the whole pool is
+#   started again with fresh workers.
+#3. When the pool is started again, the number of workers is reduced so that the workers fit in the available
+#   memory (MemAvailable, or the cgroup memory limit), at the largest worker RSS seen so far per worker.
+#apply_async passes the task to the pool as it is, its workers are only replaced by the task count.
+#The default number of workers (-p not given) is taken from the cgroup CPU quota and memory limit.
+#With a profile folder (--profile), the workers profile their tasks (workerProfile.py).
+
+from multiprocessing import Pool
+import os
+import queue
+
+from workerProfile import StartProfile, ProfiledCall
+
+
+#tasks of a worker before it is replaced
+WORKER_MAX_TASKS=200
+#RSS of a worker above which the pool is started again (MB)
+WORKER_RSS_LIMIT_MB=2048
+#memory counted for each worker before its RSS is known (MB)
+WORKER_MEMORY_MB=512
+#largest chunk of map, so a worker can be replaced within a stage
+MAX_CHUNK_SIZE=64
+#upper bound of the default number of workers, the same as -p
+MAX_DEFAULT_WORKERS=16
+
+
+def ReadFirstLine(path):
+    try:
+        with open(path, 'r') as inf:
+            return inf.readline().strip()
+    except:
+        return ''
+
+
+def CgroupCPULimit():
+    # CPUs allowed by the cgroup CPU quota, None if there is no quota
+    cpuMax=ReadFirstLine('/sys/fs/cgroup/cpu.max').split()
+    if (len(cpuMax) == 2) and (cpuMax[0] != 'max'):
+        return max(1, int(int(cpuMax[0])/int(cpuMax[1])))
+    quota=ReadFirstLine('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period=ReadFirstLine('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if (quota != '') and (period != '') and (int(quota) > 0):
+        return max(1, int(int(quota)/int(period)))
+    return None
+
+
+def CPUNum():
+    # CPUs this process may use
+    try:
+        cpuNum=len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpuNum=os.cpu_count() or 1
+    cgroupCPU=CgroupCPULimit()
+    if cgroupCPU != None:
+        cpuNum=min(cpuNum, cgroupCPU)
+    return cpuNum
+
+
+def CgroupMemory():
+    # [limit, usage] of the cgroup in MB, limit is None if there is no limit
+    for [limitPath, usagePath] in [['/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'],
+            ['/sys/fs/cgroup/memory/memory.limit_in_bytes', '/sys/fs/cgroup/memory/memory.usage_in_bytes']]:
+        limit=ReadFirstLine(limitPath)
+        if (limit != '') and (limit != 'max') and (int(limit) < (1<<60)):
+            usage=ReadFirstLine(usagePath)
+            if usage == '':
+                usage='0'
+            return [int(limit)>>20, int(usage)>>20]
+    return [None, 0]
+
+
+def MemInfoMB(name):
+    # a field of /proc/meminfo in MB, None if unknown
+    try:
+        with open('/proc/meminfo', 'r') as inf:
+            for line in inf:
+                if line.startswith(name+':'):
+                    return int(line.split()[1])>>10
+    except:
+        pass
+    return None
+
+
+def AvailableMemoryMB():
+    # memory that new workers can use, None if unknown
+    available=MemInfoMB('MemAvailable')
+    [limit, usage]=CgroupMemory()
+    if limit != None:
+        if available == None:
+            available=limit-usage
+        else:
+            available=min(available, limit-usage)
+    return available
+
+
+def TotalMemoryMB():
+    total=MemInfoMB('MemTotal')
+    limit=CgroupMemory()[0]
+    if (limit != None) and ((total == None) or (limit < total)):
+        total=limit
+    return total
+
+
+def DefaultWorkerNum():
+    # workers for the CPUs and the memory of the cgroup
+    workerNum=CPUNum()
+    totalMemory=TotalMemoryMB()
+    if totalMemory != None:
+        workerNum=min(workerNum, max(1, int(totalMemory/WORKER_MEMORY_MB)))
+    return max(1, min(workerNum, MAX_DEFAULT_WORKERS))
+
+
+def ProcessRSSMB(pid):
+    # resident memory of a process in MB, 0 if unknown
+    try:
+        with open('/proc/'+str(pid)+'/statm', 'r') as inf:
+            return (int(inf.readline().split()[1])*os.sysconf('SC_PAGE_SIZE'))>>20
+    except:
+        return 0
+
+
+def RunChunk(task):
+    # pool task: [function, [argument, ...]] -> [result, ...]
+    [func, argList]=task
+    return ProfiledCall(lambda: [func(x) for x in argList])
+
+
+class ManagedPool(object):
+
+    def __init__(self, processNum, initializer=None, initargs=(), maxTasks=WORKER_MAX_TASKS, rssLimitMB=WORKER_RSS_LIMIT_MB, profileFolder=None):
+        self._maxProcesses=processNum
+        self._initializer=initializer
+        self._initargs=initargs
+        if profileFolder != None:
+            # profile the tasks of each worker
+            self._initializer=StartProfile
+            self._initargs=(profileFolder, initializer, initargs)
+        self._maxTasks=maxTasks
+        self._rssLimitMB=rssLimitMB
+        # largest worker RSS since the start and since the last TakePeakRSS (MB)
+        self._workerPeakMB=0
+        self._stagePeakMB=0
+        self.recycleNum=0
+        self._pool=None
+        self._processes=processNum
+        self.Start()
+
+    @property
+    def processes(self):
+        # workers of the current pool, fewer than processNum when they did not fit in the memory
+        return self._processes
+
+    def Start(self):
+        # start a pool with the workers that fit in the available memory
+        processNum=self._maxProcesses
+        available=AvailableMemoryMB()
+        if available != None:
+            workerMemory=max(self._workerPeakMB, WORKER_MEMORY_MB)
+            processNum=max(1, min(processNum, int(available/workerMemory)))
+        self._processes=processNum
+        self._pool=Pool(processes=processNum, initializer=self._initializer, initargs=self._initargs, maxtasksperchild=self._maxTasks)
+
+    def Recycle(self):
+        # replace all workers, the pool must be idle
+        self._pool.close()
+        self._pool.join()
+        self.recycleNum=self.recycleNum+1
+        self.Start()
+
+    def WorkerRSSMB(self):
+        # largest RSS of the current workers (MB)
+        rssList=[ProcessRSSMB(x.pid) for x in list(getattr(self._pool, '_pool', []))]
+        rss=max(rssList+[0])
+        self._workerPeakMB=max(self._workerPeakMB, rss)
+        self._stagePeakMB=max(self._stagePeakMB, rss)
+        return rss
+
+    def TakePeakRSS(self):
+        # largest worker RSS seen since the last call (MB)
+        self.WorkerRSSMB()
+        peak=self._stagePeakMB
+        self._stagePeakMB=0
+        return peak
+
+    def Run(self, func, argList):
+        # yield [index, result] of func on each argument as the tasks finish
+        eventQueue=queue.Queue()
+        nextIndex=0
+        running=0
+        draining=0
+        while (nextIndex < len(argList)) or (running > 0):
+            window=2*self._processes
+            while (draining == 0) and (nextIndex < len(argList)) and (running < window):
+                self._pool.apply_async(func, (argList[nextIndex],),
+                    callback=lambda result, index=nextIndex: eventQueue.put([index, result, None]),
+                    error_callback=lambda error, index=nextIndex: eventQueue.put([index, None, error]))
+                nextIndex=nextIndex+1
+                running=running+1
+
+            [index, result, error]=eventQueue.get()
+            running=running-1
+            if error != None:
+                raise error
+            yield [index, result]
+
+            if (draining == 0) and (self._rssLimitMB > 0) and (self.WorkerRSSMB() > self._rssLimitMB):
+                draining=1
+            if (draining == 1) and (running == 0):
+                self.Recycle()
+                draining=0
+
+    def map(self, func, iterable, chunksize=None):
+        argList=list(iterable)
+        if chunksize == None:
+            # as multiprocessing.Pool, at most MAX_CHUNK_SIZE
+            chunksize=max(1, min(MAX_CHUNK_SIZE, int((len(argList)+4*self._processes-1)/(4*self._processes))))
+        chunkList=[[func, argList[i:i+chunksize]] for i in range(0, len(argList), chunksize)]
+        resultList=[None for x in chunkList]
+        for [index, result] in self.Run(RunChunk, chunkList):
+            resultList[index]=result
+        return [x for chunk in resultList for x in chunk]
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        argList=list(iterable)
+        chunkList=[[func, argList[i:i+chunksize]] for i in range(0, len(argList), chunksize)]
+        for [index, result] in self.Run(RunChunk, chunkList):
+            for x in result:
+                yield x
+
+    def apply_async(self, func, args=(), kwds=None, callback=None, error_callback=None):
+        return self._pool.apply_async(ProfiledCall, (func, args, kwds), callback=callback, error_callback=error_callback)
+
+    def close(self):
+        self._pool.close()
+
+    def join(self):
+        self._pool.join()
+
+    def terminate(self):
+        self._pool.terminate()
@@ -0,0 +1,121 @@
+#Profile of the main process and the pool workers (--profile).
+
+#Each process runs cProfile during its tasks only, so the time a worker waits for the next task is not counted,
+#and writes its stats to output-log/profile/process-<pid>.prof after each task (a recycled worker leaves its own
+#file). WriteProfileReport merges the files of all processes into output-log/profile/merged.prof and writes
+#output-log/HotFunctions.txt:
+#   hot paths     - seconds of the parts of the pipeline named in HOT_PATHS, a part can hold another one
+#                   (the pkcombu calls are part of brick and linker redundancy)
+#   own time      - functions ranked by the time spent in their own code
+#   cumulative    - functions ranked by the time spent in them and the functions they call
+#cProfile follows the thread it is enabled in: pkcombu runs from the threads of RunPkcombuPairs, so its time is the
+#time the task waits in RunPkcombuPairs.
+
+import os
+import os.path
+import cProfile
+import pstats
+
+
+PROFILE_FOLDER='profile/'
+HOTFUNCTION_REPORT='HotFunctions.txt'
+#functions in each ranking of the report
+PROFILE_TOP=40
+
+#[label, file name, function name, 'own' (time in its own code) or 'cum' (time with its callees)]
+#a file name of None: every function whose file or name contains the function name
+HOT_PATHS=[['RDKit (parsing, writing, BRICS)', None, 'rdkit', 'own'],
+           ['chop coordinate matching (ChopWithRDKit)', 'chopRDKit03.py', 'ChopWithRDKit', 'own'],
+           ['linker combination (findFragments)', 'combineLinkers01.py', 'findFragments', 'cum'],
+           ['pkcombu calls (RunPkcombuPairs)', 'pkcombuRunner.py', 'RunPkcombuPairs', 'cum'],
+           ['brick redundancy (RmBrickRed)', 'rmRedBrick01.py', 'RmBrickRed', 'cum'],
+           ['linker redundancy (RmLinkerRed)', 'rmRedLinker04.py', 'RmLinkerRed', 'cum']]
+
+#[profiler, profile folder, depth of profiled calls] of this process, profiler is None if the process is not profiled
+_profile=[None, None, 0]
+
+
+def StartProfile(profileFolder, initializer=None, initargs=()):
+    # profile the tasks of this process, also used as pool initializer around the initializer of the pool
+    if _profile[0] != None:
+        # a worker forked by a profiled process while its profiler was running
+        _profile[0].disable()
+    _profile[0]=cProfile.Profile()
+    _profile[1]=profileFolder
+    _profile[2]=0
+    if initializer != None:
+        initializer(*initargs)
+
+
+def DumpProfile():
+    if not os.path.exists(_profile[1]):
+        try:
+            os.makedirs(_profile[1])
+        except OSError:
+            pass
+    profilePath=_profile[1]+'process-'+str(os.getpid())+'.prof'
+    _profile[0].dump_stats(profilePath+'.partial')
+    os.rename(profilePath+'.partial', profilePath)
+
+
+def ProfiledCall(func, args=(), kwds=None):
+    # func(*args, **kwds), profiled if the process is profiled
+    if kwds == None:
+        kwds={}
+    if (_profile[0] == None) or (_profile[2] > 0):
+        return func(*args, **kwds)
+    _profile[2]=1
+    _profile[0].enable()
+    try:
+        return func(*args, **kwds)
+    finally:
+        _profile[0].disable()
+        _profile[2]=0
+        DumpProfile()
+
+
+def HotPathSeconds(stats, hotPath):
+    [label, fileName, funcName, timeKind]=hotPath
+    seconds=0.0
+    for [filePath, line, name] in stats.stats:
+        [cc, nc, tt, ct, callers]=stats.stats[(filePath, line, name)]
+        if fileName == None:
+            if (funcName not in filePath) and (funcName not in name):
+                continue
+        elif (os.path.basename(filePath) != fileName) or (name != funcName):
+            continue
+        if timeKind == 'own':
+            seconds=seconds+tt
+        else:
+            seconds=seconds+ct
+    return seconds
+
+
+def WriteProfileReport(outputFolderPath_log):
+    # merge the profiles of all processes, return the path of the report, None if no process was profiled
+    profileFolder=outputFolderPath_log+PROFILE_FOLDER
+    if not os.path.isdir(profileFolder):
+        return
+    profileList=sorted([profileFolder+x for x in os.listdir(profileFolder) if x.startswith('process-') and x.endswith('.prof')])
+    if len(profileList) == 0:
+        return
+
+    reportPath=outputFolderPath_log+HOTFUNCTION_REPORT
+    with open(reportPath, 'w') as outf:
+        stats=pstats.Stats(profileList[0], stream=outf)
+        for profilePath in profileList[1:]:
+            stats.add(profilePath)
+        stats.dump_stats(profileFolder+'merged.prof')
+        # not one header line per profile file in the rankings
+        stats.files=[]
+
+        outf.write('Profiled processes: ' + str(len(profileList)) + ', profiled seconds: %.2f\n\n' % stats.total_tt)
+        outf.write('Hot paths (seconds, share of the profiled seconds):\n')
+        for hotPath in HOT_PATHS:
+            seconds=HotPathSeconds(stats, hotPath)
+            outf.write('  %-45s %10.2f  %5.1f%%\n' % (hotPath[0], seconds, 100.0*seconds/max(stats.total_tt, 1e-9)))
+        outf.write('\nOwn time, top ' + str(PROFILE_TOP) + ':\n')
+        stats.sort_stats('tottime').print_stats(PROFILE_TOP)
+        outf.write('\nCumulative time, top ' + str(PROFILE_TOP) + ':\n')
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+    return reportPath